@@ -1,25 +1,26 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import nullcontext
 import tkinter as tk
 from tkinter import messagebox, ttk
-import pandas as pd
-import random
 from tkinter import filedialog
-from datetime import datetime, timedelta
-import os
+
+from timetable_cache import ResultCache
+from timetable_calendar import CALENDAR_DIRECTORY, export_calendars, term_dates
+from timetable_engine import DAYS, TimetableEngine, end_time_options, new_semester_data
+from timetable_errors import GenerationCancelled, SchedulingError
+from timetable_incremental import make_state, reschedule
+from timetable_profile import Profiler
+from timetable_project import PROJECT_EXTENSION, ProjectStore
+from timetable_specs import compile_semester
 
 # Global variables
 all_semester_data = []  # Store data for all semesters
-time_slots = [
-    '9:00-9:55','9:55-10:50','11:05-12:00','12:00-12:55','13:45-14:40', '14:40-15:35','15:35-16:30'
-]
-theory_slots = [
-    '9:00-9:55', '10:00-10:50', '11:05-12:00', '12:00-12:55',
-    '13:45-14:40', '14:40-15:35', '15:35-16:30'
-]
-practical_slots = [
-    ('9:00-10:50', 2), ('11:05-12:55', 2), ('13:45-15:35', 2), ('14:40-16:30', 2)
-]
-breaks = [('10:50-11:05', 'Short Break'), ('12:55-13:45', 'Lunch Break')]
-end_time_options = ['10:50', '12:55', '14:40', '15:35', '16:30']
+last_run = None  # State of the last generation, so the next one only redoes what changed
+project = None  # Open project file, if any; semesters and runs are saved to it as they change
+project_settings = {}  # The open project's grid, rooms and availability, passed to every engine
 
 class SemesterGUI:
     def __init__(self):
@@ -34,18 +35,16 @@ class SemesterGUI:
         self.subjects_entries = []
         self.teachers_entries = []
         self.credits_entries = []
-        self.semester_data = {
-            'subjects': [],
-        'teachers': [],
-        'credits': [],
-        'semester': '',
-        'term_start': '',
-        'term_end': '',
-        'room_number': '',
-        'num_students': 0,
-        'file_location': '',
-        'excel_name': ''
-        }
+        self.semester_data = new_semester_data()
+        self.saved_index = None  # Position of this window's semester in all_semester_data once saved
+
+    # Generation runs on a worker thread and reports back through this queue
+        self.worker = None
+        self.cancel_event = None
+        self.progress_queue = queue.Queue()
+        self.retries = 0
+        self.semester_progress = (1, 1)  # (semester, semesters) of the running generation
+        self.profiler = None
     
     # Setup the GUI
         self.setup_gui()
@@ -77,6 +76,9 @@ class SemesterGUI:
         # Bind mouse wheel scrolling
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
         
+        # Project file and the stored semester being edited
+        self._setup_project_bar()
+
         # Top frame for basic inputs
         self.top_frame = tk.Frame(self.scrollable_frame, bg="#f7f7f7")
         self.top_frame.pack(fill=tk.X, padx=20, pady=20)
@@ -115,6 +117,29 @@ class SemesterGUI:
     def _on_mousewheel(self, event):
         self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
 
+    def _setup_project_bar(self):
+        project_frame = tk.Frame(self.scrollable_frame, bg="#f7f7f7")
+        project_frame.pack(fill=tk.X, padx=20, pady=(20, 0))
+
+        self.open_project_button = tk.Button(
+            project_frame,
+            text="Open Project...",
+            command=self.open_project,
+            bg="#607D8B",
+            fg="white",
+            padx=10
+        )
+        self.open_project_button.pack(side=tk.LEFT, padx=5)
+
+        semester_select_label = tk.Label(project_frame, text="Edit Semester:", bg="#f7f7f7")
+        semester_select_label.pack(side=tk.LEFT, padx=5)
+        self.semester_select = ttk.Combobox(project_frame, state="readonly", width=30)
+        self.semester_select.pack(side=tk.LEFT, padx=5)
+        self.semester_select.bind("<<ComboboxSelected>>", self.edit_semester)
+
+        self.project_label = tk.Label(project_frame, text="No project file", bg="#f7f7f7", fg="#616161")
+        self.project_label.pack(side=tk.LEFT, padx=10)
+
     def _setup_basic_inputs(self):
         # First row - using grid with adjusted column weights
         self.top_frame.grid_columnconfigure(1, weight=1)
@@ -149,7 +174,7 @@ class SemesterGUI:
 
     def _setup_end_time_selection(self):
         self.day_end_time_vars = {}
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+        days = DAYS
         
         # Configure grid columns for even spacing
         self.end_time_frame.grid_columnconfigure(1, weight=1)
@@ -225,6 +250,35 @@ class SemesterGUI:
             padx=10
         )
         self.end_button.pack(side=tk.LEFT, padx=10)
+
+        self.cancel_button = tk.Button(
+            button_frame,
+            text="Cancel",
+            command=self.cancel_generation,
+            bg="#9E9E9E",
+            fg="white",
+            padx=10,
+            state=tk.DISABLED
+        )
+        self.cancel_button.pack(side=tk.LEFT, padx=10)
+
+        self.profile_var = tk.BooleanVar(value=False)
+        self.profile_check = tk.Checkbutton(
+            button_frame,
+            text="Profile run",
+            variable=self.profile_var,
+            bg="#f7f7f7"
+        )
+        self.profile_check.pack(side=tk.LEFT, padx=10)
+
+        # Progress of a running generation
+        progress_frame = tk.Frame(self.scrollable_frame, bg="#f7f7f7")
+        progress_frame.pack(fill=tk.X, padx=20, pady=(0, 20))
+        self.progress_bar = ttk.Progressbar(progress_frame, orient="horizontal", mode="determinate", maximum=100)
+        self.progress_bar.pack(fill=tk.X)
+        self.progress_label = tk.Label(progress_frame, text="", bg="#f7f7f7")
+        self.progress_label.pack()
+
     def browse_location(self):
         folder_selected = filedialog.askdirectory()
         self.file_location_entry.delete(0, tk.END)
@@ -267,6 +321,8 @@ class SemesterGUI:
         self.subjects_entries.append(subject_entry)
         self.teachers_entries.append(teacher_entry)
         self.credits_entries.append(credits_entry)
+        return subject_entry, teacher_entry, credits_entry
+
     def delete_subject(self, subject_frame, subject_entry, teacher_entry, credits_entry):
         # Remove the frame containing the subject entry from the GUI
         subject_frame.destroy()
@@ -282,18 +338,7 @@ class SemesterGUI:
 
     def save_semester_data(self):
         # Clear previous data
-        self.semester_data = {
-            'subjects': [],
-            'teachers': [],
-            'credits': [],
-            'semester': '',
-            'term_start': '',
-            'term_end': '',
-            'room_number': '',
-            'num_students': 0,
-            'file_location': '',
-            'excel_name': ''
-        }
+        self.semester_data = new_semester_data()
         
         # Collect all current semester data
         self.semester_data['semester'] = self.semester_entry.get()
@@ -303,6 +348,7 @@ class SemesterGUI:
         self.semester_data['num_students'] = self.num_students_entry.get()
         self.semester_data['file_location'] = self.file_location_entry.get()
         self.semester_data['excel_name'] = self.excel_name_entry.get()
+        self.semester_data['day_end_times'] = {day: var.get() for day, var in self.day_end_time_vars.items()}
         
         # Collect subjects data
         for i in range(len(self.subjects_entries)):
@@ -315,416 +361,269 @@ class SemesterGUI:
             messagebox.showerror("Error", "Please provide both file location and excel name")
             return False
 
-        # Add to global data
-        all_semester_data.append(self.semester_data.copy())
+        # Parse credits once; the schedulers reuse these specs
+        try:
+            term_dates(self.semester_data)
+            self.semester_data['specs'] = compile_semester(self.semester_data)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return False
+
+        # Add to global data, replacing this form's earlier save if any
+        if self.saved_index is None:
+            self.saved_index = len(all_semester_data)
+            all_semester_data.append(self.semester_data.copy())
+        else:
+            all_semester_data[self.saved_index] = self.semester_data.copy()
+        if project is not None:
+            # Only this semester's rows are rewritten; the others stay as stored
+            try:
+                project.save_semester(self.saved_index, self.semester_data)
+            except sqlite3.Error as e:
+                messagebox.showerror("Error", f"Could not save to {project.path}: {e}")
+        self._refresh_semester_select()
         return True
 
     def create_new_semester(self):
+        # Clear the form in place for the next semester
         if self.save_semester_data():
-            self.window.destroy()  # Close current window
-            SemesterGUI()  # Create new semester window
-
-
-    def can_schedule_theory(self, day, slot, teacher, timetable, teacher_schedules):
-
+            self._fill_form(new_semester_data())
+            self.saved_index = None
+            self._refresh_semester_select()
+
+    def edit_semester(self, event=None):
+        index = self.semester_select.current()
+        if index < 0 or index == self.saved_index:
+            return
+        # Keep the edits of the semester being left; a new, unsaved form is dropped
+        if self.saved_index is not None and not self.save_semester_data():
+            self._refresh_semester_select()
+            return
+        self._fill_form(all_semester_data[index])
+        self.saved_index = index
+        self._refresh_semester_select()
+
+    def _fill_form(self, semester_data):
+        self.semester_data = semester_data.copy()
+        for entry, key in ((self.semester_entry, 'semester'), (self.term_start_entry, 'term_start'),
+                           (self.term_end_entry, 'term_end'), (self.room_number_entry, 'room_number'),
+                           (self.num_students_entry, 'num_students'),
+                           (self.file_location_entry, 'file_location'), (self.excel_name_entry, 'excel_name')):
+            entry.delete(0, tk.END)
+            entry.insert(0, semester_data.get(key) or '')
+        for day, var in self.day_end_time_vars.items():
+            var.set(semester_data.get('day_end_times', {}).get(day, '10:50'))
+
+        for subject_frame in self.main_frame.winfo_children():
+            subject_frame.destroy()
+        self.subjects_entries = []
+        self.teachers_entries = []
+        self.credits_entries = []
+        for values in zip(semester_data['subjects'], semester_data['teachers'], semester_data['credits']):
+            for entry, value in zip(self.add_subject_fields(), values):
+                entry.insert(0, value)
+
+    def _refresh_semester_select(self):
+        self.semester_select['values'] = [f"{i + 1}. {semester['semester'] or semester['excel_name']}"
+                                          for i, semester in enumerate(all_semester_data)]
+        if self.saved_index is None:
+            self.semester_select.set('')
+        else:
+            self.semester_select.current(self.saved_index)
+
+    def open_project(self):
+        global project, last_run, project_settings
+        path = filedialog.asksaveasfilename(
+            title="Open or create a project file",
+            defaultextension=PROJECT_EXTENSION,
+            filetypes=[("Timetable projects", f"*{PROJECT_EXTENSION}")],
+            confirmoverwrite=False
+        )
+        if not path:
+            return
+        try:
+            opened = ProjectStore(path)
+            grid = opened.load_grid()
+            settings = {'grid': grid, 'rooms': opened.load_rooms(), 'availability': opened.load_availability()}
+            stored = opened.load_semesters(grid)
+            if not stored and all_semester_data:
+                # A new project file starts with the semesters entered so far
+                opened.save_semesters(all_semester_data)
+                stored = opened.load_semesters()
+        except (ValueError, KeyError, TypeError, sqlite3.Error) as e:
+            messagebox.showerror("Error", f"Could not open {path}: {e}")
+            return
+        if project is not None:
+            project.close()
+        project = opened
+        project_settings = settings
+        all_semester_data[:] = stored
+        last_run = project.load_state()
+        self.project_label.config(text=os.path.basename(path))
+        self.saved_index = None
+        if stored:
+            self._fill_form(stored[0])
+            self.saved_index = 0
+        else:
+            self._fill_form(new_semester_data())
+        self._refresh_semester_select()
 
-        if timetable[day][slot]:  # Slot already occupied
-            return False
-            
-        # Check if teacher is already scheduled in any semester at this time
-        slot_start = datetime.strptime(slot.split('-')[0], '%H:%M')
-        slot_end = datetime.strptime(slot.split('-')[1], '%H:%M')
-        
-        if teacher in teacher_schedules:
-            for semester_day, semester_slots in teacher_schedules[teacher].items():
-                if semester_day == day:  # Only check same day
-                    for existing_slot in semester_slots:
-                        existing_start = datetime.strptime(existing_slot.split('-')[0], '%H:%M')
-                        existing_end = datetime.strptime(existing_slot.split('-')[1], '%H:%M')
-                        
-                    # Check for time overlap
-                        if (slot_start <= existing_end and slot_end >= existing_start):
-                            return False
-        
-        return True
 
     def generate_timetables(self):
-        if self.save_semester_data():
-            teacher_schedules = {}  # Track teacher schedules across all semesters
-            try:
-                for semester in all_semester_data:
-                    timetable = self.create_timetable(semester, teacher_schedules)
-                    self.save_timetable_to_excel(timetable, semester)
-                messagebox.showinfo("Success", "All timetables generated successfully!")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error generating timetables: {str(e)}")
-    # Global time slot definitions
-    time_slots = [
-        '09:00-09:55', '10:00-10:55', '11:00-11:55', '12:00-12:55',
-        '13:45-14:40', '14:45-15:40', '15:45-16:30'
-    ]
-
-    breaks = [
-        ('09:55-10:00', 'Short Break'),
-        ('10:55-11:00', 'Short Break'),
-        ('11:55-12:00', 'Short Break'),
-        ('12:55-13:45', 'Lunch Break'),
-        ('14:40-14:45', 'Short Break'),
-        ('15:40-15:45', 'Short Break')
-    ]
-
-    def create_timetable(self, semester_data, teacher_schedules):
-        timetable = {day: {slot: '' for slot in time_slots} 
-                    for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']}
-
-        # Identify pure practical subjects (0:0:X credits)
-        pure_practical_subjects = []
-        for i, subject in enumerate(semester_data['subjects']):
-            credits = semester_data['credits'][i].split(':')
-            try:
-                credit_values = [int(c.strip()) for c in credits]
-            except ValueError:
-                raise ValueError(f"Invalid credit format for subject {subject}: {semester_data['credits'][i]}")
-
-            if len(credit_values) == 3 and credit_values[0] == 0 and credit_values[1] == 0 and credit_values[2] > 0:
-                pure_practical_subjects.append((subject, semester_data['teachers'][i]))
-
-        # Schedule pure practical subjects simultaneously
-        if pure_practical_subjects:
-            self.schedule_simultaneous_practicals(pure_practical_subjects, timetable, teacher_schedules)
-
-        # Schedule practical classes for other subjects
-        for i, subject in enumerate(semester_data['subjects']):
-            credits = semester_data['credits'][i].split(':')
-            try:
-                credit_values = [int(c.strip()) for c in credits]
-            except ValueError:
-                raise ValueError(f"Invalid credit format for subject {subject}: {semester_data['credits'][i]}")
-
-            if len(credit_values) == 3 and credit_values[2] > 0 and (subject, semester_data['teachers'][i]) not in pure_practical_subjects:
-                self.schedule_practical(subject, semester_data['teachers'][i], timetable, teacher_schedules)
-
-        # Schedule theory and tutorial classes
-        for i, subject in enumerate(semester_data['subjects']):
-            credits = semester_data['credits'][i].split(':')
-            try:
-                credit_values = [int(c.strip()) for c in credits]
-            except ValueError:
-                raise ValueError(f"Invalid credit format for subject {subject}: {semester_data['credits'][i]}")
-
-            # Schedule theory classes
-            if credit_values[0] > 0:
-                self.schedule_theory(subject, semester_data['teachers'][i], credit_values[0], timetable, teacher_schedules)
-            
-            # Schedule tutorial classes
-            if len(credit_values) > 1 and credit_values[1] > 0:
-                self.schedule_tutorial(subject, semester_data['teachers'][i], credit_values[1], timetable, teacher_schedules)
-
-        return timetable
-
-    def schedule_practical(self, practical_subjects, timetable, teacher_schedules):
-        days = list(timetable.keys())
-        random.shuffle(days)
-        lab_slots = ["12:00-13:50", "15:35-17:25"]  # Labs only occur at these times
-
-        # Maintain batch assignment states for each time slot
-        batch_cycle = [["batch1", "batch2"], ["batch2", "batch3"], ["batch1", "batch3"]]  # Cyclic batches
-        batch_index = 0  # Track the current batch pair
-
-        for subject, teacher in practical_subjects.items():
-            sessions_scheduled = 0
-            while sessions_scheduled < 2:  # Schedule 2 sessions per week
-                for day in days:
-                    random.shuffle(lab_slots)  # Shuffle lab slots for randomness
-                    for slot in lab_slots:
-                        # Check if the slot is available for the day
-                        if not timetable[day].get(slot):
-                            # Assign the current batch pair to this lab
-                            assigned_batches = batch_cycle[batch_index]
-
-                            # Schedule the lab for each batch in the pair
-                            timetable[day][slot] = (
-                                f"{subject} (Lab) - {teacher} ({assigned_batches[0]} & {assigned_batches[1]})"
-                            )
-
-                            # Update teacher schedule
-                            teacher_schedules.setdefault(teacher, {}).setdefault(day, []).append(slot)
-
-                            # Rotate the batch cycle
-                            batch_index = (batch_index + 1) % len(batch_cycle)
-
-                            sessions_scheduled += 1
-                            if sessions_scheduled >= 2:
-                                break
-                    if sessions_scheduled >= 2:
-                        break
-
-
-
-        
-    def get_batch_subjects(self, subject):
-        """
-        Returns a list of subjects to assign to different batches.
-        This is based on the provided subject and its credit type (e.g., 0:0:n).
-        """
-        pure_practical_subjects = []
-        for i, subj in enumerate(self.semester_data['subjects']):
-            credits = self.semester_data['credits'][i].split(':')
-            try:
-                credit_values = [int(c.strip()) for c in credits]
-            except ValueError:
-                raise ValueError(f"Invalid credit format for subject {subj}: {self.semester_data['credits'][i]}")
-
-            # Include subjects with only practical credits
-            if len(credit_values) == 3 and credit_values[0] == 0 and credit_values[1] == 0 and credit_values[2] > 0:
-                pure_practical_subjects.append(subj)
-
-        # Return subjects that match the requested subject and can be scheduled simultaneously
-        return [s for s in pure_practical_subjects if s != subject]
-
-
-    def has_theory_and_practical(self, subject):
-        """
-        Checks if a subject has both theory and practical credits.
-        """
-        for i, subj in enumerate(self.semester_data['subjects']):
-            if subj == subject:
-                credits = self.semester_data['credits'][i].split(':')
+        if self.worker is not None and self.worker.is_alive():
+            return  # Already generating
+        if not self.save_semester_data():
+            return
+
+        self.cancel_event = threading.Event()
+        self.retries = 0
+        # Fixed seed and a result cache: regenerating an unchanged department is instant.
+        # A profiled run skips the cache so there is something to measure.
+        self.profiler = Profiler() if self.profile_var.get() else None
+        # Most constrained sessions of every semester first, so shared teachers are not left for last
+        engine = TimetableEngine(strategy='auto', seed=0, order='constrained', progress=self.progress_queue.put,
+                                 cancel=self.cancel_event, cache=None if self.profiler else ResultCache(),
+                                 **project_settings)
+        if self.profiler:
+            self.profiler.attach(engine)
+        self.worker = threading.Thread(
+            target=self._run_generation,
+            args=(engine, list(all_semester_data), self.cancel_event, self.profiler, last_run,
+                  self.semester_data['file_location']),
+            daemon=True
+        )
+        self._set_running(True)
+        self.worker.start()
+        self.window.after(100, self._poll_progress)
+
+    def _run_generation(self, engine, semesters, cancel_event, profiler=None, previous=None, views_dir=None):
+        # Runs on the worker thread: no widget access here, only the queue
+        try:
+            # openpyxl loads here, on the first export, not while the window opens
+            from timetable_export import VIEWS_WORKBOOK, resource_timetables, save_timetable_to_excel, save_views_workbook
+
+            timetables = None
+            if previous is not None and profiler is None:
                 try:
-                    credit_values = [int(c.strip()) for c in credits]
-                except ValueError:
-                    raise ValueError(f"Invalid credit format for subject {subject}: {self.semester_data['credits'][i]}")
-
-                # Return True if it has both theory and practical credits
-                return len(credit_values) == 3 and credit_values[0] > 0 and credit_values[2] > 0
-        return False
-
-
-    def schedule_theory(self, subject, teacher, num_classes, timetable, teacher_schedules):
-        days = list(timetable.keys())
-        random.shuffle(days)
-        classes_scheduled = 0
-
-        while classes_scheduled < num_classes:
-            for day in days:
-                if classes_scheduled >= num_classes:
-                    break
-
-                # Get available slots based on end time
-                end_time = datetime.strptime(self.day_end_time_vars[day].get(), '%H:%M')
-                available_slots = [slot for slot in time_slots 
-                                if datetime.strptime(slot.split('-')[1], '%H:%M') <= end_time]
-                random.shuffle(available_slots)
-
-                for slot in available_slots:
-                    if classes_scheduled >= num_classes:
-                        break
-
-                    # Pass teacher_schedules to is_slot_available
-                    if self.is_slot_available(day, slot, teacher, timetable, teacher_schedules):
-                        timetable[day][slot] = f"{subject} (Theory) - {teacher}"
-                        
-                        # Update teacher schedule
-                        if teacher not in teacher_schedules:
-                            teacher_schedules[teacher] = {}
-                        if day not in teacher_schedules[teacher]:
-                            teacher_schedules[teacher][day] = []
-                        teacher_schedules[teacher][day].append(slot)
-                        classes_scheduled += 1
-                        break
-
-    def schedule_tutorial(self, subject, teacher, num_classes, timetable, teacher_schedules):
-        days = list(timetable.keys())
-        random.shuffle(days)
-        classes_scheduled = 0
-
-        while classes_scheduled < num_classes:
-            for day in days:
-                if classes_scheduled >= num_classes:
-                    break
-
-                # Get available slots based on end time
-                end_time = datetime.strptime(self.day_end_time_vars[day].get(), '%H:%M')
-                available_slots = [
-                    (time_slots[i], time_slots[i + 1]) for i in range(len(time_slots) - 1)
-                    if datetime.strptime(time_slots[i + 1].split('-')[1], '%H:%M') <= end_time
-                ]
-                random.shuffle(available_slots)
-
-                for slot_pair in available_slots:
-                    slot1, slot2 = slot_pair
-                    start_time = slot1.split('-')[0]
-
-                    # Restrict starting times for tutorial classes
-                    if start_time in ['9:55', '12:00']:
-                        continue
-
-                    if (self.is_slot_available(day, slot1, teacher, timetable, teacher_schedules) and
-                            self.is_slot_available(day, slot2, teacher, timetable, teacher_schedules)):
-
-                        # Assign the tutorial class to these combined slots
-                        combined_slot = f"{slot1.split('-')[0]}-{slot2.split('-')[1]}"
-                        timetable[day][slot1] = f"{subject} (Tutorial) - {teacher}"
-                        timetable[day][slot2] = f"{subject} (Tutorial) - {teacher}"
-
-                        # Update teacher schedule
-                        if teacher not in teacher_schedules:
-                            teacher_schedules[teacher] = {}
-                        if day not in teacher_schedules[teacher]:
-                            teacher_schedules[teacher][day] = []
-                        teacher_schedules[teacher][day].extend([slot1, slot2])
-
-                        classes_scheduled += 1
-                        break
-
-    def schedule_simultaneous_practicals(self, practical_subjects, timetable, teacher_schedules):
-        days = list(timetable.keys())
-        random.shuffle(days)
-        sessions_needed = 3  # Schedule 3 sessions per week for each batch
-        sessions_scheduled = 0
-
-        while sessions_scheduled < sessions_needed:
-            for day in days:
-                if sessions_scheduled >= sessions_needed:
-                    break
-
-                # Try to find two consecutive slots
-                for i in range(len(time_slots) - 1):
-                    slot1 = time_slots[i]
-                    slot2 = time_slots[i + 1]
-                    
-                    # Pass teacher_schedules to is_slot_available
-                    all_teachers_available = all(
-                        self.is_slot_available(day, slot1, teacher, timetable, teacher_schedules) and
-                        self.is_slot_available(day, slot2, teacher, timetable, teacher_schedules)
-                        for _, teacher in practical_subjects
-                    )
-
-                    if all_teachers_available:
-                        # Check if all teachers have no adjacent classes
-                        slot1_start = slot1.split('-')[0]
-                        all_no_adjacent_classes = all(
-                            not self.has_adjacent_classes(day, slot1_start, teacher, teacher_schedules)
-                            for _, teacher in practical_subjects
-                        )
-
-                        if all_no_adjacent_classes:
-                            # Schedule all practical subjects in these slots
-                            batch_num = sessions_scheduled + 1
-                            combined_class = []
-                            for subject, teacher in practical_subjects:
-                                combined_class.append(f"{subject} (Lab - Batch {batch_num}) - {teacher}")
-                            
-                            combined_label = "\n".join(combined_class)
-                            timetable[day][slot1] = combined_label
-                            timetable[day][slot2] = combined_label
-
-                            # Update teacher schedules
-                            for _, teacher in practical_subjects:
-                                if teacher not in teacher_schedules:
-                                    teacher_schedules[teacher] = {}
-                                if day not in teacher_schedules[teacher]:
-                                    teacher_schedules[teacher][day] = []
-                                teacher_schedules[teacher][day].extend([slot1, slot2])
-
-                            sessions_scheduled += 1
-                            break
-
-    def is_slot_available(self, day, slot, teacher, timetable, teacher_schedules):
-        # Check if slot is already occupied in current timetable
-        if timetable[day][slot]:
-            return False
-        
-        # Check teacher availability across all semesters
-        if teacher in teacher_schedules:
-            for semester_day, semester_slots in teacher_schedules[teacher].items():
-                if semester_day == day:
-                    slot_start = datetime.strptime(slot.split('-')[0], '%H:%M')
-                    slot_end = datetime.strptime(slot.split('-')[1], '%H:%M')
-                    
-                    for existing_slot in semester_slots:
-                        existing_start = datetime.strptime(existing_slot.split('-')[0], '%H:%M')
-                        existing_end = datetime.strptime(existing_slot.split('-')[1], '%H:%M')
-                        
-                        # Check for time overlap
-                        if (slot_start <= existing_end and slot_end >= existing_start):
-                            return False
-        
-        return True
-
-    def has_adjacent_classes(self, day, slot_time, teacher, teacher_schedules):
-        """
-        Checks if the teacher has any classes immediately before or after the given slot.
-        
-        Args:
-            day: The day of the week
-            slot_time: Start time of the slot in HH:MM format
-            teacher: The teacher to check
-            teacher_schedules: Dictionary of all teacher schedules
-            
-        Returns:
-            bool: True if there are adjacent classes, False otherwise
-        """
-        if teacher not in teacher_schedules or day not in teacher_schedules[teacher]:
-            return False
-                
-        # Find the matching time slot to get the end time
-        slot_end = None
-        for time_slot in time_slots:
-            if time_slot.startswith(slot_time):
-                slot_end = datetime.strptime(time_slot.split('-')[1], '%H:%M')
+                    # Re-place only the edited subjects and rewrite only their semesters' files
+                    timetables, changed = reschedule(engine, previous, semesters)
+                except (ValueError, SchedulingError):
+                    timetables = None
+            if timetables is None:
+                timetables = engine.generate_timetables(semesters)
+                changed = list(range(len(semesters)))
+            for i, group in enumerate(changed):
+                if cancel_event.is_set():
+                    raise GenerationCancelled("Generation was cancelled")
+                self.progress_queue.put({'kind': 'export', 'semester': i + 1, 'semesters': len(changed)})
+                with profiler.phase('excel_export') if profiler else nullcontext():
+                    save_timetable_to_excel(timetables[group], semesters[group])
+            if changed and views_dir:
+                # Teacher-wise and room-wise sheets with weekly loads, next to this semester's file
+                with profiler.phase('excel_export') if profiler else nullcontext():
+                    save_views_workbook(os.path.join(views_dir, VIEWS_WORKBOOK),
+                                        *resource_timetables(engine.placements, semesters, engine.grid))
+            if changed and views_dir and any(term_dates(semester) for semester in semesters):
+                # Dated .ics/.csv calendars for every section and teacher over their terms
+                export_calendars(engine.placements, semesters, os.path.join(views_dir, CALENDAR_DIRECTORY), engine.grid)
+        except GenerationCancelled:
+            self.progress_queue.put({'kind': 'cancelled'})
+        except Exception as e:
+            self.progress_queue.put({'kind': 'error', 'message': str(e)})
+        else:
+            self.progress_queue.put({'kind': 'done', 'changed': len(changed),
+                                     'state': make_state(semesters, timetables, engine.placements, engine.grid,
+                                                         engine.rooms, engine.availability)})
+
+    def _poll_progress(self):
+        global last_run
+        finished = None
+        while True:
+            try:
+                event = self.progress_queue.get_nowait()
+            except queue.Empty:
                 break
-        
-        if slot_end is None:
-            return False  # Invalid slot time
-                
-        slot_start = datetime.strptime(slot_time, '%H:%M')
-        
-        for existing_slot in teacher_schedules[teacher][day]:
-            existing_start = datetime.strptime(existing_slot.split('-')[0], '%H:%M')
-            existing_end = datetime.strptime(existing_slot.split('-')[1], '%H:%M')
-                
-            # Check if there's less than a 5-minute break between classes
-            if abs((slot_start - existing_end).total_seconds()) < 300 or \
-            abs((existing_start - slot_end).total_seconds()) < 300:
-                return True
-                    
-        return False
-
-    
-    
-
-    def save_timetable_to_excel(self, timetable, semester_data):
-        # Create DataFrame with time slots as columns and days as rows
-        df = pd.DataFrame(timetable).T  # Transpose to get days as rows
-
-        # Create the full filepath
-        filepath = os.path.join(semester_data['file_location'], f"{semester_data['excel_name']}.xlsx")
-        
-        # Add metadata at the top
-        metadata = pd.DataFrame({
-            'Semester': [semester_data['semester']],
-            'Room Number': [semester_data['room_number']],
-            'Number of Students': [semester_data['num_students']],
-            'Term Start': [semester_data['term_start']],
-            'Term End': [semester_data['term_end']]
-        })
-        
-        # Write to Excel
-        with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-            metadata.to_excel(writer, sheet_name='Timetable', index=False)
-            df.to_excel(writer, sheet_name='Timetable', startrow=len(metadata)+2)
-            
-            # Get the workbook and worksheet objects
-            workbook = writer.book
-            worksheet = writer.sheets['Timetable']
-            
-            # Format the cells
-            for col in range(len(df.columns) + 1):  # +1 for index
-                worksheet.column_dimensions[chr(65 + col)].width = 20
-                
-            for row in range(len(df) + len(metadata) + 2):
-                worksheet.row_dimensions[row + 1].height = 30
+            if event['kind'] in ('done', 'cancelled', 'error'):
+                finished = event
+            else:
+                self._show_progress(event)
+
+        if finished is None:
+            self.window.after(100, self._poll_progress)
+            return
+
+        self._set_running(False)
+        if finished['kind'] == 'done':
+            last_run = finished['state']
+            if project is not None:
+                try:
+                    project.save_run(last_run['timetables'], last_run)
+                except sqlite3.Error as e:
+                    messagebox.showerror("Error", f"Could not save the timetables to {project.path}: {e}")
+            self.progress_bar['value'] = 100
+            self.progress_label.config(text=f"Done ({finished['changed']} timetables written)")
+            messagebox.showinfo("Success", "All timetables generated successfully!")
+            if self.profiler:
+                self._show_profile()
+        elif finished['kind'] == 'cancelled':
+            self.progress_bar['value'] = 0
+            self.progress_label.config(text="Generation cancelled")
+        else:
+            self.progress_label.config(text="Failed")
+            messagebox.showerror("Error", f"Error generating timetables: {finished['message']}")
+
+    def _show_progress(self, event):
+        kind = event['kind']
+        if kind == 'semester':
+            self.semester_progress = (event['semester'], event['semesters'])
+            self.progress_bar['value'] = 100 * (event['semester'] - 1) / event['semesters']
+            self.progress_label.config(text=f"Semester {event['semester']} of {event['semesters']}: {event['name']}")
+        elif kind == 'placed':
+            semester, semesters = self.semester_progress
+            done = event['placed'] / event['sessions'] if event['sessions'] else 1
+            self.progress_bar['value'] = 100 * (semester - 1 + done) / semesters
+            text = f"Semester {semester} of {semesters}: {event['placed']}/{event['sessions']} sessions placed"
+            if self.retries:
+                text += f" ({self.retries} {'retry' if self.retries == 1 else 'retries'})"
+            self.progress_label.config(text=text)
+        elif kind == 'retry':
+            self.retries += 1
+            semester, semesters = self.semester_progress
+            self.progress_label.config(text=f"Semester {semester} of {semesters}: retrying with the solver")
+        elif kind == 'cached':
+            self.progress_bar['value'] = 100
+            self.progress_label.config(text="Timetables unchanged, loaded from cache")
+        elif kind == 'rescheduled':
+            self.progress_label.config(text=f"Updating {event['sessions']} changed sessions "
+                                            f"in {event['semesters']} semesters")
+        elif kind == 'improve':
+            self.progress_label.config(text="Improving timetables...")
+        elif kind == 'export':
+            self.progress_label.config(text=f"Writing Excel file {event['semester']} of {event['semesters']}")
+
+    def _show_profile(self):
+        # The JSON report goes next to the workbooks of the current semester
+        path = os.path.join(self.semester_data['file_location'], "timetable_profile.json")
+        try:
+            self.profiler.save(path)
+            saved = f"\n\nFull report: {path}"
+        except OSError as e:
+            saved = f"\n\nCould not save the report: {e}"
+        messagebox.showinfo("Generation profile", self.profiler.summary() + saved)
+
+    def _set_running(self, running):
+        idle = tk.DISABLED if running else tk.NORMAL
+        self.generate_button.config(state=idle)
+        self.new_sem_button.config(state=idle)
+        self.open_project_button.config(state=idle)
+        self.semester_select.config(state=tk.DISABLED if running else "readonly")
+        self.cancel_button.config(state=tk.NORMAL if running else tk.DISABLED)
+
+    def cancel_generation(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.progress_label.config(text="Cancelling...")
 
 def main():
     app = SemesterGUI()
@@ -0,0 +1,18 @@
+import unittest
+
+from timetable_availability import Availability
+
+
+class MaxPerDayTest(unittest.TestCase):
+    def test_rejects_non_integers(self):
+        for value in (True, False, 0, -1, 2.5, '3'):
+            with self.subTest(value=value):
+                with self.assertRaisesRegex(ValueError, 'max_per_day'):
+                    Availability({'Rao': {'max_per_day': value}})
+
+    def test_accepts_a_positive_whole_number(self):
+        self.assertEqual(Availability({'Rao': {'max_per_day': 4}}).teachers['Rao']['max_per_day'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
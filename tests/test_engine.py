@@ -0,0 +1,32 @@
+import unittest
+
+from timetable_engine import ORDERS, STRATEGIES, TimetableEngine, normalize_semester_data
+
+
+def semester(name, subjects):
+    return normalize_semester_data({
+        'semester': name,
+        'subjects': [subject for subject, _, _ in subjects],
+        'teachers': [teacher for _, teacher, _ in subjects],
+        'credits': [credits for _, _, credits in subjects],
+    })
+
+
+class EmptySemesterTest(unittest.TestCase):
+    def test_every_strategy_and_order_keeps_an_empty_semester(self):
+        for strategy in STRATEGIES:
+            for order in ORDERS:
+                with self.subTest(strategy=strategy, order=order):
+                    department = [semester('A', [('Maths', 'Rao', '3:1:0'), ('Physics', 'Iyer', '3:0:2')]),
+                                  semester('B', []),
+                                  semester('C', [('Chemistry', 'Das', '2:0:0')])]
+                    engine = TimetableEngine(strategy=strategy, order=order, seed=0)
+                    timetables = engine.generate_timetables(department)
+                    self.assertEqual(len(timetables), 3)
+                    self.assertFalse(any(label for row in timetables[1].values() for label in row.values()))
+                    self.assertEqual(engine.placements[1], [])
+                    self.assertTrue(engine.placements[0] and engine.placements[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from timetable_availability import Availability
+from timetable_bench import synthetic_department
+from timetable_engine import TimetableEngine, normalize_semester_data
+from timetable_incremental import make_state, reschedule
+
+
+class KeptSessionTest(unittest.TestCase):
+    def test_annealing_keeps_sessions_inside_teacher_availability(self):
+        department = synthetic_department(semesters=3, subjects=5, seed=1, shared_teacher_ratio=0.0)
+        rules = {'unavailable': {'Monday': ['morning'], 'Tuesday': ['afternoon'], 'Friday': ['morning']}}
+        availability = Availability({teacher: rules for semester in department for teacher in semester['teachers']})
+        engine = TimetableEngine(strategy='auto', seed=0, availability=availability)
+        timetables = engine.generate_timetables(department)
+        state = make_state(department, timetables, engine.placements, engine.grid, engine.rooms, engine.availability)
+
+        edited = [{key: value for key, value in semester.items() if key != 'specs'} for semester in department]
+        edited[1]['credits'] = ['2:0:0'] + edited[1]['credits'][1:]
+        edited = [normalize_semester_data(semester) for semester in edited]
+        engine = TimetableEngine(strategy='auto', seed=0, availability=availability, improve_time=0.5)
+        reschedule(engine, state, edited)
+
+        masks = engine.teacher_masks
+        every_start = tuple((day, i) for day in engine.grid.days for i in range(len(engine.grid.slots)))
+        for placements in engine.placements.values():
+            for p in placements:
+                self.assertIn((p.day, p.start), masks.session_starts(every_start, p.session.teachers, p.session.length),
+                              p)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import timetable_parallel
+from timetable_bench import synthetic_department
+from timetable_parallel import search_seeds
+
+stopped_marker = None  # Written by the slow attempt once it sees the cancel event
+
+
+def fast_or_slow_attempt(all_semester_data, seed, strategy, time_limit, *args):
+    # Seed 0 completes at once; every other seed runs until cancelled or out of time
+    if seed:
+        deadline = time.monotonic() + time_limit
+        while time.monotonic() < deadline:
+            if timetable_parallel._cancel.wait(0.05):
+                open(stopped_marker, 'w').close()
+                break
+        return {'seed': seed, 'complete': False, 'score': None, 'error': 'cancelled', 'elapsed': 0.0}
+    return {'seed': seed, 'complete': True, 'timetables': [], 'placements': {}, 'teacher_schedules': {},
+            'score': 0, 'error': None, 'elapsed': 0.0}
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == 'fork', "the patched attempt needs forked workers")
+class KeepFirstTest(unittest.TestCase):
+    def test_returns_and_cancels_before_a_slow_attempts_time_limit(self):
+        global stopped_marker
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        stopped_marker = os.path.join(directory.name, 'stopped')
+        started = time.monotonic()
+        with mock.patch.object(timetable_parallel, 'run_attempt', fast_or_slow_attempt):
+            result = search_seeds(synthetic_department(semesters=1), seeds=[1, 0], workers=2, time_limit=30.0)
+        self.assertEqual(result['seed'], 0)
+        self.assertLess(time.monotonic() - started, 10.0)
+        while not os.path.exists(stopped_marker) and time.monotonic() - started < 10.0:
+            time.sleep(0.05)
+        self.assertTrue(os.path.exists(stopped_marker))
+
+
+class ArgumentTest(unittest.TestCase):
+    def test_no_attempts_is_a_clear_error(self):
+        department = synthetic_department(semesters=1)
+        for kwargs in ({'seeds': []}, {'attempts': 0}, {'attempts': -2}):
+            with self.subTest(**kwargs):
+                with self.assertRaisesRegex(ValueError, 'seed|attempts'):
+                    search_seeds(department, **kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from timetable_engine import TimetableEngine, normalize_semester_data
+from timetable_index import TeacherSchedules
+from timetable_profile import Profiler
+
+
+class RejectionTest(unittest.TestCase):
+    def test_practical_only_semester_attributes_rejections(self):
+        department = [normalize_semester_data({'semester': 'Labs', 'subjects': ['Circuits', 'Networks', 'Workshop'],
+                                               'teachers': ['Rao', 'Iyer', 'Das'],
+                                               'credits': ['0:0:2', '0:0:2', '0:0:4']})]
+        engine = TimetableEngine(seed=0)
+        teacher_schedules = TeacherSchedules()
+        for day in ('Monday', 'Tuesday', 'Wednesday'):
+            teacher_schedules.book_many('Rao', day, engine.grid.slots[:4])  # Booked by another department
+        profiler = Profiler()
+        profiler.attach(engine)
+        engine.generate_timetables(department, teacher_schedules)
+        rejections = profiler.report()['rejections']
+        self.assertTrue(rejections['by_teacher'].get('Rao'))
+        self.assertEqual(rejections['by_subject'].get('Circuits - Rao'), rejections['by_teacher']['Rao'])
+
+
+if __name__ == '__main__':
+    unittest.main()
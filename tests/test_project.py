@@ -0,0 +1,56 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from timetable_bench import synthetic_department
+from timetable_engine import TimetableEngine
+from timetable_incremental import make_state, reschedule
+from timetable_project import ProjectStore
+
+
+class Exploit:
+    ran = False
+
+    def __reduce__(self):
+        return (setattr, (Exploit, 'ran', True))
+
+
+class RunStateTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'department.ttproj')
+
+    def test_state_round_trips_through_the_project_file(self):
+        department = synthetic_department(semesters=5, subjects=6, seed=1)
+        engine = TimetableEngine(strategy='auto', seed=0)
+        timetables = engine.generate_timetables(department)
+        with ProjectStore(self.path) as project:
+            project.save_semesters(department)
+            project.save_run(timetables, make_state(department, timetables, engine.placements, engine.grid))
+        with ProjectStore(self.path) as project:
+            state = project.load_state()
+        self.assertEqual({group: [p.label for p in placements] for group, placements in state['placements'].items()},
+                         {group: [p.label for p in placements] for group, placements in engine.placements.items()})
+        rescheduled, changed = reschedule(TimetableEngine(strategy='auto', seed=0), state, department)
+        self.assertEqual(changed, [])
+        self.assertEqual(rescheduled, timetables)
+
+    def test_pickled_state_is_never_unpickled(self):
+        with ProjectStore(self.path) as project:
+            project._set('run_state', pickle.dumps(Exploit()))
+            project.connection.commit()
+        with ProjectStore(self.path) as project:
+            self.assertIsNone(project.load_state())
+        self.assertFalse(Exploit.ran)
+
+    def test_malformed_state_is_ignored(self):
+        with ProjectStore(self.path) as project:
+            for text in ('{"version": 6, "placements": {"0": [{"day": "Monday"}]}}', '[1, 2]', 'not json'):
+                project._set('run_state', text)
+                self.assertIsNone(project.load_state())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import time
+import unittest
+
+from timetable_bench import synthetic_department
+from timetable_server import JobNotFinished, SchedulingService, parse_job
+
+
+def department():
+    return [{key: value for key, value in semester.items() if key != 'specs'}
+            for semester in synthetic_department(semesters=2, subjects=4, seed=1)]
+
+
+def wait(job, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not job.finished_state and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return job
+
+
+class SchedulingServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.service = SchedulingService(workers=2, time_limit=1.0)
+        self.addCleanup(self.service.shutdown)
+
+    def test_cancel_leaves_a_finished_job_and_its_workbook(self):
+        job = wait(self.service.submit(*parse_job(department())))
+        self.assertEqual(job.status, 'done')
+        self.service.cancel(job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertIs(self.service.get(job.id), job)
+        self.assertTrue(os.path.exists(job.workbook))
+        self.service.delete(job.id)
+        self.assertIsNone(self.service.get(job.id))
+        self.assertFalse(os.path.exists(job.workbook))
+
+    def test_unfinished_job_cannot_be_deleted(self):
+        job = self.service.submit(*parse_job({'semesters': department(), 'improve': 30, 'workbook': False}))
+        with self.assertRaises(JobNotFinished):
+            self.service.delete(job.id)
+        wait(job)
+
+    def test_jobs_stop_at_the_service_time_limit(self):
+        started = time.monotonic()
+        jobs = [self.service.submit(*parse_job({'semesters': department(), 'improve': 30, 'time_limit': 60,
+                                                 'workbook': False})) for _ in range(2)]
+        for job in jobs:
+            self.assertEqual(job.options['time_limit'], 1.0)
+            self.assertEqual(wait(job).status, 'done')
+        self.assertLess(time.monotonic() - started, 15.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
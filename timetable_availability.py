@@ -0,0 +1,260 @@
+"""
+Teacher availability: days and hours a teacher cannot teach, a daily limit
+and preferred hours, loaded from JSON:
+
+    {
+      "midday": "13:00",
+      "teachers": {
+        "Dr. Rao": {
+          "unavailable_days": ["Saturday"],
+          "unavailable": {"Monday": ["morning"], "Friday": ["14:40-16:30"]},
+          "available": {"Wednesday": ["9:00-12:55"]},
+          "max_per_day": 4,
+          "preferred": {"Tuesday": ["morning"], "Thursday": ["9:00-10:50"]}
+        }
+      }
+    }
+
+Times are 'H:MM-H:MM' ranges or the half-days "morning" (slots ending by
+midday) and "afternoon" (slots starting from it). A slot is unavailable when
+it overlaps an unavailable range; on a day listed under "available" only
+slots lying inside one of its ranges are usable. max_per_day caps the slots a
+teacher teaches on one day, counting every semester (a two-slot lab counts
+two). Preferred slots are tried first but never required.
+
+The rules are compiled once per grid into TeacherMasks: one slot-index
+bitmask per teacher and day, so the schedulers drop unusable starts from
+their candidate lists before any booking is looked up, and solver sessions
+only get the starts their teachers can use.
+"""
+import json
+
+from timetable_index import slot_minutes, time_to_minutes
+
+MIDDAY = '13:00'  # Default boundary between the "morning" and "afternoon" half-days
+HALF_DAYS = ('morning', 'afternoon')
+RULE_KEYS = ('unavailable_days', 'unavailable', 'available', 'max_per_day', 'preferred')
+
+
+def _parse_days(teacher, days):
+    # Validates unavailable_days; a single day name counts as a one-entry list
+    if isinstance(days, str):
+        days = [days]
+    if not isinstance(days, (list, tuple)) or not all(isinstance(day, str) for day in days):
+        raise ValueError(f"Teacher {teacher}: unavailable_days must be a list of day names")
+    return list(days)
+
+
+def _parse_times(teacher, key, days):
+    # Validates {day: [range or half-day, ...]}; a single string counts as a one-entry list
+    if not isinstance(days, dict):
+        raise ValueError(f"Teacher {teacher}: {key} must map days to lists of times")
+    parsed = {}
+    for day, times in days.items():
+        if isinstance(times, str):
+            times = [times]
+        entries = []
+        for value in times:
+            if value in HALF_DAYS:
+                entries.append(value)
+                continue
+            try:
+                start, end = slot_minutes(value)
+            except (AttributeError, ValueError):
+                raise ValueError(f"Teacher {teacher}: invalid time range {value!r} in {key}; "
+                                 f"expected 'H:MM-H:MM', 'morning' or 'afternoon'")
+            if end <= start:
+                raise ValueError(f"Teacher {teacher}: time range {value!r} in {key} ends before it starts")
+            entries.append(value)
+        parsed[day] = entries
+    return parsed
+
+
+class Availability:
+    """
+    Every teacher's availability rules as entered (see the module docstring).
+
+    Args:
+        teachers: {teacher: rules} with the keys of RULE_KEYS, all optional
+        midday: 'H:MM' boundary between the morning and afternoon half-days
+
+    Raises:
+        ValueError: On an unknown key, a malformed time or a bad max_per_day
+    """
+
+    def __init__(self, teachers=None, midday=MIDDAY):
+        self.midday = midday
+        try:
+            time_to_minutes(midday)
+        except ValueError:
+            raise ValueError(f"Invalid midday time {midday!r}")
+        self.teachers = {}
+        for teacher, rules in (teachers or {}).items():
+            unknown = set(rules) - set(RULE_KEYS)
+            if unknown:
+                raise ValueError(f"Teacher {teacher}: unknown availability keys {sorted(unknown)}")
+            max_per_day = rules.get('max_per_day')
+            # bool is an int subclass, but JSON true or false is not a number of lessons
+            if max_per_day is not None and (isinstance(max_per_day, bool) or not isinstance(max_per_day, int)
+                                            or max_per_day < 1):
+                raise ValueError(f"Teacher {teacher}: max_per_day must be a positive whole number")
+            self.teachers[teacher] = {
+                'unavailable_days': _parse_days(teacher, rules.get('unavailable_days') or []),
+                'unavailable': _parse_times(teacher, 'unavailable', rules.get('unavailable') or {}),
+                'available': _parse_times(teacher, 'available', rules.get('available') or {}),
+                'max_per_day': max_per_day,
+                'preferred': _parse_times(teacher, 'preferred', rules.get('preferred') or {}),
+            }
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(config.get('teachers'), config.get('midday') or MIDDAY)
+
+    @classmethod
+    def load(cls, path):
+        """Reads availability rules from a JSON file (see the module docstring)."""
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {'midday': self.midday, 'teachers': {teacher: {key: value for key, value in rules.items() if value}
+                                                    for teacher, rules in self.teachers.items()}}
+
+    def __bool__(self):
+        return bool(self.teachers)
+
+    def compile(self, grid):
+        """
+        Returns the TeacherMasks of these rules on grid.
+
+        Raises:
+            ValueError: A rule names a day the grid does not have
+        """
+        return TeacherMasks(self, grid)
+
+
+class TeacherMasks:
+    """
+    Availability rules compiled onto a SlotGrid.
+
+    Teachers without rules are unrestricted and cost nothing: every query
+    about them returns its input unchanged.
+
+    Attributes:
+        allowed: {teacher: per-day slot-index bitmask of usable slots}
+        preferred: {teacher: per-day slot-index bitmask of preferred slots}
+        max_per_day: {teacher: most slots taught on one day}
+    """
+
+    def __init__(self, availability, grid):
+        self.grid = grid
+        self.full = (1 << len(grid.slots)) - 1
+        midday = time_to_minutes(availability.midday)
+        self.allowed = {}
+        self.preferred = {}
+        self.max_per_day = {}
+        self._starts = {}  # (starts, teachers, length) -> filtered starts, so sessions keep sharing tuples
+
+        def mask(times, inside):
+            # Slot bitmask of times: slots inside a range, or else overlapping one
+            bits = 0
+            for value in times:
+                for i, (start, end) in enumerate(grid.minutes):
+                    if value == 'morning':
+                        hit = end <= midday
+                    elif value == 'afternoon':
+                        hit = start >= midday
+                    else:
+                        low, high = slot_minutes(value)
+                        hit = low <= start and end <= high if inside else start < high and end > low
+                    if hit:
+                        bits |= 1 << i
+            return bits
+
+        for teacher, rules in availability.teachers.items():
+            for key in ('unavailable', 'available', 'preferred'):
+                for day in list(rules[key]) + rules['unavailable_days']:
+                    if day not in grid.day_index:
+                        raise ValueError(f"Teacher {teacher}: unknown day {day!r} in availability")
+            days = []
+            for day in grid.days:
+                usable = 0 if day in rules['unavailable_days'] else self.full
+                if day in rules['available']:
+                    usable &= mask(rules['available'][day], True)
+                usable &= ~mask(rules['unavailable'].get(day, ()), False)
+                days.append(usable)
+            if any(usable != self.full for usable in days):
+                self.allowed[teacher] = days
+            if rules['preferred']:
+                self.preferred[teacher] = [mask(rules['preferred'].get(day, ()), True) for day in grid.days]
+            if rules['max_per_day'] is not None:
+                self.max_per_day[teacher] = rules['max_per_day']
+
+    def __bool__(self):
+        return bool(self.allowed or self.preferred or self.max_per_day)
+
+    def day_mask(self, teachers, day):
+        """Slots every one of teachers can use on day."""
+        usable = self.full
+        d = self.grid.day_index[day]
+        for teacher in teachers:
+            days = self.allowed.get(teacher)
+            if days is not None:
+                usable &= days[d]
+        return usable
+
+    def usable(self, teachers, day, starts, length=1):
+        """The start indices of starts whose length slots all teachers can use on day."""
+        if not any(teacher in self.allowed for teacher in teachers):
+            return list(starts)
+        usable = self.day_mask(teachers, day)
+        footprint = (1 << length) - 1
+        return [i for i in starts if not (footprint << i) & ~usable]
+
+    def session_starts(self, starts, teachers, length):
+        """The (day, start index) pairs of starts all teachers can use for a session of length slots."""
+        if not any(teacher in self.allowed for teacher in teachers):
+            return starts
+        key = (starts, tuple(teachers), length)
+        filtered = self._starts.get(key)
+        if filtered is None:
+            footprint = (1 << length) - 1
+            masks = {day: self.day_mask(teachers, day) for day in self.grid.days}
+            filtered = self._starts[key] = tuple((day, i) for day, i in starts if not (footprint << i) & ~masks[day])
+        return filtered
+
+    def is_preferred(self, teachers, day, start, length=1):
+        """True if teachers with preferences all prefer every slot of the session (and at least one has them)."""
+        footprint = ((1 << length) - 1) << start
+        d = self.grid.day_index[day]
+        found = False
+        for teacher in teachers:
+            days = self.preferred.get(teacher)
+            if days is not None:
+                if footprint & ~days[d]:
+                    return False
+                found = True
+        return found
+
+    def prefer(self, teachers, day, starts, length=1):
+        """starts with the preferred ones first, keeping their order otherwise."""
+        if not any(teacher in self.preferred for teacher in teachers):
+            return starts
+        return sorted(starts, key=lambda i: not self.is_preferred(teachers, day, i, length))
+
+    def fits_day(self, teacher_schedules, teachers, day, length=1):
+        """True if length more slots on day keep every teacher within max_per_day."""
+        for teacher in teachers:
+            limit = self.max_per_day.get(teacher)
+            if limit is not None and len(teacher_schedules.slots(teacher, day)) + length > limit:
+                return False
+        return True
+
+    def day_capacity(self, teacher, day, allowed):
+        """Upper bound on the sessions teacher can give on day, given the day's AllowedSlots."""
+        capacity = allowed.max_sessions
+        days = self.allowed.get(teacher)
+        if days is not None:
+            capacity = min(capacity, (allowed.single_mask & days[self.grid.day_index[day]]).bit_count())
+        limit = self.max_per_day.get(teacher)
+        return capacity if limit is None else min(capacity, limit)
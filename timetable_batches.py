@@ -0,0 +1,221 @@
+"""
+Lab batch allocation.
+
+For practicals a section is split into batches (its 'batches' key, BATCHES by
+default; see timetable_rooms). A practical credit is one lab slot per batch
+per week, taught in two-slot lab blocks, so every batch needs
+lab_blocks(practical) blocks of each practical subject.
+
+A theory+practical subject's lab sessions each teach up to LAB_SEATS batches
+at once; allocate_labs() spreads the batches over as few sessions as that
+allows, never putting a batch twice into one session, as a maximum flow
+(source -> batch -> session -> sink).
+
+The pure-practical (0:0:X) subjects of a section run side by side in shared
+blocks, one batch per subject, each in its own lab. Which batch takes which
+subject in which block is an edge colouring of the batch x subject
+multigraph (one edge per block a batch needs of a subject): by König's
+theorem it needs only as many blocks as the largest degree, and each block is
+one perfect matching of the graph padded to be regular, found by the same
+flow. allocate_group_labs() returns that schedule.
+
+Both are deterministic and polynomial, so every batch gets exactly its
+practical hours with no randomized retries; the schedulers then only choose
+when each session or block meets and which lab rooms it takes.
+"""
+from collections import deque
+from functools import lru_cache
+
+BATCHES = 3  # Default number of batches a section is split into
+LAB_LENGTH = 2  # Slots of one lab block
+LAB_SEATS = 2  # Batches a theory+practical lab session teaches at once
+
+
+def lab_blocks(practical):
+    """Two-slot lab blocks a batch needs per week for practical credits."""
+    return -(-practical // LAB_LENGTH)
+
+
+def max_flow(capacity, source, sink):
+    """
+    Edmonds-Karp maximum flow.
+
+    Args:
+        capacity: {node: {node: capacity}}; nodes are any hashable values
+
+    Returns:
+        tuple: (flow value, {node: {node: flow}} over the edges of capacity)
+    """
+    residual = {}
+    for node, edges in capacity.items():
+        residual.setdefault(node, {})
+        for other, amount in edges.items():
+            residual[node][other] = residual[node].get(other, 0) + amount
+            residual.setdefault(other, {}).setdefault(node, 0)
+    total = 0
+    while True:
+        # Shortest augmenting path by breadth-first search
+        parent = {source: None}
+        queue = deque([source])
+        while queue and sink not in parent:
+            node = queue.popleft()
+            for other, amount in residual[node].items():
+                if amount and other not in parent:
+                    parent[other] = node
+                    queue.append(other)
+        if sink not in parent:
+            break
+        path = []
+        node = sink
+        while parent[node] is not None:
+            path.append((parent[node], node))
+            node = parent[node]
+        pushed = min(residual[u][v] for u, v in path)
+        for u, v in path:
+            residual[u][v] -= pushed
+            residual[v][u] += pushed
+        total += pushed
+    flow = {node: {other: amount - residual[node][other] for other, amount in edges.items()
+                   if amount > residual[node][other]}
+            for node, edges in capacity.items()}
+    return total, flow
+
+
+@lru_cache(maxsize=None)
+def allocate_labs(batches, blocks, seats=LAB_SEATS):
+    """
+    Batches taught by each lab session of a theory+practical subject.
+
+    Args:
+        batches: Batches the section is split into
+        blocks: Lab blocks every batch needs per week (see lab_blocks)
+        seats: Batches one session teaches at once
+
+    Returns:
+        tuple: One tuple of 1-based batch numbers per weekly lab session
+    """
+    if not blocks:
+        return ()
+    sessions = max(-(-batches * blocks // seats), blocks)
+    capacity = {'source': {('batch', b): blocks for b in range(1, batches + 1)}}
+    for b in range(1, batches + 1):
+        capacity['batch', b] = {('session', s): 1 for s in range(sessions)}
+    for s in range(sessions):
+        capacity['session', s] = {'sink': seats}
+    _, flow = max_flow(capacity, 'source', 'sink')
+    taught = [[] for _ in range(sessions)]
+    for b in range(1, batches + 1):
+        for (_, s) in flow.get(('batch', b), {}):
+            taught[s].append(b)
+    return tuple(tuple(session) for session in taught)
+
+
+@lru_cache(maxsize=None)
+def allocate_group_labs(blocks, batches):
+    """
+    Batch of every pure-practical subject in each of a section's shared lab blocks.
+
+    Args:
+        blocks: Lab blocks every batch needs of each subject, one entry per subject
+        batches: Batches the section is split into
+
+    Returns:
+        tuple: One entry per weekly block, each a tuple of (subject index,
+            1-based batch number) pairs for the subjects meeting in it
+    """
+    subjects = len(blocks)
+    if not subjects or not any(blocks):
+        return ()
+    degree = max(sum(blocks), batches * max(blocks))  # Fewest blocks possible
+    size = batches + subjects
+    # count[i][j]: blocks batch i still needs of subject j. One dummy subject
+    # per batch and one dummy batch per subject pad the graph until every node
+    # has degree `degree`; padding edges always have a dummy end
+    count = [[blocks[j] if i < batches and j < subjects else 0 for j in range(size)] for i in range(size)]
+    row_deficit = [degree - sum(row) for row in count]
+    column_deficit = [degree - sum(count[i][j] for i in range(size)) for j in range(size)]
+
+    def pad(rows, columns):
+        # North-west corner fill until either side has no deficit left
+        rows, columns = list(rows), list(columns)
+        r = c = 0
+        while r < len(rows) and c < len(columns):
+            i, j = rows[r], columns[c]
+            amount = min(row_deficit[i], column_deficit[j])
+            count[i][j] += amount
+            row_deficit[i] -= amount
+            column_deficit[j] -= amount
+            if not row_deficit[i]:
+                r += 1
+            if not column_deficit[j]:
+                c += 1
+
+    real_batches, dummy_batches = range(batches), range(batches, size)
+    real_subjects, dummy_subjects = range(subjects), range(subjects, size)
+    pad(real_batches, dummy_subjects)
+    pad(dummy_batches, real_subjects)
+    pad(dummy_batches, dummy_subjects)
+
+    schedule = []
+    for _ in range(degree):
+        # A regular bipartite multigraph always has a perfect matching
+        capacity = {'source': {('batch', i): 1 for i in range(size)}}
+        for i in range(size):
+            capacity['batch', i] = {('subject', j): 1 for j in range(size) if count[i][j]}
+        for j in range(size):
+            capacity['subject', j] = {'sink': 1}
+        matched, flow = max_flow(capacity, 'source', 'sink')
+        if matched != size:
+            raise AssertionError("Regular bipartite graph without a perfect matching")
+        block = []
+        for i in range(size):
+            (_, j), = flow['batch', i]
+            count[i][j] -= 1
+            if i < batches and j < subjects:
+                block.append((j, i + 1))
+        schedule.append(tuple(sorted(block)))
+    return tuple(schedule)
+
+
+def lab_batches(practical, batches):
+    """Session.batches of a theory+practical subject's labs: ((batch numbers,),) per weekly lab session."""
+    return tuple((taught,) for taught in allocate_labs(batches, lab_blocks(practical)))
+
+
+def group_labs(specs, batches):
+    """
+    The shared lab blocks of a section's pure-practical subjects.
+
+    Blocks meeting the same subjects are weekly copies of one Session, so
+    they are returned together.
+
+    Args:
+        specs: The section's pure-practical SubjectSpecs
+        batches: Batches the section is split into
+
+    Returns:
+        list: (subjects, batches) per distinct set of subjects meeting
+            together: subjects are (subject, teacher) pairs, and batches holds
+            one entry per weekly block, a tuple of ((batch number,), ...)
+            aligned with subjects
+    """
+    schedule = allocate_group_labs(tuple(lab_blocks(spec.practical) for spec in specs), batches)
+    blocks = {}
+    for block in schedule:
+        indices = tuple(j for j, _ in block)
+        blocks.setdefault(indices, []).append(tuple((batch,) for _, batch in block))
+    return [([(specs[j].subject, specs[j].teacher) for j in indices], tuple(copies))
+            for indices, copies in blocks.items()]
+
+
+def lab_session_count(practical, batches):
+    """Weekly lab sessions of a theory+practical subject."""
+    return len(allocate_labs(batches, lab_blocks(practical)))
+
+
+def group_lab_count(practicals, batches):
+    """Weekly shared lab blocks of a section's pure-practical subjects, given their practical credits."""
+    blocks = [lab_blocks(practical) for practical in practicals]
+    if not any(blocks):
+        return 0
+    return max(sum(blocks), batches * max(blocks))
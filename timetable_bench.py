@@ -0,0 +1,235 @@
+"""
+Benchmark suite for the scheduling pipeline on synthetic departments.
+
+Each scenario generates a department (semesters, subjects per semester,
+shared-teacher ratio, credit mix and per-day end times), runs it through
+TimetableEngine and the workbook export, and times every phase separately
+with a phase-only Profiler:
+practical, simultaneous practical, theory, tutorial, the interleaved pass
+of --order constrained, solver fallback and Excel export. Results are written as JSON so two runs can be compared:
+
+    python timetable_bench.py --out before.json
+    python timetable_bench.py --out after.json --compare before.json
+
+--startup also times importing each entry point in a fresh interpreter and
+lists the heavy modules (NumPy, openpyxl, pandas, Tk) it pulled in, which
+should be none but Tk for the GUI: export and the NumPy backend load theirs
+on first use.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from timetable_engine import DAYS, ORDERS, STRATEGIES, TimetableEngine, normalize_semester_data
+from timetable_errors import SchedulingError
+from timetable_export import save_workbook
+from timetable_occupancy import BACKENDS
+from timetable_profile import Profiler
+
+# Entry point -> heavy modules importing it must not load
+STARTUP_MODULES = {
+    'timetable_engine': ('numpy', 'openpyxl', 'pandas', 'tkinter'),
+    'timetable_cli': ('numpy', 'openpyxl', 'pandas', 'tkinter'),
+    'Goated_timetable_generator': ('numpy', 'openpyxl', 'pandas'),
+    'timetable_export': ('pandas', 'tkinter'),
+}
+STARTUP_PROBE = ("import json, sys, time; started = time.perf_counter(); import {module}; "
+                 "print(json.dumps({{'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}}))")
+PHASES = ['practical', 'simultaneous_practical', 'theory', 'tutorial', 'interleaved', 'solver', 'excel_export']
+
+SCENARIOS = {
+    'small': dict(semesters=2, subjects=5, shared_teacher_ratio=0.2, credit_mix=['3:1:0', '3:0:2', '0:0:2']),
+    'medium': dict(semesters=8, subjects=6, shared_teacher_ratio=0.3, credit_mix=['3:1:0', '3:1:2', '0:0:2', '2:0:0']),
+    'large': dict(semesters=24, subjects=6, shared_teacher_ratio=0.3,
+                  credit_mix=['3:1:0', '3:0:2', '0:0:2', '2:0:0', '3:0:0']),
+    'theory_heavy': dict(semesters=12, subjects=8, shared_teacher_ratio=0.5, credit_mix=['3:1:0', '4:0:0']),
+    'lab_heavy': dict(semesters=12, subjects=6, shared_teacher_ratio=0.3, credit_mix=['3:0:2', '0:0:4', '0:0:2']),
+    'short_days': dict(semesters=8, subjects=5, shared_teacher_ratio=0.2, credit_mix=['3:1:0', '3:0:2', '0:0:2'],
+                       end_times={'Friday': '14:40', 'Saturday': '12:55'}),
+}
+
+
+def synthetic_department(semesters=4, subjects=6, shared_teacher_ratio=0.3, credit_mix=('3:1:0', '3:0:2', '0:0:2'),
+                         end_times=None, seed=0):
+    """
+    Builds normalized semester records for a made-up department.
+
+    Args:
+        semesters: Number of semesters (sections)
+        subjects: Subjects per semester
+        shared_teacher_ratio: Fraction of subjects taught by a small pool of
+            teachers shared across semesters; the rest get their own teacher
+        credit_mix: Credit strings each subject's credits are drawn from
+        end_times: End time for every day ('H:MM') or a {day: 'H:MM'} dict;
+            days left out end at the default end time
+        seed: Seed for the generator, so a scenario is the same on every run
+    """
+    rng = random.Random(seed)
+    if isinstance(end_times, str):
+        end_times = {day: end_times for day in DAYS}
+    pool_size = max(1, round(semesters * subjects * shared_teacher_ratio / 2))  # About two subjects each
+    records = []
+    for s in range(semesters):
+        record = {'semester': f"Sem {s + 1}", 'subjects': [], 'teachers': [], 'credits': [],
+                  'excel_name': f"sem_{s + 1}", 'day_end_times': dict(end_times or {})}
+        for k in range(subjects):
+            if rng.random() < shared_teacher_ratio:
+                teacher = f"Shared {rng.randrange(pool_size) + 1}"
+            else:
+                teacher = f"Teacher {s + 1}.{k + 1}"
+            record['subjects'].append(f"Subject {s + 1}.{k + 1}")
+            record['teachers'].append(teacher)
+            record['credits'].append(rng.choice(list(credit_mix)))
+        records.append(normalize_semester_data(record))
+    return records
+
+
+def run_once(all_semester_data, strategy='auto', seed=0, export=True, backend='python', order='entered'):
+    """
+    Generates (and exports) one department.
+
+    Returns:
+        dict: complete flag, error, per-phase seconds, total seconds, solver
+            fallbacks and number of sessions placed
+    """
+    profiler = Profiler(count_checks=False)
+    engine = profiler.attach(TimetableEngine(strategy=strategy, seed=seed, backend=backend, order=order))
+    started = time.perf_counter()
+    result = {'complete': False, 'error': None}
+    try:
+        timetables = engine.generate_timetables(all_semester_data)
+    except SchedulingError as e:
+        result['error'] = str(e)
+    else:
+        result['complete'] = True
+        if export:
+            with tempfile.TemporaryDirectory() as directory, profiler.phase('excel_export'):
+                save_workbook(timetables, all_semester_data, os.path.join(directory, 'bench.xlsx'))
+    phases = {phase: profiler.phases.get(phase, 0.0) for phase in PHASES}
+    fallbacks = profiler.runs.get('solver', 0) if strategy == 'auto' else 0
+    result.update(phases=phases, total=time.perf_counter() - started, solver_fallbacks=fallbacks,
+                  sessions=sum(len(placements) for placements in engine.placements.values()))
+    return result
+
+
+def run_scenario(name, params, repeat=3, strategy='auto', export=True, backend='python', order='entered'):
+    """Runs one scenario repeat times (different engine seeds, same department) and summarizes it."""
+    department = synthetic_department(**params)
+    runs = [run_once(department, strategy, seed, export, backend, order) for seed in range(repeat)]
+    complete = [run for run in runs if run['complete']]
+    phases = {}
+    for phase in PHASES:
+        samples = [run['phases'][phase] for run in complete]
+        phases[phase] = {'min': min(samples), 'median': statistics.median(samples),
+                         'mean': statistics.fmean(samples)} if samples else None
+    totals = [run['total'] for run in complete]
+    return {
+        'scenario': name,
+        'params': params,
+        'strategy': strategy,
+        'backend': backend,
+        'order': order,
+        'repeat': repeat,
+        'complete': len(complete),
+        'errors': [run['error'] for run in runs if run['error']],
+        'sessions': complete[0]['sessions'] if complete else 0,
+        'solver_fallbacks': sum(run['solver_fallbacks'] for run in runs),
+        'phases': phases,
+        'total': {'min': min(totals), 'median': statistics.median(totals)} if totals else None,
+    }
+
+
+def measure_startup(repeat=5):
+    """
+    Times importing each entry point of STARTUP_MODULES in a fresh interpreter.
+
+    Returns:
+        dict: {module: {'seconds': median import seconds, 'heavy': the heavy
+            modules it should not load but did}}
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module, heavy in STARTUP_MODULES.items():
+        samples = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', STARTUP_PROBE.format(module=module)], cwd=directory,
+                                    capture_output=True, text=True, check=True).stdout
+            probe = json.loads(output)
+            samples.append(probe['seconds'])
+        results[module] = {'seconds': statistics.median(samples),
+                           'heavy': [name for name in heavy if name in probe['modules']]}
+    return results
+
+
+def compare(results, baseline):
+    """Prints the median time ratio (current / baseline) of every phase both runs have."""
+    previous = {result['scenario']: result for result in baseline['results']}
+    for result in results:
+        old = previous.get(result['scenario'])
+        if old is None or not result['total'] or not old['total']:
+            continue
+        cells = []
+        for phase in PHASES + ['total']:
+            new_value = result['total'] if phase == 'total' else result['phases'][phase]
+            old_value = old['total'] if phase == 'total' else old['phases'].get(phase)
+            if new_value and old_value and old_value['median'] > 0:
+                cells.append(f"{phase} x{new_value['median'] / old_value['median']:.2f}")
+        print(f"{result['scenario']}: " + ', '.join(cells))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark timetable generation on synthetic departments.")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable); default: all")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario")
+    parser.add_argument('--strategy', choices=STRATEGIES, default='auto', help="Engine strategy to benchmark")
+    parser.add_argument('--backend', choices=BACKENDS, default='python', help="Engine booking backend")
+    parser.add_argument('--order', choices=ORDERS, default='entered', help="Engine placement order")
+    parser.add_argument('--no-excel', action='store_true', help="Skip the export phase")
+    parser.add_argument('--startup', action='store_true', help="Also time importing each entry point")
+    parser.add_argument('--out', default='timetable_bench.json', help="JSON results file")
+    parser.add_argument('--compare', metavar='BASELINE', help="Earlier results file to compare against")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        result = run_scenario(name, SCENARIOS[name], args.repeat, args.strategy, not args.no_excel, args.backend,
+                              args.order)
+        results.append(result)
+        total = f"{result['total']['median']:.3f}s" if result['total'] else "no complete run"
+        print(f"{name}: {result['sessions']} sessions, median {total} "
+              f"({result['complete']}/{result['repeat']} complete, {result['solver_fallbacks']} solver fallbacks)")
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.startup:
+        report['startup'] = measure_startup()
+        for module, startup in report['startup'].items():
+            heavy = f", loads {', '.join(startup['heavy'])}" if startup['heavy'] else ''
+            print(f"import {module}: {startup['seconds'] * 1000:.1f}ms{heavy}")
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+On-disk, content-addressed cache of generated timetables.
+
+A run is keyed by a SHA-256 of its normalized semester inputs, the slot
+grid, the seed and the engine options that change the result, so an
+unchanged department is a cache hit and every stored result can be
+regenerated exactly from what its key was built from. Each entry is one
+pickle file named after its key; reads refresh the file's mtime and writes
+evict the least recently used entries once the directory exceeds its size
+bound.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+CACHE_VERSION = 4  # Bump when the stored layout or scheduling semantics change
+# Semester keys that never influence the generated timetable
+UNHASHED_KEYS = {'specs', 'file_location', 'excel_name'}
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'timetable_generator')
+
+
+def cache_key(all_semester_data, grid, seed, options=None, teacher_schedules=None):
+    """
+    Hashes everything a run's result depends on.
+
+    Args:
+        all_semester_data: Semester records; output-only keys are ignored
+        grid: The SlotGrid scheduled on
+        seed: The engine seed
+        options: Other result-changing engine options (strategy, weights, ...)
+        teacher_schedules: Bookings the run starts from, if any
+    """
+    payload = {
+        'version': CACHE_VERSION,
+        'semesters': [{key: value for key, value in semester.items() if key not in UNHASHED_KEYS}
+                      for semester in all_semester_data],
+        'grid': grid.to_dict(),
+        'seed': seed,
+        'options': options or {},
+        'bookings': teacher_schedules.to_dict() if teacher_schedules else {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Size-bounded LRU directory of results.
+
+    Args:
+        directory: Where entries live; created on first write
+        max_bytes: Total size the entries may take before the least recently
+            used ones are deleted
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def get(self, key):
+        """Returns the stored value for key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so readers never see half an entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,308 @@
+"""
+Dated term calendars: the weekly timetable expanded over each semester's
+term_start..term_end and written as iCalendar (.ics) and CSV files, one per
+section and one per teacher.
+
+Expansion is lazy. section_occurrences() walks the term one date at a time
+and yields that date's sessions, and teacher_occurrences() merges the
+sections a teacher teaches in by date, so the writers stream events to disk
+without a department's term ever being held in memory.
+
+Dates are dd/mm/yyyy as the GUI asks for them (yyyy-mm-dd is accepted too).
+Holidays cancel every class on a date; exclusions cancel one section's
+classes, e.g. for its exam weeks. Both can be loaded from JSON, with
+'start..end' for a range of days:
+
+    {
+      "holidays": ["26/01/2026", "02/10/2026..04/10/2026"],
+      "exclusions": {"Sem 3": ["10/11/2026..20/11/2026"]}
+    }
+"""
+import csv
+import heapq
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from timetable_grid import DEFAULT_GRID
+
+CALENDAR_DIRECTORY = 'calendars'  # Default folder, next to the workbooks, for the exported calendars
+CSV_COLUMNS = ['date', 'day', 'start', 'end', 'section', 'kind', 'summary', 'teachers', 'rooms']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+UID_NAMESPACE = uuid.UUID('6f1c9a52-3b0e-4d7a-9c41-2f8e5d7b1a60')
+
+
+def parse_date(value):
+    """
+    Reads a dd/mm/yyyy (or yyyy-mm-dd) date.
+
+    Raises:
+        ValueError: If value is not such a date
+    """
+    value = str(value).strip()
+    for pattern in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, pattern).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date {value!r}, expected dd/mm/yyyy")
+
+
+def parse_dates(entries):
+    """A set of dates from entries that are single dates or 'start..end' ranges."""
+    dates = set()
+    for entry in entries:
+        first, _, last = str(entry).partition('..')
+        day = parse_date(first)
+        last = parse_date(last) if last else day
+        if last < day:
+            raise ValueError(f"Date range {entry!r} ends before it starts")
+        while day <= last:
+            dates.add(day)
+            day += timedelta(days=1)
+    return dates
+
+
+def term_dates(semester_data):
+    """(first, last) date of a semester's term, or None if either is unset."""
+    if not semester_data.get('term_start') or not semester_data.get('term_end'):
+        return None
+    first, last = parse_date(semester_data['term_start']), parse_date(semester_data['term_end'])
+    if last < first:
+        raise ValueError(f"{semester_data.get('semester')}: the term ends before it starts")
+    return first, last
+
+
+class TermCalendar:
+    """
+    Days without classes.
+
+    Args:
+        holidays: Dates off for every section
+        exclusions: {semester name: dates} off for that section only
+    """
+
+    def __init__(self, holidays=(), exclusions=None):
+        self.holidays = frozenset(holidays)
+        self.exclusions = {name: frozenset(dates) for name, dates in (exclusions or {}).items()}
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(parse_dates(config.get('holidays', [])),
+                   {name: parse_dates(entries) for name, entries in config.get('exclusions', {}).items()})
+
+    @classmethod
+    def load(cls, path):
+        """Reads holidays and exclusions from a JSON file (see the module docstring)."""
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def is_off(self, day, section):
+        return day in self.holidays or day in self.exclusions.get(section, ())
+
+
+class Occurrence:
+    """One dated meeting of a placed session."""
+
+    __slots__ = ('start', 'end', 'section', 'placement')
+
+    def __init__(self, start, end, section, placement):
+        self.start = start
+        self.end = end
+        self.section = section
+        self.placement = placement
+
+    def __lt__(self, other):
+        return self.start < other.start
+
+
+def section_name(semester_data):
+    return semester_data['semester'] or semester_data['excel_name']
+
+
+def section_occurrences(placements, semester_data, grid=DEFAULT_GRID, calendar=None, teacher=None):
+    """
+    Yields a semester's dated meetings in time order, lazily.
+
+    Args:
+        placements: The semester's [Placement, ...]
+        semester_data: Its record, giving term_start, term_end and the name exclusions use
+        grid: SlotGrid the run used
+        calendar: TermCalendar of days off; none if omitted
+        teacher: Only yield this teacher's meetings
+
+    Raises:
+        ValueError: If a term date is malformed; a semester without both
+            term dates yields nothing
+    """
+    term = term_dates(semester_data)
+    if term is None:
+        return
+    section = section_name(semester_data)
+    week = {}  # Weekday -> [(start minute, end minute, placement), ...] in time order
+    for p in placements:
+        if teacher is None or teacher in p.session.teachers:
+            times = grid.minutes[p.start][0], grid.minutes[p.start + p.session.length - 1][1]
+            week.setdefault(p.day, []).append((*times, p))
+    for meetings in week.values():
+        meetings.sort(key=lambda meeting: meeting[:2])
+
+    day, last = term
+    while day <= last:
+        meetings = week.get(WEEKDAYS[day.weekday()])
+        if meetings and not (calendar and calendar.is_off(day, section)):
+            midnight = datetime.combine(day, datetime.min.time())
+            for start, end, p in meetings:
+                yield Occurrence(midnight + timedelta(minutes=start), midnight + timedelta(minutes=end), section, p)
+        day += timedelta(days=1)
+
+
+def teacher_occurrences(placements, all_semester_data, teacher, grid=DEFAULT_GRID, calendar=None):
+    """Yields one teacher's dated meetings across every section, merged in time order."""
+    streams = [section_occurrences(group_placements, all_semester_data[group], grid, calendar, teacher)
+               for group, group_placements in placements.items()
+               if any(teacher in p.session.teachers for p in group_placements)]
+    return heapq.merge(*streams)
+
+
+def summary(occurrence, teacher=None):
+    """Event title: the session's label, or for a teacher just their line of a shared lab block."""
+    lines = occurrence.placement.label.split('\n')
+    if teacher is not None:
+        lines = [line for line in lines if line.endswith(f" - {teacher}")] or lines
+    return '; '.join(lines)
+
+
+def _ics_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_line(f, line):
+    # Lines are folded at 75 octets, continuation lines starting with a space
+    if len(line) <= 75 and line.isascii():
+        f.write(line + '\r\n')
+        return
+    encoded = line.encode('utf-8')
+    while len(encoded) > 75:
+        cut = 75
+        while encoded[cut] & 0xC0 == 0x80:
+            cut -= 1  # Never split a UTF-8 sequence
+        f.write(encoded[:cut].decode('utf-8') + '\r\n')
+        encoded = b' ' + encoded[cut:]
+    f.write(encoded.decode('utf-8') + '\r\n')
+
+
+def _ics_time(moment):
+    return f"{moment.year:04d}{moment.month:02d}{moment.day:02d}T{moment.hour:02d}{moment.minute:02d}00"
+
+
+def write_ics(occurrences, path, name, teacher=None):
+    """
+    Streams occurrences into an iCalendar file, one VEVENT each, in floating
+    local time. Event UIDs are derived from the meeting, so re-exporting
+    updates events in calendar apps instead of duplicating them.
+
+    Returns:
+        int: Number of events written
+    """
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for line in ('BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Timetable Generator//Term Calendar//EN',
+                     'CALSCALE:GREGORIAN', f"X-WR-CALNAME:{_ics_text(name)}"):
+            _ics_line(f, line)
+        for occurrence in occurrences:
+            p = occurrence.placement
+            start = _ics_time(occurrence.start)
+            uid = uuid.uuid5(UID_NAMESPACE, f"{name}|{occurrence.section}|{start}|{p.label}")
+            _ics_line(f, 'BEGIN:VEVENT')
+            _ics_line(f, f"UID:{uid}")
+            _ics_line(f, f"DTSTAMP:{stamp}")
+            _ics_line(f, f"DTSTART:{start}")
+            _ics_line(f, f"DTEND:{_ics_time(occurrence.end)}")
+            _ics_line(f, f"SUMMARY:{_ics_text(summary(occurrence, teacher))}")
+            if p.rooms:
+                _ics_line(f, f"LOCATION:{_ics_text(', '.join(p.rooms))}")
+            description = occurrence.section + '\n' + p.label
+            _ics_line(f, f"DESCRIPTION:{_ics_text(description)}")
+            _ics_line(f, 'END:VEVENT')
+            count += 1
+        _ics_line(f, 'END:VCALENDAR')
+    return count
+
+
+def write_csv(occurrences, path, teacher=None):
+    """Streams occurrences into a CSV file, one row each (see CSV_COLUMNS). Returns the row count."""
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for occurrence in occurrences:
+            p = occurrence.placement
+            writer.writerow([occurrence.start.date().isoformat(), p.day, occurrence.start.strftime('%H:%M'),
+                             occurrence.end.strftime('%H:%M'), occurrence.section,
+                             p.session.kind.replace('_', ' '), summary(occurrence, teacher),
+                             ', '.join(p.session.teachers), ', '.join(p.rooms)])
+            count += 1
+    return count
+
+
+def _file_name(name):
+    return ''.join(c if c.isalnum() or c in ' ._-' else '_' for c in name).strip() or 'calendar'
+
+
+def export_calendars(placements, all_semester_data, directory, grid=DEFAULT_GRID, calendar=None,
+                     formats=('ics', 'csv'), teachers=True):
+    """
+    Writes one calendar per section with term dates and, with teachers, one per
+    teacher into directory, in each of formats.
+
+    Args:
+        placements: {group index: [Placement, ...]} as kept by TimetableEngine
+        all_semester_data: The semester records, indexed by group
+        directory: Output folder, created if missing
+        grid: SlotGrid the run used
+        calendar: TermCalendar of holidays and exclusions
+        formats: Any of 'ics' and 'csv'
+
+    Returns:
+        list: Paths written
+
+    Raises:
+        ValueError: If a term, holiday or exclusion date is malformed
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    used = set()  # File names taken so far, lowercased for case-insensitive file systems
+
+    def write(name, make_occurrences, teacher=None):
+        # Names that sanitize to the same file are numbered, as semester_keys numbers
+        # duplicate semester names, so no calendar overwrites another
+        file_name = _file_name(name)
+        number = 1
+        while file_name.lower() in used:
+            number += 1
+            file_name = f"{_file_name(name)} ({number})"
+        used.add(file_name.lower())
+        # Each format gets its own pass over a fresh generator
+        base = os.path.join(directory, file_name)
+        if 'ics' in formats:
+            write_ics(make_occurrences(), base + '.ics', name, teacher)
+            written.append(base + '.ics')
+        if 'csv' in formats:
+            write_csv(make_occurrences(), base + '.csv', teacher)
+            written.append(base + '.csv')
+
+    dated = [group for group in placements if term_dates(all_semester_data[group])]
+    for group in dated:
+        write(section_name(all_semester_data[group]),
+              lambda group=group: section_occurrences(placements[group], all_semester_data[group], grid, calendar))
+    if teachers:
+        names = dict.fromkeys(teacher for group in dated for p in placements[group] for teacher in p.session.teachers)
+        for teacher in names:
+            write(f"Teacher - {teacher}",
+                  lambda teacher=teacher: teacher_occurrences(placements, all_semester_data, teacher, grid, calendar),
+                  teacher)
+    return written
@@ -0,0 +1,340 @@
+"""
+Batch command-line entry point for the timetable generator.
+
+Reads a JSON or CSV description of any number of semesters, schedules all of
+them in one process (teachers are shared across semesters exactly as in the
+GUI) and writes one Excel file per semester, or with --workbook a single
+workbook holding one sheet per semester. --teacher-sheets adds a weekly load
+sheet and one sheet per teacher, --room-sheets one sheet per booked room; they
+go into --workbook, or else into teachers_and_rooms.xlsx in --output-dir.
+
+JSON input is either a list of semester records or {"semesters": [...]}, where
+each record uses the same keys the GUI collects (subjects, teachers, credits,
+semester, room_number, ..., day_end_times).
+
+CSV input has one row per subject with the columns semester, subject, teacher
+and credits; the optional columns term_start, term_end, room_number,
+num_students, batches (the lab batches a section is split into, 3 by
+default), file_location, excel_name and one column per day name (holding that
+day's end time) are taken from the first row of each semester.
+
+Runs are seeded (--seed, default 0) and cached on disk under --cache-dir,
+so rerunning an unchanged department returns the stored timetables.
+
+With --state PATH the run is saved to PATH, and the next run with the same
+--state diffs its input against it: only the sessions of changed subjects are
+re-placed and only the changed semesters' workbooks are rewritten.
+
+--rooms points at a JSON room list (see timetable_rooms) giving room
+capacities and the lab rooms practicals are booked into. Every semester's
+room_number is booked whether or not it is listed.
+
+--availability points at a JSON file of teacher availability (see
+timetable_availability): unavailable days and hours, a daily limit and
+preferred hours per teacher.
+
+--grid points at a JSON slot grid config (see timetable_grid) to replace the
+default days, slots, breaks and end times.
+
+The input may also be a project file (see timetable_project, as saved by the
+GUI): its semesters, grid, room list and availability are used unless
+--grid/--rooms/--availability are given, the run is updated incrementally against its last one, and the new
+timetables are stored back into it. --save-project PATH stores a JSON or CSV
+department, its grid, room list, availability and timetables as a project
+file.
+
+--calendars DIR expands the week over every semester's term_start..term_end
+and writes an iCalendar (.ics) and CSV file per section and per teacher into
+DIR (see timetable_calendar); --holidays points at a JSON list of holidays
+and per-section exclusions to leave out.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from timetable_availability import Availability
+from timetable_cache import DEFAULT_MAX_BYTES, ResultCache, default_cache_dir
+from timetable_compact import timetable_dict
+from timetable_engine import ORDERS, STRATEGIES, TimetableEngine, normalize_semester_data
+from timetable_occupancy import BACKENDS
+from timetable_errors import SchedulingError
+from timetable_grid import DEFAULT_GRID, SlotGrid
+from timetable_incremental import load_state, make_state, reschedule, save_state, semester_keys
+from timetable_parallel import KEEP_MODES, search_seeds
+from timetable_profile import Profiler
+from timetable_project import PROJECT_EXTENSION, ProjectStore
+from timetable_quality import Objective, score_placements
+from timetable_rooms import Rooms
+
+SEMESTER_COLUMNS = ['term_start', 'term_end', 'room_number', 'num_students', 'batches', 'file_location', 'excel_name']
+
+
+def load_semesters_json(path, grid=DEFAULT_GRID):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('semesters', [])
+    return [normalize_semester_data(record, grid) for record in data]
+
+
+def load_semesters_csv(path, grid=DEFAULT_GRID):
+    semesters = {}  # Keyed by semester name, kept in order of first appearance
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            name = row.get('semester', '').strip()
+            if name not in semesters:
+                record = {'semester': name, 'subjects': [], 'teachers': [], 'credits': []}
+                for column in SEMESTER_COLUMNS:
+                    if row.get(column):
+                        record[column] = row[column].strip()
+                record['day_end_times'] = {day: row[day].strip() for day in grid.days if row.get(day)}
+                semesters[name] = record
+            record = semesters[name]
+            record['subjects'].append(row['subject'].strip())
+            record['teachers'].append(row['teacher'].strip())
+            record['credits'].append(row['credits'].strip())
+    return [normalize_semester_data(record, grid) for record in semesters.values()]
+
+
+def is_project_file(path):
+    return os.path.splitext(path)[1].lower() == PROJECT_EXTENSION
+
+
+def load_semesters(path, grid=DEFAULT_GRID):
+    if os.path.splitext(path)[1].lower() == '.csv':
+        return load_semesters_csv(path, grid)
+    return load_semesters_json(path, grid)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate timetables for many semesters without the GUI.")
+    parser.add_argument('input', help=f"JSON, CSV or {PROJECT_EXTENSION} project file describing the semesters")
+    parser.add_argument('-o', '--output-dir', help="Write every workbook here instead of each semester's file_location")
+    parser.add_argument('--no-excel', action='store_true', help="Schedule only, skip the Excel export")
+    parser.add_argument('--workbook', help="Write every semester into this one .xlsx file, one sheet each")
+    parser.add_argument('--teacher-sheets', action='store_true',
+                        help="Also export a weekly load sheet and one timetable sheet per teacher")
+    parser.add_argument('--room-sheets', action='store_true', help="Also export one timetable sheet per room")
+    parser.add_argument('--json-out', help="Also dump the generated timetables to this JSON file")
+    parser.add_argument('--grid', help="JSON slot grid config replacing the default days, slots and end times")
+    parser.add_argument('--rooms', help="JSON room list with capacities and lab rooms")
+    parser.add_argument('--availability', metavar='PATH',
+                        help="JSON teacher availability: unavailable days and hours, daily limits, preferred hours")
+    parser.add_argument('--strategy', choices=STRATEGIES, default='auto',
+                        help="greedy passes, backtracking solver, greedy with solver fallback (default), "
+                             "or repair search over all semesters jointly")
+    parser.add_argument('--order', choices=ORDERS, default='constrained',
+                        help="Place the most constrained sessions of all semesters first (default), "
+                             "or semester by semester as entered")
+    parser.add_argument('--backend', choices=BACKENDS, default='python',
+                        help="Teacher booking index; numpy checks whole lab groups at once (needs NumPy)")
+    parser.add_argument('--time-budget', type=float, default=10.0, help="Solver seconds per semester")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the single run (default 0)")
+    parser.add_argument('--cache-dir', default=default_cache_dir(), help="Where results are cached")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / 2 ** 20, metavar='MB',
+                        help="Evict least recently used results beyond this size")
+    parser.add_argument('--no-cache', action='store_true', help="Always regenerate and store nothing")
+    parser.add_argument('--attempts', type=int, help="Run this many seeded attempts in a process pool")
+    parser.add_argument('--workers', type=int, help="Worker processes for --attempts (default: all cores)")
+    parser.add_argument('--attempt-time-limit', type=float, default=30.0, help="Wall-clock seconds per attempt")
+    parser.add_argument('--keep', choices=KEEP_MODES, default='first',
+                        help="Keep the first complete attempt or wait for the best-scoring one")
+    parser.add_argument('--improve', type=float, default=0.0, metavar='SECONDS',
+                        help="Anneal the generated timetables for this long")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Instrument the run (bypasses the cache) and write a JSON report here")
+    parser.add_argument('--state', metavar='PATH',
+                        help="Update the run saved here incrementally (if any), then save this run here")
+    parser.add_argument('--save-project', metavar='PATH',
+                        help=f"Store the semesters, grid, rooms and timetables in this {PROJECT_EXTENSION} file")
+    parser.add_argument('--calendars', metavar='DIR',
+                        help="Write dated .ics and .csv term calendars for every section and teacher here")
+    parser.add_argument('--holidays', metavar='PATH', help="JSON holidays and exclusions for --calendars")
+    return parser
+
+
+def print_progress(event):
+    if event['kind'] == 'semester':
+        print(f"Scheduling {event['name']} ({event['semester']}/{event['semesters']})")
+    elif event['kind'] == 'retry':
+        print(f"  greedy pass failed ({event['reason']}), using the solver")
+    elif event['kind'] == 'cached':
+        print(f"Loaded from cache ({event['key'][:12]})")
+    elif event['kind'] == 'rescheduled':
+        print(f"Re-placing {event['sessions']} sessions in {event['semesters']} semesters")
+
+
+def schedule_sequential(args, all_semester_data, grid, rooms=None, profiler=None, availability=None):
+    cache = None
+    if not (args.no_cache or profiler):
+        cache = ResultCache(args.cache_dir, int(args.cache_size * 2 ** 20))
+    engine = TimetableEngine(strategy=args.strategy, time_budget=args.time_budget, seed=args.seed, grid=grid,
+                             improve_time=args.improve, cache=cache, progress=print_progress, rooms=rooms,
+                             backend=args.backend, order=args.order, availability=availability)
+    if profiler:
+        profiler.attach(engine)
+    timetables = engine.generate_timetables(all_semester_data)
+    stats = engine.improve_stats
+    if stats:
+        print(f"Improved score {stats['initial']:.1f} -> {stats['final']:.1f} "
+              f"({stats['moves']} moves, {stats['moves_per_second']:.0f}/s)")
+    return timetables, engine.placements
+
+
+def schedule_incremental(args, state, all_semester_data, grid, rooms=None, availability=None):
+    """Returns (timetables, placements, changed semester indices), or None when a full run is needed."""
+    engine = TimetableEngine(strategy=args.strategy, time_budget=args.time_budget, seed=args.seed, grid=grid,
+                             improve_time=args.improve, progress=print_progress, rooms=rooms,
+                             backend=args.backend, order=args.order, availability=availability)
+    try:
+        timetables, changed = reschedule(engine, state, all_semester_data)
+    except (ValueError, SchedulingError) as e:
+        print(f"Cannot update the saved run ({e}); regenerating everything")
+        return None
+    print(f"{len(changed)} of {len(timetables)} semesters changed")
+    stats = engine.improve_stats
+    if stats:
+        print(f"Improved score {stats['initial']:.1f} -> {stats['final']:.1f} "
+              f"({stats['moves']} moves, {stats['moves_per_second']:.0f}/s)")
+    return timetables, engine.placements, changed
+
+
+def schedule_parallel(args, all_semester_data, grid, rooms=None, availability=None):
+    score = score_placements if grid is DEFAULT_GRID else Objective(grid).evaluate
+    result = search_seeds(all_semester_data, attempts=args.attempts, workers=args.workers,
+                          time_limit=args.attempt_time_limit, keep=args.keep, strategy=args.strategy,
+                          score=score, improve_time=args.improve, grid=grid, rooms=rooms, backend=args.backend,
+                          order=args.order, availability=availability)
+    for summary in sorted(result['attempts'], key=lambda summary: summary['seed']):
+        outcome = f"score {summary['score']}" if summary['complete'] else f"failed: {summary['error']}"
+        print(f"Attempt seed {summary['seed']}: {outcome} ({summary['elapsed']:.3f}s)")
+    print(f"Kept seed {result['seed']} (score {result['score']})")
+    return result['timetables'], result['placements']
+
+
+def resource_views(args, placements, all_semester_data, grid):
+    """(teacher views, room views, teacher loads) as requested by --teacher-sheets/--room-sheets."""
+    from timetable_export import resource_timetables
+
+    if not (args.teacher_sheets or args.room_sheets):
+        return None, None, None
+    teacher_views, room_views, loads = resource_timetables(placements, all_semester_data, grid)
+    if not args.teacher_sheets:
+        return None, room_views, None
+    return teacher_views, room_views if args.room_sheets else None, loads
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    project_state = None
+    if is_project_file(args.input):
+        with ProjectStore(args.input) as project:
+            grid = SlotGrid.load(args.grid) if args.grid else project.load_grid() or DEFAULT_GRID
+            all_semester_data = project.load_semesters(grid)
+            rooms = Rooms.load(args.rooms) if args.rooms else project.load_rooms()
+            availability = Availability.load(args.availability) if args.availability else project.load_availability()
+            project_state = project.load_state()
+    else:
+        grid = SlotGrid.load(args.grid) if args.grid else DEFAULT_GRID
+        all_semester_data = load_semesters(args.input, grid)
+        rooms = Rooms.load(args.rooms) if args.rooms else None
+        availability = Availability.load(args.availability) if args.availability else None
+    profiler = Profiler() if args.profile else None
+    if profiler and args.attempts:
+        print("--profile only instruments sequential runs; ignoring it with --attempts", file=sys.stderr)
+        profiler = None
+
+    started = time.perf_counter()
+    state = None
+    if not (args.attempts or profiler):
+        state = load_state(args.state) if args.state else project_state
+    try:
+        result = schedule_incremental(args, state, all_semester_data, grid, rooms, availability) if state else None
+        if result:
+            timetables, placements, changed = result
+        else:
+            if args.attempts:
+                timetables, placements = schedule_parallel(args, all_semester_data, grid, rooms, availability)
+            else:
+                timetables, placements = schedule_sequential(args, all_semester_data, grid, rooms, profiler,
+                                                             availability)
+            changed = range(len(timetables))
+    except SchedulingError as e:
+        print(f"Could not schedule: {e}", file=sys.stderr)
+        return 1
+    scheduling_time = time.perf_counter() - started
+    run_state = make_state(all_semester_data, timetables, placements, grid, rooms, availability)
+    if args.state:
+        save_state(run_state, args.state)
+    project_path = args.save_project or (args.input if is_project_file(args.input) else None)
+    if project_path:
+        with ProjectStore(project_path) as project:
+            imported = project_path != args.input
+            if imported or args.grid:
+                project.save_grid(None if grid is DEFAULT_GRID else grid)
+            if imported or args.rooms:
+                project.save_rooms(rooms)
+            if imported or args.availability:
+                project.save_availability(availability)
+            if imported:
+                project.save_semesters(all_semester_data)
+            project.save_run(timetables, run_state)
+
+    # The single workbook also changes when sections were removed or reordered
+    workbook_changed = (bool(changed) or not state or not os.path.exists(args.workbook or '')
+                        or semester_keys(state['semesters']) != semester_keys(all_semester_data))
+    export_time = 0.0
+    if args.no_excel:
+        pass
+    elif args.workbook and not workbook_changed:
+        print(f"Nothing changed; {args.workbook} not rewritten")
+    elif args.workbook:
+        from timetable_export import save_workbook
+
+        export_started = time.perf_counter()
+        views = resource_views(args, placements, all_semester_data, grid)
+        print(f"Wrote {save_workbook(timetables, all_semester_data, args.workbook, *views)}")
+        export_time = time.perf_counter() - export_started
+    else:
+        from timetable_export import VIEWS_WORKBOOK, save_timetable_to_excel, save_views_workbook
+
+        export_started = time.perf_counter()
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        for group in changed:
+            print(f"Wrote {save_timetable_to_excel(timetables[group], all_semester_data[group], args.output_dir)}")
+        if changed and (args.teacher_sheets or args.room_sheets):
+            path = os.path.join(args.output_dir or '.', VIEWS_WORKBOOK)
+            print(f"Wrote {save_views_workbook(path, *resource_views(args, placements, all_semester_data, grid))}")
+        export_time = time.perf_counter() - export_started
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump([{'semester': semester['semester'], 'timetable': timetable_dict(timetable)}
+                       for semester, timetable in zip(all_semester_data, timetables)], f, indent=2)
+
+    if args.calendars:
+        from timetable_calendar import TermCalendar, export_calendars
+
+        try:
+            calendar = TermCalendar.load(args.holidays) if args.holidays else None
+            paths = export_calendars(placements, all_semester_data, args.calendars, grid, calendar)
+        except ValueError as e:
+            print(f"Could not write calendars: {e}", file=sys.stderr)
+            return 1
+        print(f"Wrote {len(paths)} calendar files to {args.calendars}")
+
+    print(f"{len(timetables)} semesters: scheduling {scheduling_time:.3f}s, export {export_time:.3f}s")
+    if profiler:
+        if not args.no_excel:
+            profiler.phases['excel_export'] = export_time
+        print(profiler.summary())
+        print(f"Wrote {profiler.save(args.profile)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Compact timetables: a semester's week as an array of small integer
+placement IDs instead of nested dicts of label strings.
+
+A SectionGrid cell holds 0 when free or the ID of the Placement covering it,
+so a tutorial or lab block costs one two-byte ID per slot and one shared
+Placement, not a formatted string per slot, and a department of grids pickles
+(for the cache and worker processes) as a few arrays. Cell text
+is rendered from the placement only when a cell is read by day and slot
+name, which is what the exporters do: a SectionGrid is a read-only mapping
+{day: {slot: label}}, so the Excel writers take it as they take the dict
+timetables of the teacher and room views, and timetable_dict() turns either
+into plain dicts for JSON.
+"""
+from array import array
+from collections.abc import Mapping
+
+MAX_ID = 0xFFFF  # Largest placement ID a cell can hold
+
+
+def lab_label(subject, teacher, batches, room=None):
+    """Cell label of a theory+practical lab session for the batches it teaches, e.g. ["batch1", "batch2"]."""
+    kind = f"Lab, {room}" if room else "Lab"
+    return f"{subject} ({kind}) - {teacher} ({' & '.join(batches)})"
+
+
+def batch_lab_label(subjects, batches, rooms=()):
+    """Cell label of a simultaneous pure-practical block: one line per subject, each ending in its teacher."""
+    rooms = list(rooms) or [None] * len(subjects)
+    return "\n".join(f"{subject} (Lab - Batch {batch}{f', {room}' if room else ''}) - {teacher}"
+                     for (subject, teacher), batch, room in zip(subjects, batches, rooms))
+
+
+def render_label(session, batch=0, rooms=()):
+    """
+    Cell text of a placed session.
+
+    Args:
+        session: The Session
+        batch: 0-based position among the session's weekly copies; picks the
+            entry of session.batches the lab or pure-practical block teaches
+        rooms: Rooms the placement took
+    """
+    if session.kind in ('lab', 'group_lab'):
+        batches = session.batches[batch % len(session.batches)]
+        if session.kind == 'group_lab':
+            return batch_lab_label(session.subjects, [' & '.join(map(str, numbers)) for numbers in batches], rooms)
+        subject, teacher = session.subjects[0]
+        return lab_label(subject, teacher, [f"batch{number}" for number in batches[0]], *rooms)
+    subject, teacher = session.subjects[0]
+    return f"{subject} ({session.kind.capitalize()}) - {teacher}"
+
+
+def timetable_dict(timetable):
+    """A timetable (SectionGrid or dict) as plain {day: {slot: label}} dicts, e.g. for JSON."""
+    return {day: dict(row) for day, row in timetable.items()}
+
+
+class SectionGrid(Mapping):
+    """
+    One semester's week of placement IDs on a SlotGrid.
+
+    Args:
+        grid: SlotGrid the cells are laid out on, day-major
+
+    Attributes:
+        cells: array('H') of len(days) * len(slots) placement IDs, 0 where free
+        placements: Placement of each ID; index 0 and cleared IDs hold None
+    """
+
+    __slots__ = ('grid', 'cells', 'placements')
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.cells = array('H', bytes(2 * len(grid.days) * len(grid.slots)))
+        self.placements = [None]
+
+    def _offset(self, day, start):
+        return self.grid.day_index[day] * len(self.grid.slots) + start
+
+    def is_free(self, day, start, length=1):
+        offset = self._offset(day, start)
+        return not any(self.cells[offset:offset + length])
+
+    def place(self, placement):
+        """Writes placement's ID into the cells its session covers and returns the ID."""
+        if len(self.placements) > MAX_ID:
+            self.compact()
+        placement_id = len(self.placements)
+        self.placements.append(placement)
+        offset = self._offset(placement.day, placement.start)
+        for k in range(placement.session.length):
+            self.cells[offset + k] = placement_id
+        return placement_id
+
+    def clear(self, placement):
+        """Frees the cells placement covers at its current day and start."""
+        offset = self._offset(placement.day, placement.start)
+        placement_id = self.cells[offset]
+        for k in range(placement.session.length):
+            self.cells[offset + k] = 0
+        if placement_id:
+            self.placements[placement_id] = None
+
+    def compact(self):
+        """Renumbers the IDs in use in cell order, dropping cleared ones."""
+        ids = {0: 0}
+        placements = [None]
+        for placement_id in self.cells:
+            if placement_id not in ids:
+                ids[placement_id] = len(placements)
+                placements.append(self.placements[placement_id])
+        self.cells = array('H', [ids[placement_id] for placement_id in self.cells])
+        self.placements = placements
+
+    def copy(self):
+        other = SectionGrid(self.grid)
+        other.cells = array('H', self.cells)
+        other.placements = list(self.placements)
+        return other
+
+    def _key(self):
+        # Equal timetables give equal keys whatever order their placements were written in
+        ids = {0: 0}
+        labels = []
+        for placement_id in self.cells:
+            if placement_id not in ids:
+                ids[placement_id] = len(ids)
+                p = self.placements[placement_id]
+                batches = p.session.batches[p.batch % len(p.session.batches)] if p.session.batches else None
+                labels.append((p.session.kind, tuple(p.session.subjects), batches, p.rooms))
+        return bytes(array('H', [ids[placement_id] for placement_id in self.cells])), labels
+
+    def __eq__(self, other):
+        if isinstance(other, SectionGrid):
+            return (self.grid.days == other.grid.days and self.grid.slots == other.grid.slots
+                    and self._key() == other._key())
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __getitem__(self, day):
+        offset = self._offset(day, 0)
+        labels = {0: ''}
+        row = {}
+        for slot, placement_id in zip(self.grid.slots, self.cells[offset:offset + len(self.grid.slots)]):
+            if placement_id not in labels:
+                labels[placement_id] = self.placements[placement_id].label
+            row[slot] = labels[placement_id]
+        return row
+
+    def __iter__(self):
+        return iter(self.grid.days)
+
+    def __len__(self):
+        return len(self.grid.days)
+
+    def __repr__(self):
+        return f"SectionGrid({sum(p is not None for p in self.placements)} placements)"
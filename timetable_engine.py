@@ -0,0 +1,1002 @@
+import random
+import time
+from collections import Counter
+
+from timetable_availability import Availability
+from timetable_batches import BATCHES, LAB_LENGTH, LAB_SEATS, group_labs, lab_batches, lab_session_count
+from timetable_cache import cache_key
+from timetable_compact import SectionGrid, batch_lab_label, lab_label  # noqa: F401 (labels re-exported)
+from timetable_errors import GenerationCancelled, InfeasibleError, SchedulingError, SolverTimeout
+from timetable_grid import DEFAULT_GRID
+from timetable_index import TeacherSchedules, time_to_minutes
+from timetable_joint import ConflictRepair
+from timetable_occupancy import BACKENDS, HAS_NUMPY, OccupancyTensor, new_teacher_schedules
+from timetable_planning import rank_groups, rank_sessions
+from timetable_quality import Annealer, Objective
+from timetable_rooms import RoomSchedules, Rooms, SectionRooms, batch_size, student_count
+from timetable_solver import BacktrackingSolver, Placement, Session
+from timetable_specs import compile_semester, count_sessions, get_specs, parse_credits  # noqa: F401 (parse_credits re-exported)
+
+# Default time grid shared by the GUI, the CLI and the schedulers (see timetable_grid)
+DAYS = DEFAULT_GRID.days
+time_slots = DEFAULT_GRID.slots
+breaks = DEFAULT_GRID.breaks
+end_time_options = DEFAULT_GRID.end_time_options
+DEFAULT_END_TIME = DEFAULT_GRID.default_end_time
+STRATEGIES = ['greedy', 'solver', 'auto', 'joint']
+ORDERS = ['entered', 'constrained']
+
+
+def new_semester_data(grid=DEFAULT_GRID):
+    """Returns an empty semester record in the shape the GUI and CLI both produce."""
+    return {
+        'subjects': [],
+        'teachers': [],
+        'credits': [],
+        'semester': '',
+        'term_start': '',
+        'term_end': '',
+        'room_number': '',
+        'num_students': 0,
+        'batches': BATCHES,
+        'file_location': '',
+        'excel_name': '',
+        'day_end_times': {day: grid.default_end_time for day in grid.days}
+    }
+
+
+def normalize_semester_data(record, grid=DEFAULT_GRID):
+    """
+    Fills in missing keys of a semester record loaded from JSON/CSV.
+
+    Raises:
+        ValueError: If the subjects, teachers and credits lists differ in length
+    """
+    semester_data = new_semester_data(grid)
+    semester_data.update({key: value for key, value in record.items() if value is not None})
+    semester_data['day_end_times'] = {
+        day: (record.get('day_end_times') or {}).get(day) or grid.default_end_time for day in grid.days
+    }
+    lengths = {len(semester_data[key]) for key in ('subjects', 'teachers', 'credits')}
+    if len(lengths) != 1:
+        raise ValueError(f"Semester {semester_data['semester']}: subjects, teachers and credits must have the same length")
+    semester_data['specs'] = compile_semester(semester_data)
+    return semester_data
+
+
+def get_batch_subjects(semester_data, subject):
+    """
+    Returns a list of subjects to assign to different batches.
+    This is based on the provided subject and its credit type (e.g., 0:0:n).
+    """
+    # Return subjects that match the requested subject and can be scheduled simultaneously
+    return [spec.subject for spec in get_specs(semester_data) if spec.is_pure_practical and spec.subject != subject]
+
+
+def has_theory_and_practical(semester_data, subject):
+    """
+    Checks if a subject has both theory and practical credits.
+    """
+    for spec in get_specs(semester_data):
+        if spec.subject == subject:
+            return spec.has_theory_and_practical
+    return False
+
+
+def max_disjoint_pairs(starts):
+    """Most two-slot sessions that fit side by side given their allowed start indices."""
+    count = 0
+    next_free = 0
+    for start in sorted(starts):
+        if start >= next_free:
+            count += 1
+            next_free = start + 2
+    return count
+
+
+class TimetableEngine:
+    """
+    Headless scheduler for one department run.
+
+    Holds no GUI state: every per-semester setting (day end times included) is
+    read from the semester record passed to create_timetable, so the engine can
+    run from the Tk GUI, the batch CLI or any other script. All randomness comes
+    from one generator seeded with seed; the schedule_* methods take an
+    explicit rng to draw from instead.
+
+    Args:
+        strategy: 'greedy' runs the randomized schedule_* passes, 'solver' the
+            backtracking search, and 'auto' tries greedy first and falls back to
+            the solver when a greedy pass gets stuck. 'joint' places every
+            semester's sessions as one problem and moves sessions of any
+            semester to make room for a stuck one (see timetable_joint)
+        time_budget: Seconds the solver may spend on one semester; a joint run
+            gets this for every semester
+        max_backtracks: Optional cap on solver backtracks per semester (on
+            evictions, for a joint run)
+        seed: Seed for the engine's own random generator; None draws a fresh one,
+            kept in self.seed so the run can be reproduced
+        time_limit: Wall-clock seconds for a whole generate_timetables run
+        improve_time: Seconds of simulated annealing after generation; 0 skips it
+        objective: Objective to improve; defaults to Objective() with its default weights
+        precheck: Run check_capacity before generate_timetables starts searching
+        grid: SlotGrid to schedule on; defaults to DEFAULT_GRID
+        progress: Optional callable receiving one event dict per step (see _emit);
+            it runs on the generating thread
+        cancel: Optional threading.Event; once set, generation raises
+            GenerationCancelled at its next check
+        cache: Optional ResultCache; generate_timetables then returns stored
+            results for inputs, grid, seed and options it has seen before.
+            Runs with improve_time are never cached: annealing runs for wall
+            time, so their result cannot be reproduced from a key
+        rooms: Optional Rooms list giving room capacities and lab rooms (see
+            timetable_rooms); every semester's room_number is booked either way
+        backend: 'python' books teachers in a plain TeacherSchedules; 'numpy'
+            uses an OccupancyTensor (see timetable_occupancy) so the
+            simultaneous-practical search checks a whole group at once. Both
+            give the same timetables
+        order: 'entered' schedules semesters one after another as given;
+            'constrained' places every semester's sessions in one greedy pass,
+            most constrained first (see timetable_planning), and has the
+            solver take the hardest semesters first
+        availability: Optional Availability rules (see timetable_availability):
+            days and hours teachers cannot teach, a per-day limit and
+            preferred hours. Compiled once into self.teacher_masks, which every
+            strategy filters its candidate starts with
+
+    Raises:
+        ValueError: On an unknown strategy, order or backend, or availability
+            rules naming a day the grid does not have
+    """
+
+    def __init__(self, strategy='greedy', time_budget=10.0, max_backtracks=None, seed=None, time_limit=None,
+                 improve_time=0.0, objective=None, precheck=True, grid=None,
+                 progress=None, cancel=None, cache=None, rooms=None, backend='python', order='entered',
+                 availability=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order {order!r}, expected one of {ORDERS}")
+        self.order = order
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        if backend == 'numpy' and not HAS_NUMPY:
+            raise ImportError("The 'numpy' backend needs NumPy; install it or use the 'python' backend")
+        self.backend = backend
+        self.strategy = strategy
+        self.time_budget = time_budget
+        self.max_backtracks = max_backtracks
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.time_limit = time_limit
+        self.deadline = None
+        self.improve_time = improve_time
+        self.grid = grid or DEFAULT_GRID
+        self.objective = objective or Objective(self.grid)
+        self.improve_stats = None
+        self.precheck = precheck
+        self.progress = progress
+        self.cancel = cancel
+        self.cache = cache
+        self.cache_key = None  # Key of the last generate_timetables run when caching
+        self.rooms = rooms or Rooms()
+        self.availability = availability or Availability()
+        self.teacher_masks = self.availability.compile(self.grid)
+        # Room bookings of the current run, and the rooms the current semester may use
+        self.room_schedules = RoomSchedules()
+        self.section_rooms = SectionRooms(self.rooms, {})
+        # Parsed end time per day for the semester currently being scheduled
+        self.day_end_times = {}
+        # Every placed session of the run, keyed by semester index
+        self.placements = {}
+        self.group = 0
+        self.session_total = 0
+
+    def generate_timetables(self, all_semester_data, teacher_schedules=None, room_schedules=None):
+        """
+        Creates a timetable for every semester, sharing teacher and room
+        bookings across them. Every run restarts the engine's generator from
+        self.seed, so the same inputs and seed give the same timetables.
+        The run's room bookings are kept in self.room_schedules.
+
+        Returns:
+            list: One timetable per entry of all_semester_data, in the same order
+        """
+        if teacher_schedules is None:
+            # Track teacher schedules across all semesters
+            teacher_schedules = new_teacher_schedules(self.backend, self.grid)
+        self.room_schedules = RoomSchedules() if room_schedules is None else room_schedules
+        self.rng = random.Random(self.seed)
+        self.cache_key = None
+        cache = self.cache if not self.improve_time else None
+        if cache is not None:
+            self.cache_key = cache_key(all_semester_data, self.grid, self.seed, self._cache_options(),
+                                       teacher_schedules)
+            cached = cache.get(self.cache_key)
+            if cached is not None:
+                return self._load_cached(cached, teacher_schedules)
+        if self.precheck:
+            self.check_capacity(all_semester_data)
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        self.placements = {}
+        if self.strategy == 'joint':
+            timetables = self._generate_joint(all_semester_data, teacher_schedules)
+        elif self.order == 'constrained' and self.strategy != 'solver':
+            timetables = self._generate_interleaved(all_semester_data, teacher_schedules)
+        else:
+            timetables = self._generate_by_semester(all_semester_data, teacher_schedules)
+        if self.improve_time:
+            self.improve(timetables, teacher_schedules)
+        if cache is not None:
+            try:
+                cache.put(self.cache_key, {'timetables': timetables, 'placements': self.placements,
+                                                'bookings': teacher_schedules.to_dict(),
+                                                'room_bookings': self.room_schedules.to_dict(),
+                                                'improve_stats': self.improve_stats})
+            except OSError:
+                pass  # The cache is best effort; a read-only or full disk must not fail the run
+        return timetables
+
+    def _generate_by_semester(self, all_semester_data, teacher_schedules):
+        groups = range(len(all_semester_data))
+        if self.order == 'constrained':
+            groups = rank_groups(self._all_sessions(all_semester_data)[0], groups)
+        timetables = {}
+        for position, group in enumerate(groups):
+            self._check_deadline()
+            semester = all_semester_data[group]
+            self._emit('semester', semester=position + 1, semesters=len(all_semester_data),
+                       name=semester['semester'] or semester['excel_name'])
+            timetables[group] = self.create_timetable(semester, teacher_schedules, group)
+        return [timetables[group] for group in range(len(all_semester_data))]
+
+    def _generate_interleaved(self, all_semester_data, teacher_schedules):
+        # One greedy pass over every semester's sessions, most constrained first
+        sessions, section_rooms = self._all_sessions(all_semester_data)
+        self._emit('semester', semester=1, semesters=1, name="all semesters, most constrained first")
+        snapshot = teacher_schedules.snapshot()
+        room_snapshot = self.room_schedules.snapshot()
+        try:
+            solution = self._place_in_order(rank_sessions(sessions), section_rooms, teacher_schedules)
+        except SchedulingError as e:
+            teacher_schedules.restore(snapshot)
+            self.room_schedules.restore(room_snapshot)
+            if self.strategy == 'greedy':
+                raise
+            # Fall back to semester by semester, each with its own solver fallback
+            self._emit('retry', semester=1, reason=str(e))
+            return self._generate_by_semester(all_semester_data, teacher_schedules)
+
+        # The pass booked as it went; place_solution books again while writing the grids
+        teacher_schedules.restore(snapshot)
+        self.room_schedules.restore(room_snapshot)
+        timetables = {group: SectionGrid(self.grid) for group in range(len(all_semester_data))}
+        self.placements = {group: [] for group in timetables}
+        self.place_solution(sessions, solution, timetables, teacher_schedules)
+        return [timetables[group] for group in range(len(all_semester_data))]
+
+    def _generate_joint(self, all_semester_data, teacher_schedules):
+        # Every semester's sessions as one problem, most constrained first; a
+        # stuck session may displace sessions of any semester
+        sessions, _ = self._all_sessions(all_semester_data)
+        self._emit('semester', semester=1, semesters=1, name="all semesters jointly")
+        search = self.make_solver(teacher_schedules, solver=ConflictRepair, semesters=len(all_semester_data))
+        search.progress = lambda placed, total: self._emit('placed', semester=1, placed=placed, sessions=total)
+        solution = search.solve(sessions, rank_sessions(sessions))
+        timetables = {group: SectionGrid(self.grid) for group in range(len(all_semester_data))}
+        self.placements = {group: [] for group in timetables}
+        self.place_solution(sessions, solution, timetables, teacher_schedules)
+        self._emit('placed', semester=1, placed=len(sessions), sessions=len(sessions))
+        return [timetables[group] for group in range(len(all_semester_data))]
+
+    def _all_sessions(self, all_semester_data):
+        # Every semester's sessions, and the rooms each semester may use
+        sessions = []
+        section_rooms = {}
+        for group, semester in enumerate(all_semester_data):
+            self._load_end_times(semester)
+            self._load_rooms(semester)
+            section_rooms[group] = self.section_rooms
+            sessions.extend(self.build_sessions(semester, group))
+        return sessions, section_rooms
+
+    def _place_in_order(self, sessions, section_rooms, teacher_schedules):
+        """
+        Greedily places sessions of any semesters in the given order, each at a
+        random free start, preferring days without another meeting of the
+        same subject. Books teachers and rooms as it goes.
+
+        Returns:
+            dict: session -> (day, start slot index, rooms), as BacktrackingSolver.solve
+
+        Raises:
+            SchedulingError: A session has no free start left
+        """
+        slots = self.grid.slots
+        masks = self.teacher_masks
+        occupied = set()  # (group, day, slot index) cells already taken
+        on_day = Counter()  # (signature, day) -> meetings of that session placed on day
+        solution = {}
+        for placed, session in enumerate(sessions):
+            self._check_deadline()
+            self.section_rooms = section_rooms[session.group]
+            starts = list(session.starts)
+            self.rng.shuffle(starts)
+            starts.sort(key=lambda start: (on_day[session.signature, start[0]],
+                                           not masks.is_preferred(session.teachers, *start, session.length)))
+            for day, start in starts:
+                if not masks.fits_day(teacher_schedules, session.teachers, day, session.length):
+                    continue
+                names = slots[start:start + session.length]
+                if any((session.group, day, start + k) in occupied for k in range(session.length)):
+                    continue
+                if not all(teacher_schedules.is_free(teacher, day, slot)
+                           for teacher in session.teachers for slot in names):
+                    continue
+                if session.avoid_adjacent and any(teacher_schedules.has_adjacent(teacher, day, names[0])
+                                                  for teacher in session.teachers):
+                    continue
+                rooms = self.free_rooms(session.kind, day, start, len(session.subjects))
+                if rooms is not None:
+                    break
+            else:
+                subjects = ', '.join(f"{subject} - {teacher}" for subject, teacher in session.subjects)
+                raise SchedulingError(f"No free slot left for {subjects} ({session.kind.replace('_', ' ')})")
+
+            for teacher in session.teachers:
+                teacher_schedules.book_many(teacher, day, names)
+            for room in rooms:
+                self.room_schedules.book(room, day, start, session.length)
+            occupied.update((session.group, day, start + k) for k in range(session.length))
+            on_day[session.signature, day] += 1
+            solution[session] = (day, start, rooms)
+            self._emit('placed', semester=session.group + 1, placed=placed + 1, sessions=len(sessions))
+        return solution
+
+    def _cache_options(self):
+        # Engine settings besides inputs, grid and seed that change what a run returns
+        return {'strategy': self.strategy, 'order': self.order,
+                'objective': type(self.objective).__name__, 'weights': self.objective.weights,
+                'rooms': self.rooms.to_dict(), 'room_bookings': self.room_schedules.to_dict(),
+                'availability': self.availability.to_dict()}
+
+    def _load_cached(self, cached, teacher_schedules):
+        teacher_schedules.restore(TeacherSchedules.from_dict(cached['bookings']).snapshot())
+        self.room_schedules.restore(RoomSchedules.from_dict(cached['room_bookings']).snapshot())
+        self.placements = cached['placements']
+        self.improve_stats = cached['improve_stats']
+        self._emit('cached', key=self.cache_key)
+        return cached['timetables']
+
+    def check_capacity(self, all_semester_data):
+        """
+        Compares the sessions every semester, every shared teacher and every
+        shared room needs with what the day end times allow, and room
+        capacities with section and batch sizes, before any search begins.
+        Passing is necessary, not sufficient, for a timetable to exist.
+
+        Raises:
+            InfeasibleError: With one report line per over-subscribed semester or teacher
+        """
+        report = []
+        teacher_sessions = {}  # Sessions each teacher gives across all semesters
+        teacher_end_times = {}  # Latest end time per day across each teacher's semesters
+        room_cells = {}  # Lecture slots each home room hosts across its semesters
+        lab_cells = {}  # Lab slots needed across all semesters, by the capacity they need
+        for semester in all_semester_data:
+            self._load_end_times(semester)
+            self._load_rooms(semester)
+            specs = get_specs(semester)
+            name = semester['semester'] or semester['excel_name']
+            report.extend(self._room_report(name, semester, specs))
+            home = self.section_rooms.home
+            if home:
+                room_cells[home] = room_cells.get(home, 0) + sum(spec.theory + 2 * spec.tutorial for spec in specs
+                                                                 if not spec.is_pure_practical)
+            batches = self.section_rooms.batches
+            size = batch_size(student_count(semester), batches)
+            seats = min(LAB_SEATS, batches) * size
+            labs = sum(lab_session_count(spec.practical, batches) for spec in specs if not spec.is_pure_practical)
+            blocks = group_labs([spec for spec in specs if spec.is_pure_practical], batches)
+            lab_cells[seats] = lab_cells.get(seats, 0) + LAB_LENGTH * labs
+            # One room per subject of each pure-practical block
+            lab_cells[size] = lab_cells.get(size, 0) + LAB_LENGTH * sum(len(subjects) * len(copies)
+                                                                       for subjects, copies in blocks)
+
+            # Pure practicals share simultaneous two-slot lab blocks
+            group_sessions = sum(len(copies) for _, copies in blocks)
+            cells_needed = LAB_LENGTH * group_sessions
+            pairs_needed = group_sessions
+            tutorials_needed = 0
+            for subjects, copies in blocks:
+                for _, teacher in subjects:
+                    teacher_sessions[teacher] = teacher_sessions.get(teacher, 0) + len(copies)
+            for spec in specs:
+                if spec.is_pure_practical:
+                    continue
+                labs = lab_session_count(spec.practical, batches)
+                cells_needed += spec.theory + 2 * spec.tutorial + LAB_LENGTH * labs
+                pairs_needed += spec.tutorial + labs
+                tutorials_needed += spec.tutorial
+                teacher_sessions[spec.teacher] = teacher_sessions.get(spec.teacher, 0) + spec.theory + spec.tutorial + labs
+
+            for spec in specs:
+                days = teacher_end_times.setdefault(spec.teacher, {})
+                for day in self.grid.days:
+                    days[day] = max(days.get(day, 0), self.day_end_times[day])
+
+            cells = len(self.single_starts)
+            pairs = sum(max_disjoint_pairs(allowed.pairs) for allowed in self.allowed.values())
+            tutorial_pairs = sum(max_disjoint_pairs(allowed.joined_pairs) for allowed in self.allowed.values())
+            if cells_needed > cells:
+                report.append(f"Semester {name} needs {cells_needed} class slots but its end times allow {cells}")
+            if pairs_needed > pairs:
+                report.append(f"Semester {name} needs {pairs_needed} two-slot tutorials/labs but only {pairs} fit")
+            if tutorials_needed > tutorial_pairs:
+                report.append(f"Semester {name} needs {tutorials_needed} tutorials but only {tutorial_pairs} "
+                              f"fit at allowed tutorial start times")
+
+        for teacher, sessions in teacher_sessions.items():
+            capacity = sum(self.teacher_masks.day_capacity(teacher, day, self.grid.allowed(end_time))
+                           for day, end_time in teacher_end_times[teacher].items())
+            if sessions > capacity:
+                report.append(f"Teacher {teacher} has {sessions} sessions but at most {capacity} fit in a week")
+        week = len(self.grid.days) * len(self.grid.slots)
+        for room, cells in room_cells.items():
+            if cells > week:
+                report.append(f"Room {room} hosts {cells} class slots but a week has {week}")
+        if self.rooms.has_labs:
+            # Sessions needing at least a given capacity only fit in the labs that large
+            for capacity in sorted(lab_cells):
+                needed = sum(cells for need, cells in lab_cells.items() if need >= capacity)
+                available = week * len(self.rooms.labs(capacity))
+                if needed > available:
+                    report.append(f"Labs seating {capacity} or more are needed for {needed} slots "
+                                  f"but only offer {available}")
+
+        if report:
+            raise InfeasibleError("Capacity check failed:\n" + "\n".join(report), report)
+
+    def _room_report(self, name, semester, specs):
+        # Capacity problems of one semester's rooms; self.section_rooms is loaded for it
+        report = []
+        students = student_count(semester)
+        section = self.section_rooms
+        capacity = self.rooms.capacity(section.home) if section.home else None
+        if capacity is not None and capacity < students:
+            report.append(f"Room {section.home} seats {capacity} but semester {name} has {students} students")
+        if not section.has_labs:
+            return report
+        size = batch_size(students, section.batches)
+        seats = min(LAB_SEATS, section.batches)
+        if any(spec.practical > 0 and not spec.is_pure_practical for spec in specs) and not section.labs:
+            report.append(f"Semester {name} needs a lab seating {seats} batches ({seats * size} students) "
+                          f"but none does")
+        blocks = group_labs([spec for spec in specs if spec.is_pure_practical], section.batches)
+        width = max((len(subjects) for subjects, _ in blocks), default=0)
+        if width > len(section.batch_labs):
+            report.append(f"Semester {name} runs {width} labs at once but only {len(section.batch_labs)} "
+                          f"lab rooms seat a batch of {size}")
+        return report
+
+    def improve(self, timetables, teacher_schedules, time_budget=None, groups=None):
+        """
+        Runs the annealing stage over this run's placements, rewriting
+        timetables and teacher_schedules in place. With a time_limit it stops
+        at the run's deadline at the latest, keeping the best state found.
+
+        Args:
+            groups: Only move the placements of these semesters, if given;
+                the others' bookings stay where they are
+
+        Returns:
+            dict: Initial and final objective values and move counts
+        """
+        placements = self.placements if groups is None else {group: self.placements[group] for group in groups}
+        annealer = Annealer(placements, timetables, teacher_schedules, self.objective, rng=self.rng,
+                            room_schedules=self.room_schedules, day_limits=self.teacher_masks.max_per_day)
+        time_budget = time_budget or self.improve_time
+        if self.deadline is not None:
+            time_budget = min(time_budget, max(self.deadline - time.perf_counter(), 0.0))
+        self._emit('improve', seconds=time_budget)
+        self.improve_stats = annealer.run(time_budget, cancel=self.cancel)
+        return self.improve_stats
+
+    def _load_end_times(self, semester_data):
+        # Look up each day's precomputed allowed slots once per semester
+        self.allowed = self.grid.day_allowed(semester_data.get('day_end_times'))
+        self.day_end_times = {day: time_to_minutes((semester_data.get('day_end_times') or {}).get(day)
+                                                   or self.grid.default_end_time)
+                              for day in self.grid.days}
+
+        # Start positions each kind of session may use under these end times, shared by its sessions
+        self.single_starts = tuple((day, i) for day, allowed in self.allowed.items() for i in allowed.singles)
+        self.pair_starts = tuple((day, i) for day, allowed in self.allowed.items() for i in allowed.pairs)
+        self.tutorial_starts = tuple((day, i) for day, allowed in self.allowed.items() for i in allowed.joined_pairs)
+
+    def _load_rooms(self, semester_data):
+        self.section_rooms = SectionRooms(self.rooms, semester_data)
+
+    def free_rooms(self, kind, day, start, count=1):
+        """
+        Rooms a session of kind starting at (day, start) would take, checked
+        against every semester's bookings: () when it needs no room, None when
+        every room it could use is taken.
+        """
+        length = 1 if kind == 'theory' else 2
+        section = self.section_rooms
+        if kind in ('theory', 'tutorial'):
+            if section.home is None:
+                return ()
+            return (section.home,) if self.room_schedules.is_free(section.home, day, start, length) else None
+        if not section.has_labs:
+            return ()
+        return self.room_schedules.find(section.labs if kind == 'lab' else section.batch_labs,
+                                        day, start, length, count)
+
+    def _record(self, kind, subjects, day, start, timetable, batch=0, rooms=(), batches=None):
+        # Write a greedy placement into timetable, remember it so later stages can move it, and book its rooms
+        starts = {'theory': self.single_starts, 'tutorial': self.tutorial_starts}.get(kind, self.pair_starts)
+        length = 1 if kind == 'theory' else 2
+        starts = self.teacher_masks.session_starts(starts, [teacher for _, teacher in subjects], length)
+        session = Session(kind, subjects, self.group, length, starts, avoid_adjacent=kind == 'group_lab',
+                          rooms=self.section_rooms.options(kind, len(subjects)), batches=batches)
+        for room in rooms:
+            self.room_schedules.book(room, day, start, length)
+        placement = Placement(session, day, start, batch, rooms)
+        timetable.place(placement)
+        self.placements[self.group].append(placement)
+        self._emit('placed', semester=self.group + 1, placed=len(self.placements[self.group]),
+                   sessions=self.session_total)
+
+    def _emit(self, kind, **fields):
+        """
+        Sends a progress event to the progress callback, if any. Events are
+        dicts with a 'kind' key:
+
+            semester: semester (1-based), semesters, name
+            placed: semester, placed, sessions (placed so far / needed)
+            retry: semester, reason (the greedy pass failed, the solver takes over)
+            improve: seconds of annealing about to start
+            cached: key (the run was answered from the cache)
+            rescheduled: semesters, sessions (an incremental run is re-placing
+                that many sessions; see timetable_incremental)
+        """
+        if self.progress is not None:
+            fields['kind'] = kind
+            self.progress(fields)
+
+    def _check_deadline(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise GenerationCancelled("Generation was cancelled")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SolverTimeout(f"Generation exceeded its {self.time_limit}s time limit")
+
+    def can_schedule_theory(self, day, slot, teacher, timetable, teacher_schedules):
+        if not timetable.is_free(day, self.grid.index[slot]):  # Slot already occupied
+            return False
+
+        # Check if teacher is already scheduled in any semester at this time
+        return teacher_schedules.is_free(teacher, day, slot)
+
+    def create_timetable(self, semester_data, teacher_schedules, group=None):
+        self.group = len(self.placements) if group is None else group
+        self.placements[self.group] = []
+        self._load_end_times(semester_data)
+        self._load_rooms(semester_data)
+        self.session_total = count_sessions(get_specs(semester_data), self.section_rooms.batches)
+        if self.strategy == 'solver':
+            return self.solve_timetable(semester_data, teacher_schedules)
+        if self.strategy == 'auto':
+            snapshot = teacher_schedules.snapshot()
+            room_snapshot = self.room_schedules.snapshot()
+            try:
+                return self.create_timetable_greedy(semester_data, teacher_schedules)
+            except SchedulingError as e:
+                # Roll back the partial greedy bookings and search properly
+                teacher_schedules.restore(snapshot)
+                self.room_schedules.restore(room_snapshot)
+                self.placements[self.group] = []
+                self._emit('retry', semester=self.group + 1, reason=str(e))
+                return self.solve_timetable(semester_data, teacher_schedules)
+        return self.create_timetable_greedy(semester_data, teacher_schedules)
+
+    def create_timetable_greedy(self, semester_data, teacher_schedules):
+        timetable = SectionGrid(self.grid)
+
+        specs = get_specs(semester_data)
+        batches = self.section_rooms.batches
+
+        # Identify pure practical subjects (0:0:X credits)
+        pure_practicals = [spec for spec in specs if spec.is_pure_practical]
+
+        # Schedule pure practical subjects simultaneously, in the blocks their batches were matched into
+        if pure_practicals:
+            self.schedule_simultaneous_practicals(group_labs(pure_practicals, batches), timetable, teacher_schedules)
+
+        # Schedule practical classes for other subjects
+        for spec in specs:
+            if spec.practical > 0 and not spec.is_pure_practical:
+                self.schedule_practical(spec.subject, spec.teacher, timetable, teacher_schedules,
+                                        batches=lab_batches(spec.practical, batches))
+
+        # Schedule theory and tutorial classes
+        for spec in specs:
+            # Schedule theory classes
+            if spec.theory > 0:
+                self.schedule_theory(spec.subject, spec.teacher, spec.theory, timetable, teacher_schedules)
+
+            # Schedule tutorial classes
+            if spec.tutorial > 0:
+                self.schedule_tutorial(spec.subject, spec.teacher, spec.tutorial, timetable, teacher_schedules)
+
+        return timetable
+
+    def build_sessions(self, semester_data, group=0):
+        """
+        Turns a semester into solver sessions, one per class meeting.
+
+        Theory needs one slot, tutorials and labs two consecutive slots; all
+        of them must end by the day's end time, and tutorials keep the greedy
+        path's restricted start times, and the starts their teachers' availability
+        rules out are left out. Each session may take the rooms
+        self.section_rooms allows for its kind. Labs come from the batch
+        allocation of timetable_batches: one session per set of batches taught
+        together.
+        """
+        usable = self.teacher_masks.session_starts
+        options = self.section_rooms.options
+        batches = self.section_rooms.batches
+
+        sessions = []
+        pure_practicals = []
+        for spec in get_specs(semester_data):
+            subjects = [(spec.subject, spec.teacher)]
+            if spec.is_pure_practical:
+                pure_practicals.append(spec)
+                continue
+            teachers = (spec.teacher,)
+            single_starts = usable(self.single_starts, teachers, 1)
+            pair_starts = usable(self.pair_starts, teachers, 2)
+            tutorial_starts = usable(self.tutorial_starts, teachers, 2)
+            if spec.practical > 0:
+                # One lab session per week for each set of batches taught together
+                labs = lab_batches(spec.practical, batches)
+                sessions.extend(Session('lab', subjects, group, 2, pair_starts, copy=k, rooms=options('lab'),
+                                        batches=labs) for k in range(len(labs)))
+            sessions.extend(Session('theory', subjects, group, 1, single_starts, copy=k, rooms=options('theory'))
+                            for k in range(spec.theory))
+            sessions.extend(Session('tutorial', subjects, group, 2, tutorial_starts, copy=k,
+                                    rooms=options('tutorial')) for k in range(spec.tutorial))
+
+        # Pure practicals run together in shared blocks, each subject teaching one batch
+        for practical_subjects, copies in group_labs(pure_practicals, batches):
+            pair_starts = usable(self.pair_starts, [teacher for _, teacher in practical_subjects], 2)
+            sessions.extend(Session('group_lab', practical_subjects, group, 2, pair_starts, avoid_adjacent=True,
+                                    copy=k, rooms=options('group_lab', len(practical_subjects)), batches=copies)
+                            for k in range(len(copies)))
+        return sessions
+
+    def solve_timetable(self, semester_data, teacher_schedules):
+        """
+        Schedules one semester with the backtracking solver.
+
+        Raises:
+            InfeasibleError: The semester cannot be completed given teacher_schedules
+            SolverTimeout: The time or backtrack budget ran out first
+        """
+        sessions = self.build_sessions(semester_data, self.group)
+        placements = self.make_solver(teacher_schedules).solve(sessions)
+        timetable = SectionGrid(self.grid)
+        self.place_solution(sessions, placements, {self.group: timetable}, teacher_schedules)
+        self._emit('placed', semester=self.group + 1, placed=len(sessions), sessions=len(sessions))
+        return timetable
+
+    def make_solver(self, teacher_schedules, occupied=None, solver=BacktrackingSolver, semesters=1):
+        """
+        A solver (BacktrackingSolver, or ConflictRepair for joint runs) with
+        this engine's budgets, generator and cancel event; its time budget
+        covers semesters semesters.
+        """
+        time_budget = self.time_budget * semesters if self.time_budget else self.time_budget
+        if self.deadline is not None:
+            time_budget = max(min(time_budget or float('inf'), self.deadline - time.perf_counter()), 0.001)
+        masks = self.teacher_masks
+        return solver(self.grid.days, self.grid.slots, teacher_schedules, time_budget=time_budget,
+                      max_backtracks=self.max_backtracks, occupied=occupied, rng=self.rng,
+                      cancel=self.cancel, room_schedules=self.room_schedules, day_limits=masks.max_per_day,
+                      preferred=masks.is_preferred if masks.preferred else None)
+
+    def place_solution(self, sessions, placements, timetables, teacher_schedules):
+        """
+        Writes solved sessions into their semesters' timetables, books their
+        teachers and rooms and records them in self.placements.
+
+        Args:
+            sessions: The solved sessions
+            placements: session -> (day, start slot index, rooms), as returned by BacktrackingSolver.solve
+            timetables: {group: SectionGrid} for every group the sessions belong to
+            teacher_schedules: Bookings to add the sessions' teachers to
+        """
+        days = self.grid.days
+        copies = {}
+        for session in sessions:
+            copies.setdefault(session.signature, []).append(session)
+        for same_sessions in copies.values():
+            # Number batches in weekly order
+            same_sessions.sort(key=lambda session: (days.index(placements[session][0]), placements[session][1]))
+            for rank, session in enumerate(same_sessions):
+                day, start, rooms = placements[session]
+                slots = self.grid.slots[start:start + session.length]
+                # Only labs tell their copies apart: the rank picks their batches
+                placement = Placement(session, day, start, rank if session.kind in ('lab', 'group_lab') else 0, rooms)
+                timetables[session.group].place(placement)
+                for teacher in session.teachers:
+                    teacher_schedules.book_many(teacher, day, slots)
+                for room in rooms:
+                    self.room_schedules.book(room, day, start, session.length)
+                self.placements.setdefault(session.group, []).append(placement)
+
+    def schedule_practical(self, subject, teacher, timetable, teacher_schedules, rng=None, batches=None):
+        """
+        Places the weekly lab sessions of a theory+practical subject.
+
+        Args:
+            batches: Session.batches of its labs, one entry per session (see
+                timetable_batches.lab_batches); defaults to one lab block per batch
+        """
+        if batches is None:
+            batches = lab_batches(LAB_LENGTH, self.section_rooms.batches)
+        slots = self.grid.slots
+        rng = rng or self.rng
+        masks = self.teacher_masks
+        teachers = (teacher,)
+        days = list(timetable.keys())
+        rng.shuffle(days)
+        sessions_scheduled = 0
+
+        while sessions_scheduled < len(batches):  # One session per set of batches
+            self._check_deadline()
+            scheduled_before_pass = sessions_scheduled
+            for day in days:
+                if sessions_scheduled >= len(batches):
+                    break
+                if not masks.fits_day(teacher_schedules, teachers, day, 2):
+                    continue  # The teacher's day limit is reached
+
+                # Pairs the teacher's availability allows, shuffled for randomness, preferred ones first
+                lab_starts = masks.usable(teachers, day, self.allowed[day].pairs, 2)
+                rng.shuffle(lab_starts)
+                lab_starts = masks.prefer(teachers, day, lab_starts, 2)
+
+                for i in lab_starts:
+                    slot1, slot2 = slots[i], slots[i + 1]
+                    if (self.is_slot_available(day, slot1, teacher, timetable, teacher_schedules) and
+                            self.is_slot_available(day, slot2, teacher, timetable, teacher_schedules)):
+                        rooms = self.free_rooms('lab', day, i)
+                        if rooms is None:
+                            continue  # Every lab big enough is taken then
+                        # Update teacher schedule
+                        teacher_schedules.book_many(teacher, day, [slot1, slot2])
+                        # The next set of batches takes this lab
+                        self._record('lab', [(subject, teacher)], day, i, timetable, sessions_scheduled, rooms,
+                                     batches)
+
+                        sessions_scheduled += 1
+                        break
+
+            if sessions_scheduled == scheduled_before_pass:
+                raise SchedulingError(f"No free slot pair left for {subject} (Lab) - {teacher}")
+
+    def schedule_theory(self, subject, teacher, num_classes, timetable, teacher_schedules, rng=None):
+        slots = self.grid.slots
+        rng = rng or self.rng
+        masks = self.teacher_masks
+        teachers = (teacher,)
+        days = list(timetable.keys())
+        rng.shuffle(days)
+        classes_scheduled = 0
+
+        while classes_scheduled < num_classes:
+            self._check_deadline()
+            scheduled_before_pass = classes_scheduled
+            for day in days:
+                if classes_scheduled >= num_classes:
+                    break
+                if not masks.fits_day(teacher_schedules, teachers, day):
+                    continue
+
+                # Slots ending by the day's end time that the teacher's availability allows
+                available_slots = masks.usable(teachers, day, self.allowed[day].singles)
+                rng.shuffle(available_slots)
+                available_slots = masks.prefer(teachers, day, available_slots)
+
+                for i in available_slots:
+                    if classes_scheduled >= num_classes:
+                        break
+
+                    slot = slots[i]
+                    # Pass teacher_schedules to is_slot_available
+                    if self.is_slot_available(day, slot, teacher, timetable, teacher_schedules):
+                        rooms = self.free_rooms('theory', day, i)
+                        if rooms is None:
+                            continue  # The class's room is taken by another semester
+                        # Update teacher schedule
+                        teacher_schedules.book(teacher, day, slot)
+                        self._record('theory', [(subject, teacher)], day, i, timetable, rooms=rooms)
+                        classes_scheduled += 1
+                        break
+
+            # A whole pass without a placement means no slot will ever free up
+            if classes_scheduled == scheduled_before_pass:
+                raise SchedulingError(f"No free slot left for {subject} (Theory) - {teacher}")
+
+    def schedule_tutorial(self, subject, teacher, num_classes, timetable, teacher_schedules, rng=None):
+        slots = self.grid.slots
+        rng = rng or self.rng
+        masks = self.teacher_masks
+        teachers = (teacher,)
+        days = list(timetable.keys())
+        rng.shuffle(days)
+        classes_scheduled = 0
+
+        while classes_scheduled < num_classes:
+            self._check_deadline()
+            scheduled_before_pass = classes_scheduled
+            for day in days:
+                if classes_scheduled >= num_classes:
+                    break
+                if not masks.fits_day(teacher_schedules, teachers, day, 2):
+                    continue
+
+                # Consecutive slots with no break between them, ending by the day's end time
+                available_pairs = masks.usable(teachers, day, self.allowed[day].joined_pairs, 2)
+                rng.shuffle(available_pairs)
+                available_pairs = masks.prefer(teachers, day, available_pairs, 2)
+
+                for i in available_pairs:
+                    slot1, slot2 = slots[i], slots[i + 1]
+                    if (self.is_slot_available(day, slot1, teacher, timetable, teacher_schedules) and
+                            self.is_slot_available(day, slot2, teacher, timetable, teacher_schedules)):
+                        rooms = self.free_rooms('tutorial', day, i)
+                        if rooms is None:
+                            continue
+
+                        # Update teacher schedule
+                        teacher_schedules.book_many(teacher, day, [slot1, slot2])
+                        # Assign the tutorial class to these combined slots
+                        self._record('tutorial', [(subject, teacher)], day, i, timetable, rooms=rooms)
+
+                        classes_scheduled += 1
+                        break
+
+            if classes_scheduled == scheduled_before_pass:
+                raise SchedulingError(f"No free slot pair left for {subject} (Tutorial) - {teacher}")
+
+    def schedule_simultaneous_practicals(self, blocks, timetable, teacher_schedules, rng=None):
+        """
+        Places the shared lab blocks of a semester's pure-practical subjects.
+
+        Args:
+            blocks: (practical_subjects, batches) per set of subjects meeting
+                together, as returned by timetable_batches.group_labs; one
+                block is placed per entry of batches
+        """
+        slots = self.grid.slots
+        rng = rng or self.rng
+        days = list(timetable.keys())
+        rng.shuffle(days)
+
+        # With an occupancy tensor every day's candidate pairs come from one
+        # array query per pass; a placement only changes its own day, and the
+        # pass moves on to the next day after it
+        vectorized = isinstance(teacher_schedules, OccupancyTensor)
+        masks = self.teacher_masks
+
+        for practical_subjects, batches in blocks:
+            teachers = [teacher for _, teacher in practical_subjects]
+            sessions_needed = len(batches)
+            sessions_scheduled = 0
+
+            while sessions_scheduled < sessions_needed:
+                self._check_deadline()
+                scheduled_before_pass = sessions_scheduled
+                if vectorized:
+                    feasible = teacher_schedules.feasible_pairs(teachers, timetable, self.allowed)
+                for day in days:
+                    if sessions_scheduled >= sessions_needed:
+                        break
+                    if not masks.fits_day(teacher_schedules, teachers, day, 2):
+                        continue
+                    # Pairs every teacher's availability allows, preferred ones first
+                    pairs = masks.prefer(teachers, day, masks.usable(teachers, day, self.allowed[day].pairs, 2), 2)
+
+                    if vectorized:
+                        row = feasible[self.grid.days.index(day)]
+                        for i in pairs:
+                            if not row[i]:
+                                continue
+                            rooms = self.free_rooms('group_lab', day, i, len(practical_subjects))
+                            if rooms is not None:
+                                self._place_simultaneous(practical_subjects, sessions_scheduled, day, i, rooms,
+                                                         timetable, teacher_schedules, batches)
+                                sessions_scheduled += 1
+                                break
+                        continue
+
+                    # Try to find two consecutive slots ending by the day's end time
+                    for i in pairs:
+                        slot1 = slots[i]
+                        slot2 = slots[i + 1]
+
+                        # Pass teacher_schedules to is_slot_available
+                        all_teachers_available = all(
+                            self.is_slot_available(day, slot1, teacher, timetable, teacher_schedules) and
+                            self.is_slot_available(day, slot2, teacher, timetable, teacher_schedules)
+                            for teacher in teachers
+                        )
+
+                        if all_teachers_available:
+                            # Check if all teachers have no adjacent classes
+                            slot1_start = slot1.split('-')[0]
+                            all_no_adjacent_classes = all(
+                                not self.has_adjacent_classes(day, slot1_start, teacher, teacher_schedules)
+                                for teacher in teachers
+                            )
+
+                            # One lab room per subject, all free at once
+                            rooms = self.free_rooms('group_lab', day, i, len(practical_subjects))
+                            if all_no_adjacent_classes and rooms is not None:
+                                # Schedule all practical subjects in these slots
+                                self._place_simultaneous(practical_subjects, sessions_scheduled, day, i, rooms,
+                                                         timetable, teacher_schedules, batches)
+                                sessions_scheduled += 1
+                                break
+
+                if sessions_scheduled == scheduled_before_pass:
+                    subjects = ', '.join(subject for subject, _ in practical_subjects)
+                    raise SchedulingError(f"No common free slot pair left for the labs of {subjects}")
+
+    def _place_simultaneous(self, practical_subjects, batch, day, i, rooms, timetable, teacher_schedules, batches):
+        # batch is the block's 0-based position among its copies; it picks the block's entry of batches
+        slot1, slot2 = self.grid.slots[i], self.grid.slots[i + 1]
+
+        # Update teacher schedules
+        for _, teacher in practical_subjects:
+            teacher_schedules.book_many(teacher, day, [slot1, slot2])
+        self._record('group_lab', practical_subjects, day, i, timetable, batch, rooms, batches)
+
+    def is_slot_available(self, day, slot, teacher, timetable, teacher_schedules):
+        # Check if slot is already occupied in current timetable
+        if not timetable.is_free(day, self.grid.index[slot]):
+            return False
+
+        # Check teacher availability across all semesters
+        return teacher_schedules.is_free(teacher, day, slot)
+
+    def has_adjacent_classes(self, day, slot_time, teacher, teacher_schedules):
+        """
+        Checks if the teacher has any classes immediately before or after the given slot.
+
+        Args:
+            day: The day of the week
+            slot_time: Start time of the slot in HH:MM format
+            teacher: The teacher to check
+            teacher_schedules: TeacherSchedules index of all teacher bookings
+
+        Returns:
+            bool: True if there are adjacent classes, False otherwise
+        """
+        # Find the matching time slot to get the end time
+        index = self.grid.by_start.get(slot_time)
+        if index is None:
+            return False  # Invalid slot time
+        time_slot = self.grid.slots[index]
+
+        # Less than a 5-minute break between classes counts as adjacent
+        return teacher_schedules.has_adjacent(teacher, day, time_slot)
+
+
+def generate_timetables(all_semester_data, teacher_schedules=None, **engine_options):
+    """Convenience wrapper: schedules every semester with a fresh engine."""
+    return TimetableEngine(**engine_options).generate_timetables(all_semester_data, teacher_schedules)
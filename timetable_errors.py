@@ -0,0 +1,24 @@
+class SchedulingError(Exception):
+    """Raised when a timetable cannot be completed."""
+
+
+class InfeasibleError(SchedulingError):
+    """
+    The input was proven to admit no complete timetable.
+
+    Args:
+        message: Summary of why
+        report: Optional list of precise findings, one line each
+    """
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = list(report or [])
+
+
+class SolverTimeout(SchedulingError):
+    """The search ran out of its time or backtrack budget before finishing."""
+
+
+class GenerationCancelled(Exception):
+    """The caller asked a running generation to stop (not a scheduling failure)."""
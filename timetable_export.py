@@ -0,0 +1,212 @@
+"""
+Excel export.
+
+Every sheet is streamed through openpyxl's write-only workbook: rows are
+appended once and never revisited, and all formatting lives in named styles
+and sheet-level defaults registered once per workbook, so export time grows
+linearly with the number of sections and memory stays flat.
+"""
+import os
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, Side
+from openpyxl.utils import get_column_letter
+
+from timetable_grid import DEFAULT_GRID
+
+COLUMN_WIDTH = 20
+ROW_HEIGHT = 30
+METADATA_COLUMNS = [('Semester', 'semester'), ('Room Number', 'room_number'),
+                    ('Number of Students', 'num_students'), ('Term Start', 'term_start'), ('Term End', 'term_end')]
+INVALID_SHEET_CHARS = '[]:*?/\\'
+LOAD_COLUMNS = [('Sessions', 'sessions'), ('Slots', 'slots'), ('Hours', 'hours'), ('Theory', 'theory'),
+                ('Tutorial', 'tutorial'), ('Lab', 'lab'), ('Days', 'days')]
+VIEWS_WORKBOOK = 'teachers_and_rooms.xlsx'  # Default name of the teacher/room workbook next to per-semester files
+
+
+def _add_styles(workbook):
+    thin = Side(style='thin')
+    header = NamedStyle(name='timetable_header', font=Font(bold=True),
+                        border=Border(left=thin, right=thin, top=thin, bottom=thin),
+                        alignment=Alignment(horizontal='center', vertical='center', wrap_text=True))
+    body = NamedStyle(name='timetable_cell', alignment=Alignment(vertical='center', wrap_text=True))
+    workbook.add_named_style(header)
+    workbook.add_named_style(body)
+
+
+def _sheet_title(name, used):
+    # Excel caps titles at 31 characters, bans a few characters and needs them unique
+    title = ''.join('_' if c in INVALID_SHEET_CHARS else c for c in str(name)).strip()[:31] or 'Sheet'
+    base, n = title, 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+def _write_sheet(workbook, title, metadata, timetable):
+    """Streams one metadata block and one days x slots grid into a new sheet."""
+    worksheet = workbook.create_sheet(title)
+    slots = list(next(iter(timetable.values()))) if timetable else []
+
+    # Layout is fixed before the first row is written
+    worksheet.sheet_format.defaultRowHeight = ROW_HEIGHT
+    worksheet.sheet_format.customHeight = True
+    for col in range(max(len(slots) + 1, len(metadata))):
+        worksheet.column_dimensions[get_column_letter(col + 1)].width = COLUMN_WIDTH
+
+    def cell(value, style='timetable_cell'):
+        written = WriteOnlyCell(worksheet, value=value if value != '' else None)
+        written.style = style
+        return written
+
+    if metadata:
+        worksheet.append([cell(label, 'timetable_header') for label, _ in metadata])
+        worksheet.append([cell(value) for _, value in metadata])
+        worksheet.append([])
+    worksheet.append([cell(None, 'timetable_header')] + [cell(slot, 'timetable_header') for slot in slots])
+    for day, row in timetable.items():
+        worksheet.append([cell(day, 'timetable_header')] + [cell(row[slot]) for slot in slots])
+    return worksheet
+
+
+def _write_loads(workbook, title, loads):
+    """Streams one row of weekly totals per teacher."""
+    worksheet = workbook.create_sheet(title)
+    worksheet.column_dimensions['A'].width = COLUMN_WIDTH
+    header = [WriteOnlyCell(worksheet, value=label) for label in ['Teacher'] + [label for label, _ in LOAD_COLUMNS]]
+    for cell in header:
+        cell.style = 'timetable_header'
+    worksheet.append(header)
+    for teacher, load in loads.items():
+        worksheet.append([teacher] + [load[key] for _, key in LOAD_COLUMNS])
+    return worksheet
+
+
+def semester_metadata(semester_data):
+    return [(label, semester_data.get(key, '')) for label, key in METADATA_COLUMNS]
+
+
+def resource_timetables(placements, all_semester_data, grid=DEFAULT_GRID):
+    """
+    Builds teacher-wise and room-wise timetables and weekly teacher loads in
+    one pass over a run's placements; no semester grid is scanned.
+
+    Args:
+        placements: {group index: [Placement, ...]} as kept by TimetableEngine
+        all_semester_data: The semester records, indexed by group
+        grid: SlotGrid the run used
+
+    Returns:
+        tuple: ({teacher: timetable}, {room: timetable}, {teacher: load}),
+            teachers and rooms in order of first appearance; a load counts
+            sessions, slots, hours, theory/tutorial/lab sessions and teaching days
+    """
+    teacher_views = {}
+    room_views = {}
+    loads = {}
+    teaching_days = {}
+    minutes = [end - start for start, end in grid.minutes]
+    for group, group_placements in placements.items():
+        semester = all_semester_data[group]
+        name = semester['semester'] or semester['excel_name']
+        for p in group_placements:
+            session = p.session
+            slots = grid.slots[p.start:p.start + session.length]
+            lines = p.label.split('\n')
+            kind = 'lab' if session.kind == 'group_lab' else session.kind
+            hours = sum(minutes[p.start:p.start + session.length]) / 60
+            for teacher in session.teachers:
+                view = teacher_views.get(teacher)
+                if view is None:
+                    view = teacher_views[teacher] = grid.empty_timetable()
+                    loads[teacher] = dict.fromkeys((key for _, key in LOAD_COLUMNS), 0)
+                    teaching_days[teacher] = set()
+                # Shared lab blocks list every teacher; keep this teacher's line
+                text = f"{name}: " + '\n'.join([line for line in lines if line.endswith(f" - {teacher}")] or lines)
+                for slot in slots:
+                    view[p.day][slot] = text
+                load = loads[teacher]
+                load['sessions'] += 1
+                load['slots'] += session.length
+                load['hours'] += hours
+                load[kind] += 1
+                teaching_days[teacher].add(p.day)
+            for room in p.rooms:
+                view = room_views.get(room)
+                if view is None:
+                    view = room_views[room] = grid.empty_timetable()
+                # Likewise a lab block lists every lab room; keep this room's line
+                text = f"{name}: " + '\n'.join([line for line in lines if f", {room})" in line] or lines)
+                for slot in slots:
+                    view[p.day][slot] = text
+    for teacher, days in teaching_days.items():
+        loads[teacher]['days'] = len(days)
+        loads[teacher]['hours'] = round(loads[teacher]['hours'], 2)
+    return teacher_views, room_views, loads
+
+
+def teacher_timetables(placements, all_semester_data, grid=DEFAULT_GRID):
+    """One {day: {slot: label}} timetable per teacher; see resource_timetables."""
+    return resource_timetables(placements, all_semester_data, grid)[0]
+
+
+def save_timetable_to_excel(timetable, semester_data, file_location=None):
+    """Writes one semester to its own <excel_name>.xlsx and returns the path."""
+    filepath = os.path.join(file_location or semester_data['file_location'], f"{semester_data['excel_name']}.xlsx")
+
+    workbook = Workbook(write_only=True)
+    _add_styles(workbook)
+    _write_sheet(workbook, 'Timetable', semester_metadata(semester_data), timetable)
+    workbook.save(filepath)
+    return filepath
+
+
+def _write_views(workbook, used, teacher_views=None, room_views=None, teacher_loads=None):
+    if teacher_loads:
+        _write_loads(workbook, _sheet_title('Teacher Load', used), teacher_loads)
+    for teacher, timetable in (teacher_views or {}).items():
+        _write_sheet(workbook, _sheet_title(f"Teacher {teacher}", used), [('Teacher', teacher)], timetable)
+    for room, timetable in (room_views or {}).items():
+        _write_sheet(workbook, _sheet_title(f"Room {room}", used), [('Room', room)], timetable)
+
+
+def save_workbook(timetables, all_semester_data, filepath, teacher_views=None, room_views=None, teacher_loads=None):
+    """
+    Writes every semester into one workbook, one sheet per section, plus a
+    teacher load sheet, one sheet per teacher and one per room for whichever
+    of teacher_loads, teacher_views and room_views is given.
+
+    Args:
+        timetables: Timetables in the order of all_semester_data; any iterable,
+            consumed one sheet at a time
+        all_semester_data: The semester records
+        filepath: Path of the .xlsx file to write
+        teacher_views: Optional {teacher: timetable}, e.g. from resource_timetables
+        room_views: Optional {room: timetable}
+        teacher_loads: Optional {teacher: load}
+
+    Returns:
+        str: filepath
+    """
+    workbook = Workbook(write_only=True)
+    _add_styles(workbook)
+    used = set()
+    for semester_data, timetable in zip(all_semester_data, timetables):
+        title = _sheet_title(semester_data['semester'] or semester_data['excel_name'], used)
+        _write_sheet(workbook, title, semester_metadata(semester_data), timetable)
+    _write_views(workbook, used, teacher_views, room_views, teacher_loads)
+    workbook.save(filepath)
+    return filepath
+
+
+def save_views_workbook(filepath, teacher_views=None, room_views=None, teacher_loads=None):
+    """Writes only the teacher load, teacher and room sheets, for runs exported one file per semester."""
+    workbook = Workbook(write_only=True)
+    _add_styles(workbook)
+    _write_views(workbook, set(), teacher_views, room_views, teacher_loads)
+    workbook.save(filepath)
+    return filepath
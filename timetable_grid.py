@@ -0,0 +1,161 @@
+"""
+The weekly slot grid: teaching days, teaching slots, breaks and the end times
+a semester may choose, with every table the schedulers query computed once.
+
+A grid can be loaded from a JSON config file with the same keys as
+DEFAULT_CONFIG:
+
+    {
+      "days": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"],
+      "slots": ["9:00-9:55", "9:55-10:50", "11:05-12:00", "12:00-12:55"],
+      "breaks": [["10:50-11:05", "Short Break"]],
+      "end_time_options": ["10:50", "12:55"],
+      "default_end_time": "12:55"
+    }
+
+Schedulers address slots by their integer index in grid.slots; slot strings
+are only needed as timetable keys and for teacher bookings.
+"""
+import json
+
+from timetable_index import ADJACENT_GAP, slot_minutes, time_to_minutes
+
+DEFAULT_CONFIG = {
+    'days': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'],
+    'slots': ['9:00-9:55', '9:55-10:50', '11:05-12:00', '12:00-12:55', '13:45-14:40', '14:40-15:35', '15:35-16:30'],
+    'breaks': [('10:50-11:05', 'Short Break'), ('12:55-13:45', 'Lunch Break')],
+    'end_time_options': ['10:50', '12:55', '14:40', '15:35', '16:30'],
+    'default_end_time': '16:30',
+}
+
+
+class AllowedSlots:
+    """
+    What one day allows under a given end time; built once per end time by
+    SlotGrid.allowed.
+
+    Attributes:
+        singles: Indices of slots ending by the end time
+        pairs: Start indices of two consecutive slots ending by the end time (labs)
+        joined_pairs: The pairs with no break between their two slots (tutorials)
+        single_mask, pair_mask, joined_mask: The same sets as slot-index bitmasks
+        max_sessions: Most separate sessions one teacher can give in such a day
+    """
+
+    __slots__ = ('singles', 'pairs', 'joined_pairs', 'single_mask', 'pair_mask', 'joined_mask', 'max_sessions')
+
+    def __init__(self, grid, end_time):
+        self.singles = tuple(i for i, (_, end) in enumerate(grid.minutes) if end <= end_time)
+        self.pairs = tuple(i for i in grid.pairs if grid.minutes[i + 1][1] <= end_time)
+        self.joined_pairs = tuple(i for i in self.pairs if i in grid.joined_pairs)
+        self.single_mask = sum(1 << i for i in self.singles)
+        self.pair_mask = sum(1 << i for i in self.pairs)
+        self.joined_mask = sum(1 << i for i in self.joined_pairs)
+
+        # Earliest-end-first is optimal for picking non-overlapping intervals;
+        # bookings touching at an end point count as overlapping
+        self.max_sessions = 0
+        last_end = -1
+        for start, end in sorted((grid.minutes[i] for i in self.singles), key=lambda span: span[1]):
+            if start > last_end:
+                self.max_sessions += 1
+                last_end = end
+
+
+class SlotGrid:
+    """
+    A weekly time grid with its lookup tables precomputed.
+
+    Args:
+        days: Teaching days, in order
+        slots: 'H:MM-H:MM' teaching slots, in order
+        breaks: (slot, name) pairs shown between teaching slots
+        end_time_options: 'H:MM' end times a semester may pick per day
+        default_end_time: End time for days a semester leaves unset; defaults
+            to the end of the last slot
+
+    Attributes:
+        minutes: (start, end) minutes since midnight of every slot
+        day_index: Day -> day index
+        index: Slot string -> slot index
+        by_start: 'H:MM' start time -> slot index
+        pairs: Start indices of every two consecutive slots
+        joined_pairs: The pairs with no break between their two slots
+        conflicts: Per slot, bitmask of slots a teacher cannot also teach (end points included)
+        adjacent: Per slot, bitmask of other slots within ADJACENT_GAP minutes of its start or end
+        back_to_back: Bit i is set when slot i + 1 starts less than ADJACENT_GAP minutes after slot i ends
+
+    Raises:
+        ValueError: If the slots are malformed or not in increasing time order
+    """
+
+    def __init__(self, days, slots, breaks=(), end_time_options=None, default_end_time=None):
+        self.days = list(days)
+        self.slots = list(slots)
+        self.breaks = [tuple(entry) for entry in breaks]
+        if not self.days or not self.slots:
+            raise ValueError("A slot grid needs at least one day and one slot")
+        try:
+            self.minutes = [slot_minutes(slot) for slot in self.slots]
+        except ValueError:
+            raise ValueError(f"Invalid slot in grid: {self.slots}")
+        for (start, end), (next_start, _) in zip(self.minutes, self.minutes[1:] + [(float('inf'), 0)]):
+            if not start < end <= next_start:
+                raise ValueError(f"Grid slots must be increasing and not overlap: {self.slots}")
+
+        last_end = self.slots[-1].split('-')[1]
+        self.end_time_options = list(end_time_options or [last_end])
+        self.default_end_time = default_end_time or last_end
+        self.day_index = {day: d for d, day in enumerate(self.days)}
+        self.index = {slot: i for i, slot in enumerate(self.slots)}
+        self.by_start = {slot.split('-')[0]: i for i, slot in enumerate(self.slots)}
+
+        count = len(self.slots)
+        spans = self.minutes
+        self.pairs = tuple(range(count - 1))
+        self.joined_pairs = frozenset(i for i in self.pairs if spans[i + 1][0] - spans[i][1] < ADJACENT_GAP)
+        self.back_to_back = sum(1 << i for i in self.joined_pairs)
+        self.conflicts = [sum(1 << j for j in range(count) if spans[i][0] <= spans[j][1] and spans[i][1] >= spans[j][0])
+                          for i in range(count)]
+        self.adjacent = [sum(1 << j for j in range(count) if j != i and (
+                             abs(spans[i][0] - spans[j][1]) < ADJACENT_GAP
+                             or abs(spans[j][0] - spans[i][1]) < ADJACENT_GAP))
+                         for i in range(count)]
+
+        self._allowed = {}
+        for option in self.end_time_options + [self.default_end_time]:
+            self.allowed(time_to_minutes(option))
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(config['days'], config['slots'], config.get('breaks', ()),
+                   config.get('end_time_options'), config.get('default_end_time'))
+
+    @classmethod
+    def load(cls, path):
+        """Reads a grid from a JSON config file (see the module docstring)."""
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {'days': list(self.days), 'slots': list(self.slots), 'breaks': [list(entry) for entry in self.breaks],
+                'end_time_options': list(self.end_time_options), 'default_end_time': self.default_end_time}
+
+    def allowed(self, end_time):
+        """Returns the AllowedSlots for a day ending at end_time (minutes since midnight)."""
+        allowed = self._allowed.get(end_time)
+        if allowed is None:
+            allowed = self._allowed[end_time] = AllowedSlots(self, end_time)
+        return allowed
+
+    def day_allowed(self, day_end_times):
+        """Maps every grid day to its AllowedSlots given a semester's {day: 'H:MM'} end times."""
+        day_end_times = day_end_times or {}
+        return {day: self.allowed(time_to_minutes(day_end_times.get(day) or self.default_end_time))
+                for day in self.days}
+
+    def empty_timetable(self):
+        return {day: {slot: '' for slot in self.slots} for day in self.days}
+
+
+DEFAULT_GRID = SlotGrid.from_dict(DEFAULT_CONFIG)
@@ -0,0 +1,294 @@
+"""
+Incremental rescheduling against an earlier run.
+
+A run state (make_state) keeps what a run was given and what it produced: the
+inputs of every semester, the timetables and the placements. reschedule()
+diffs new inputs against it semester by semester and subject by subject,
+takes out only the sessions of subjects whose teacher or credits changed (and
+sessions that no longer fit a changed end time), and re-places just those
+with the solver while every other session keeps its day and slot. If the
+changed sessions of a semester cannot fit around the kept ones, that
+semester's sessions are all re-placed before giving up. A semester whose room
+or class size changed is re-placed as a whole, since its rooms may change.
+
+Semesters are matched by name, so sections can be added, removed or
+reordered. The result says which semesters changed, so callers rewrite only
+those workbooks.
+
+States are saved as JSON (dump_state), never pickled, so opening a state file
+or project someone else shared cannot run code; parse_state() rebuilds the
+placements from their dict forms and treats anything malformed as no state.
+"""
+import json
+import os
+import tempfile
+from collections import Counter
+
+from timetable_compact import SectionGrid, timetable_dict
+from timetable_errors import InfeasibleError
+from timetable_index import TeacherSchedules
+from timetable_rooms import RoomSchedules
+from timetable_solver import Placement, Session
+from timetable_specs import compile_semester, get_specs
+
+STATE_VERSION = 6  # Bump when the stored layout changes
+ROOM_KEYS = ('room_number', 'num_students', 'batches')  # Semester keys that decide its labs and the rooms they may take
+
+
+def make_state(all_semester_data, timetables, placements, grid, rooms=None, availability=None):
+    """
+    Captures a finished run for a later reschedule().
+
+    Args:
+        all_semester_data: The semester records the run scheduled
+        timetables: The run's timetables, in the same order
+        placements: {group index: [Placement, ...]} as kept by TimetableEngine
+        grid: The SlotGrid the run used
+        rooms: The Rooms list the run used, if any
+        availability: The teacher Availability rules the run used, if any
+    """
+    return {
+        'version': STATE_VERSION,
+        'grid': grid.to_dict(),
+        'rooms': rooms.to_dict() if rooms and rooms.by_name else None,
+        'availability': availability.to_dict() if availability else None,
+        'semesters': [{key: value for key, value in semester.items() if key != 'specs'}
+                      for semester in all_semester_data],
+        'timetables': timetables,
+        'placements': placements,
+    }
+
+
+def dump_state(state):
+    """A make_state result as JSON text; timetables are stored as plain dicts."""
+    return json.dumps(dict(state, timetables=[timetable_dict(timetable) for timetable in state['timetables']],
+                           placements={str(group): [p.to_dict() for p in placements]
+                                       for group, placements in state['placements'].items()}))
+
+
+def parse_state(text):
+    """The state in dump_state's JSON text, or None if it is malformed or from another version."""
+    try:
+        state = json.loads(text)
+        if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+            return None
+        state['placements'] = {int(group): [Placement.from_dict(p) for p in placements]
+                               for group, placements in state['placements'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    return state
+
+
+def save_state(state, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so an interrupted save keeps the old state
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(dump_state(state))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+def load_state(path):
+    """Returns the state saved at path, or None if there is no usable one."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+    return parse_state(text)
+
+
+def semester_keys(all_semester_data):
+    """One key per semester: its name, numbered when several share one."""
+    keys = []
+    seen = Counter()
+    for index, semester in enumerate(all_semester_data):
+        name = semester.get('semester') or semester.get('excel_name') or f"#{index + 1}"
+        seen[name] += 1
+        keys.append(name if seen[name] == 1 else f"{name} ({seen[name]})")
+    return keys
+
+
+def changed_subjects(old_specs, new_specs):
+    """
+    (subject, teacher) pairs whose sessions must be re-placed.
+
+    A subject added, removed or given other credits changes its own pair; any
+    change among the pure practicals changes all of them, because their
+    batches are matched into shared lab blocks together.
+    """
+    old = Counter(old_specs)
+    new = Counter(new_specs)
+    differing = list((old - new) + (new - old))
+    changed = {(spec.subject, spec.teacher) for spec in differing}
+    if any(spec.is_pure_practical for spec in differing):
+        changed.update((spec.subject, spec.teacher) for spec in new_specs if spec.is_pure_practical)
+    return changed
+
+
+def _starts(engine, kind):
+    # Start positions the engine's current semester allows for a kind of session
+    return {'theory': engine.single_starts, 'tutorial': engine.tutorial_starts}.get(kind, engine.pair_starts)
+
+
+def _session_starts(engine, session):
+    # Starts a kept session may use now: its kind's starts less those its teachers are unavailable for,
+    # as build_sessions gives them
+    return engine.teacher_masks.session_starts(_starts(engine, session.kind), session.teachers, session.length)
+
+
+def _book(engine, teacher_schedules, placement):
+    names = engine.grid.slots[placement.start:placement.start + placement.session.length]
+    for teacher in placement.session.teachers:
+        teacher_schedules.book_many(teacher, placement.day, names)
+    for room in placement.rooms:
+        engine.room_schedules.book(room, placement.day, placement.start, placement.session.length)
+
+
+def _release(engine, teacher_schedules, placement):
+    for slot in engine.grid.slots[placement.start:placement.start + placement.session.length]:
+        for teacher in placement.session.teachers:
+            teacher_schedules.release(teacher, placement.day, slot)
+    for room in placement.rooms:
+        engine.room_schedules.release(room, placement.day, placement.start, placement.session.length)
+
+
+def reschedule(engine, state, all_semester_data, teacher_schedules=None, room_schedules=None):
+    """
+    Updates the run in state to new inputs, moving as few sessions as possible.
+
+    The engine's placements and room bookings are replaced by the updated
+    run's, so make_state(all_semester_data, timetables, engine.placements,
+    engine.grid, engine.rooms) captures it for the next call. With
+    engine.improve_time the annealing stage runs over the semesters whose
+    sessions were re-placed only, so semesters the edit did not touch keep
+    their timetables.
+
+    Args:
+        engine: TimetableEngine providing the grid, solver budgets, generator and progress
+        state: A make_state/load_state result for an earlier run on the same grid
+        all_semester_data: The new semester records
+        teacher_schedules: Bookings to start from, if any; filled with the updated run's
+        room_schedules: Room bookings to start from, if any; likewise
+
+    Returns:
+        tuple: (timetables in the order of all_semester_data, sorted indices of
+            the semesters whose timetable or details changed)
+
+    Raises:
+        ValueError: The state was made on a different grid, room list or
+            teacher availability
+        InfeasibleError: The changes do not fit even when their semesters are
+            re-placed as a whole; a full generate_timetables may still succeed
+        SolverTimeout: The solver ran out of time
+    """
+    if state['grid'] != engine.grid.to_dict():
+        raise ValueError("The saved run used a different slot grid; regenerate from scratch")
+    if state['rooms'] != (engine.rooms.to_dict() if engine.rooms.by_name else None):
+        raise ValueError("The saved run used a different room list; regenerate from scratch")
+    if state['availability'] != (engine.availability.to_dict() if engine.availability else None):
+        raise ValueError("The saved run used different teacher availability; regenerate from scratch")
+    if teacher_schedules is None:
+        teacher_schedules = TeacherSchedules()
+    engine.room_schedules = RoomSchedules() if room_schedules is None else room_schedules
+    if engine.precheck:
+        engine.check_capacity(all_semester_data)
+    previous = dict(zip(semester_keys(state['semesters']), range(len(state['semesters']))))
+
+    engine.placements = {}
+    timetables = []
+    changed = []
+    pending = {}  # group -> (subject, teacher) pairs to place, or None for the whole semester
+    for group, (key, semester) in enumerate(zip(semester_keys(all_semester_data), all_semester_data)):
+        engine._load_end_times(semester)
+        engine._load_rooms(semester)
+        old = previous.get(key)
+        if old is None:
+            timetables.append(SectionGrid(engine.grid))
+            engine.placements[group] = []
+            pending[group] = None
+            changed.append(group)
+            continue
+
+        old_semester = state['semesters'][old]
+        old_specs = compile_semester(old_semester)
+        affected = changed_subjects(old_specs, get_specs(semester))
+        if any(old_semester.get(name) != semester.get(name) for name in ROOM_KEYS):
+            affected.update((spec.subject, spec.teacher) for spec in old_specs + get_specs(semester))
+        old_placements = state['placements'].get(old, [])
+        allowed = {}  # (kind, teachers) -> (starts, set of starts) the session may use now
+        for p in old_placements:
+            key = (p.session.kind, p.session.teachers)
+            if key not in allowed:
+                starts = _session_starts(engine, p.session)
+                allowed[key] = starts, set(starts)
+            if (p.day, p.start) not in allowed[key][1]:
+                affected.update(p.session.subjects)  # A changed end time or availability cut this session off
+
+        timetable = SectionGrid(engine.grid)
+        kept = []
+        for p in old_placements:
+            if affected.intersection(p.session.subjects):
+                continue
+            session = p.session
+            moved = Session(session.kind, session.subjects, group, session.length,
+                            allowed[session.kind, session.teachers][0],
+                            session.avoid_adjacent, session.copy, session.rooms, session.batches)
+            kept.append(Placement(moved, p.day, p.start, p.batch, p.rooms))
+            timetable.place(kept[-1])
+            _book(engine, teacher_schedules, kept[-1])
+        timetables.append(timetable)
+        engine.placements[group] = kept
+        if affected:
+            pending[group] = affected
+        if affected or {k: v for k, v in semester.items() if k != 'specs'} != old_semester:
+            changed.append(group)
+
+    if pending:
+        _place_pending(engine, pending, all_semester_data, timetables, teacher_schedules)
+        if engine.improve_time:
+            engine.improve(timetables, teacher_schedules, groups=sorted(pending))
+    return timetables, changed
+
+
+def _pending_sessions(engine, pending, all_semester_data):
+    sessions = []
+    for group, affected in pending.items():
+        engine._load_end_times(all_semester_data[group])
+        engine._load_rooms(all_semester_data[group])
+        for session in engine.build_sessions(all_semester_data[group], group):
+            if affected is None or affected.intersection(session.subjects):
+                sessions.append(session)
+    return sessions
+
+
+def _place_pending(engine, pending, all_semester_data, timetables, teacher_schedules):
+    # Re-place the changed sessions around the kept ones; if they do not fit,
+    # free the rest of their semesters too and try once more
+    sessions = _pending_sessions(engine, pending, all_semester_data)
+    engine._emit('rescheduled', semesters=len(pending), sessions=len(sessions))
+    occupied = {(group, p.day, p.start + k) for group in pending
+                for p in engine.placements[group] for k in range(p.session.length)}
+    try:
+        solution = engine.make_solver(teacher_schedules, occupied).solve(sessions)
+    except InfeasibleError:
+        for group in pending:
+            for p in engine.placements[group]:
+                timetables[group].clear(p)
+                _release(engine, teacher_schedules, p)
+            engine.placements[group] = []
+        pending = dict.fromkeys(pending)
+        sessions = _pending_sessions(engine, pending, all_semester_data)
+        engine._emit('rescheduled', semesters=len(pending), sessions=len(sessions))
+        try:
+            solution = engine.make_solver(teacher_schedules).solve(sessions)
+        except InfeasibleError as e:
+            raise InfeasibleError(f"The changed semesters no longer fit around the others: {e}", e.report)
+    engine.place_solution(sessions, solution, dict(enumerate(timetables)), teacher_schedules)
@@ -0,0 +1,148 @@
+from functools import lru_cache
+
+ADJACENT_GAP = 5  # Minutes of break below which two classes count as adjacent
+
+
+@lru_cache(maxsize=None)
+def slot_minutes(slot):
+    """Parses an 'H:MM-H:MM' slot string into (start, end) minutes since midnight."""
+    start, end = slot.split('-')
+    return time_to_minutes(start), time_to_minutes(end)
+
+
+@lru_cache(maxsize=None)
+def time_to_minutes(value):
+    hours, minutes = value.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+@lru_cache(maxsize=None)
+def minute_mask(start, end):
+    """Bitmask with one bit set per minute in the closed range [start, end]."""
+    start = max(start, 0)
+    if end < start:
+        return 0
+    return ((1 << (end - start + 1)) - 1) << start
+
+
+@lru_cache(maxsize=None)
+def slot_masks(slot):
+    """
+    Precomputed query masks for a slot.
+
+    Returns:
+        tuple: (occupancy mask, window around the slot start, window around the slot end)
+    """
+    start, end = slot_minutes(slot)
+    reach = ADJACENT_GAP - 1
+    return (minute_mask(start, end),
+            minute_mask(start - reach, start + reach),
+            minute_mask(end - reach, end + reach))
+
+
+class TeacherSchedules:
+    """
+    Per-teacher, per-day occupancy index shared by every semester of a run.
+
+    Each (teacher, day) keeps three minute bitmasks: the minutes the teacher is
+    busy, the minutes a booked class starts and the minutes one ends. Slot
+    strings are parsed once (and cached), so the overlap and adjacency queries
+    the schedulers run in their inner loops are a couple of integer ANDs.
+    The booked slot strings are kept alongside for reporting and export.
+    """
+
+    def __init__(self):
+        self._days = {}  # teacher -> day -> [busy mask, start mask, end mask, [slot, ...]]
+
+    @classmethod
+    def from_dict(cls, teacher_schedules):
+        """Loads the legacy {teacher: {day: [slot, ...]}} structure."""
+        index = cls()
+        for teacher, days in teacher_schedules.items():
+            for day, slots in days.items():
+                index.book_many(teacher, day, slots)
+        return index
+
+    def to_dict(self):
+        return {teacher: {day: list(entry[3]) for day, entry in days.items()}
+                for teacher, days in self._days.items()}
+
+    def snapshot(self):
+        """Returns an independent copy of the bookings for restore()."""
+        return {teacher: {day: [entry[0], entry[1], entry[2], list(entry[3])] for day, entry in days.items()}
+                for teacher, days in self._days.items()}
+
+    def restore(self, snapshot):
+        self._days = {teacher: {day: [entry[0], entry[1], entry[2], list(entry[3])] for day, entry in days.items()}
+                      for teacher, days in snapshot.items()}
+
+    def __contains__(self, teacher):
+        return teacher in self._days
+
+    def __iter__(self):
+        return iter(self._days)
+
+    def __len__(self):
+        return len(self._days)
+
+    def _entry(self, teacher, day):
+        days = self._days.get(teacher)
+        if days is None:
+            days = self._days[teacher] = {}
+        entry = days.get(day)
+        if entry is None:
+            entry = days[day] = [0, 0, 0, []]
+        return entry
+
+    def book(self, teacher, day, slot):
+        start, end = slot_minutes(slot)
+        entry = self._entry(teacher, day)
+        entry[0] |= slot_masks(slot)[0]
+        entry[1] |= 1 << start
+        entry[2] |= 1 << end
+        entry[3].append(slot)
+
+    def book_many(self, teacher, day, slots):
+        for slot in slots:
+            self.book(teacher, day, slot)
+
+    def release(self, teacher, day, slot):
+        """Removes one booking of slot and rebuilds that day's masks."""
+        entry = self._days[teacher][day]
+        entry[3].remove(slot)
+        remaining = entry[3]
+        entry[0:3] = [0, 0, 0]
+        for existing_slot in remaining:
+            start, end = slot_minutes(existing_slot)
+            entry[0] |= slot_masks(existing_slot)[0]
+            entry[1] |= 1 << start
+            entry[2] |= 1 << end
+        if not remaining:
+            del self._days[teacher][day]
+            if not self._days[teacher]:
+                del self._days[teacher]
+
+    def slots(self, teacher, day):
+        days = self._days.get(teacher)
+        if days is None or day not in days:
+            return []
+        return list(days[day][3])
+
+    def is_free(self, teacher, day, slot):
+        """True if slot does not overlap (end points included) any booking of teacher on day."""
+        days = self._days.get(teacher)
+        if days is None:
+            return True
+        entry = days.get(day)
+        return entry is None or not entry[0] & slot_masks(slot)[0]
+
+    def has_adjacent(self, teacher, day, slot):
+        """True if a booking ends or starts less than ADJACENT_GAP minutes from slot's start or end."""
+        days = self._days.get(teacher)
+        if days is None:
+            return False
+        entry = days.get(day)
+        if entry is None:
+            return False
+        _, start_window, end_window = slot_masks(slot)
+        return bool(entry[2] & start_window or entry[1] & end_window)
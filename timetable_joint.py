@@ -0,0 +1,207 @@
+"""
+Joint scheduling of a whole department.
+
+Semester-by-semester scheduling commits every placement of a semester before
+it looks at the next, so an early semester can take the only slots a shared
+teacher had left for a later one, and nothing inside the later semester can
+undo that. ConflictRepair treats every session of every semester as one
+problem instead. Sessions are placed most constrained first; when one has no
+free start left, it takes the start that displaces the fewest (and least
+often displaced) placed sessions -- of any semester -- and those go back on
+the queue. This is the iterative forward search of university timetabling.
+Placed sessions are indexed by class cell, by room and cell and by teacher
+and day, so weighing a start costs a few lookups and bitmask tests however
+large the department is; a department of several hundred sessions settles
+in a fraction of a second when it is feasible, and the time budget bounds
+it when it is not.
+
+The values and conflict rules are BacktrackingSolver's, so a repaired
+solution satisfies exactly what a solved one does: class grids, teachers
+(including bookings made outside the search), rooms, teachers' day limits and
+the no-adjacent-class rule of pure-practical blocks. A start that would take a
+teacher past their day limit displaces enough of their sessions that day.
+"""
+import heapq
+import time
+from collections import Counter
+
+from timetable_errors import GenerationCancelled, InfeasibleError, SolverTimeout
+from timetable_solver import BacktrackingSolver
+
+
+class ConflictRepair(BacktrackingSolver):
+    """
+    Conflict-directed repair search over sessions of any number of semesters.
+
+    Takes BacktrackingSolver's arguments; max_backtracks caps the number of
+    evictions instead of backtracks.
+
+    Attributes:
+        evictions: Placed sessions displaced during the last solve
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evictions = 0
+        self.progress = None  # Optional callable(placed, total), called as the search advances
+
+    def _cells(self, var, value):
+        # Grid cell numbers (day-major) the value covers
+        first = value[2] * len(self.slots) + value[1]
+        return range(first, first + self.sessions[var].length)
+
+    def _conflicts(self, var, value_id):
+        """Placed sessions that value_id of var would clash with."""
+        a = self.values[var][value_id]
+        session = self.sessions[var]
+        clashes = set()
+        for cell in self._cells(var, a):
+            owner = self.cell_owner.get((session.group, cell))
+            if owner is not None:
+                clashes.add(owner)
+            for room in a[10]:
+                owner = self.room_owner.get((room, cell))
+                if owner is not None:
+                    clashes.add(owner)
+        for teacher in session.teachers:
+            placed = self.teacher_day.get((teacher, a[2]), ())
+            for other in placed:
+                b = self.values[other][self.assigned[other]]
+                if (a[4] & b[4] or session.avoid_adjacent and (b[6] & a[7] or b[5] & a[8])
+                        or self.sessions[other].avoid_adjacent and (a[6] & b[7] or a[5] & b[8])):
+                    clashes.add(other)
+            limit = self.day_limits.get(teacher)
+            if limit is not None:
+                load = self._booked(teacher, a[0]) + session.length + sum(
+                    self.sessions[other].length for other in placed if other not in clashes)
+                for other in sorted(set(placed) - clashes):
+                    if load <= limit:
+                        break
+                    clashes.add(other)
+                    load -= self.sessions[other].length
+        return clashes
+
+    def _assign(self, var, value_id):
+        value = self.values[var][value_id]
+        session = self.sessions[var]
+        self.assigned[var] = value_id
+        for cell in self._cells(var, value):
+            self.cell_owner[session.group, cell] = var
+            for room in value[10]:
+                self.room_owner[room, cell] = var
+        for teacher in session.teachers:
+            self.teacher_day.setdefault((teacher, value[2]), set()).add(var)
+        self.on_day[session.signature, value[2]] += 1
+
+    def _unassign(self, var):
+        value = self.values[var][self.assigned[var]]
+        session = self.sessions[var]
+        self.assigned[var] = None
+        for cell in self._cells(var, value):
+            del self.cell_owner[session.group, cell]
+            for room in value[10]:
+                del self.room_owner[room, cell]
+        for teacher in session.teachers:
+            self.teacher_day[teacher, value[2]].discard(var)
+        self.on_day[session.signature, value[2]] -= 1
+
+    def solve(self, sessions, order=None):
+        """
+        Args:
+            sessions: The sessions to place, from any semesters
+            order: Optional priority list of the same sessions, placed first to
+                last (e.g. timetable_planning.rank_sessions); defaults to
+                smallest domain first
+
+        Returns:
+            dict: session -> (day, start slot index, rooms) for every session
+
+        Raises:
+            InfeasibleError: A session has no start at all
+            SolverTimeout: The time or eviction budget ran out first
+        """
+        self.sessions = sessions
+        self.room_index = {}
+        for session in sessions:
+            for room in sorted(session.room_names):
+                self.room_index.setdefault(room, len(self.room_index))
+        self.values = [self._compile_values(session) for session in sessions]
+        empty = [session for session, values in zip(sessions, self.values) if not values]
+        if empty:
+            raise InfeasibleError("No free slot at all for: " + ', '.join(map(repr, empty)))
+        # The first free value found is taken: draw them in random order, preferred ones first
+        value_order = [list(range(len(values))) for values in self.values]
+        self._order_values(value_order)
+        self.values = [[values[value_id] for value_id in value_ids]
+                       for values, value_ids in zip(self.values, value_order)]
+        self.assigned = [None] * len(sessions)
+        self.cell_owner = {}  # (group, cell) -> session index placed there
+        self.room_owner = {}  # (room, cell) -> session index holding the room then
+        self.teacher_day = {}  # (teacher, day index) -> indices of the teacher's sessions placed that day
+        self.on_day = Counter()  # (signature, day index) -> sessions placed there, to spread repeats over the week
+        self.evictions = 0
+        deadline = time.perf_counter() + self.time_budget if self.time_budget else None
+
+        position = {session: i for i, session in enumerate(sessions)}
+        if order is None:
+            order = sorted(sessions, key=lambda session: len(self.values[position[session]]))
+        rank = {position[session]: r for r, session in enumerate(order)}
+        queue = [(rank[var], var) for var in range(len(sessions))]
+        heapq.heapify(queue)
+        displaced = [0] * len(sessions)  # Times each session was evicted; costlier to evict again
+        last_evicted_by = [None] * len(sessions)
+        on_day = self.on_day
+        placed = 0
+        steps = 0
+
+        while queue:
+            steps += 1
+            if steps % 64 == 0:
+                if self.cancel is not None and self.cancel.is_set():
+                    raise GenerationCancelled("Joint scheduling was cancelled")
+                if deadline is not None and time.perf_counter() > deadline:
+                    raise SolverTimeout(self._gave_up(f"after {self.time_budget}s"))
+                if self.progress is not None:
+                    self.progress(placed, len(sessions))
+            _, var = heapq.heappop(queue)
+            if self.assigned[var] is not None:
+                continue
+            session = sessions[var]
+            best = None
+            best_key = None
+            for value_id, value in enumerate(self.values[var]):
+                clashes = self._conflicts(var, value_id)
+                # Never bounce straight back the session that just displaced this one
+                if last_evicted_by[var] is not None and last_evicted_by[var] in clashes:
+                    cost = float('inf')
+                else:
+                    cost = sum(1 + displaced[other] for other in clashes)
+                key = (cost, on_day[session.signature, value[2]], self.rng.random())
+                if best_key is None or key < best_key:
+                    best, best_key, best_clashes = value_id, key, clashes
+                    if not cost and not key[1]:
+                        break  # Free, and the first of its kind that day
+            if best_key[0] == float('inf'):
+                # Every start displaces its own displacer; lift the ban and take the cheapest
+                last_evicted_by[var] = None
+                heapq.heappush(queue, (rank[var], var))
+                continue
+            for other in best_clashes:
+                self._unassign(other)
+                placed -= 1
+                displaced[other] += 1
+                last_evicted_by[other] = var
+                heapq.heappush(queue, (rank[other], other))
+                self.evictions += 1
+            if self.max_backtracks is not None and self.evictions > self.max_backtracks:
+                raise SolverTimeout(self._gave_up(f"after {self.evictions} evictions"))
+            self._assign(var, best)
+            placed += 1
+
+        return {session: self.values[i][value][:2] + self.values[i][value][10:]
+                for i, (session, value) in enumerate(zip(sessions, self.assigned))}
+
+    def _gave_up(self, reason):
+        missing = [repr(session) for session, value in zip(self.sessions, self.assigned) if value is None]
+        return (f"Joint scheduling gave up {reason} ({self.evictions} evictions) with "
+                f"{len(missing)} sessions unplaced, e.g. {', '.join(missing[:3])}")
@@ -0,0 +1,159 @@
+"""
+Optional NumPy occupancy backend for the greedy schedulers.
+
+OccupancyTensor is a TeacherSchedules that also keeps two boolean
+teacher × day × slot arrays on the run's grid: which slots a teacher's
+bookings block (overlap, end points included) and which lie within
+ADJACENT_GAP minutes of one. feasible_pairs() then answers the
+simultaneous-practical question -- at which (day, slot pair) are all of a
+group's teachers free for both slots with no class next to the first, while
+the section is free too -- for every day and pair at once with one reduction
+over the group's rows, instead of a per-teacher, per-slot, per-day loop of
+is_slot_available and has_adjacent_classes calls.
+
+NumPy is not required: without it HAS_NUMPY is False, the 'numpy' engine
+backend is refused and the engine keeps using its loops. It is imported by
+the first OccupancyTensor, so importing the engine never pays for it.
+"""
+from importlib.util import find_spec
+
+from timetable_grid import DEFAULT_GRID
+from timetable_index import ADJACENT_GAP, TeacherSchedules, slot_minutes
+
+HAS_NUMPY = find_spec('numpy') is not None
+BACKENDS = ['python', 'numpy']
+numpy = None  # The numpy module once an OccupancyTensor has been made
+
+
+def _import_numpy():
+    global numpy
+    if numpy is None:
+        if not HAS_NUMPY:
+            raise ImportError("The 'numpy' backend needs NumPy; install it or use the 'python' backend")
+        import numpy
+    return numpy
+
+
+def new_teacher_schedules(backend='python', grid=DEFAULT_GRID):
+    """An empty booking index for backend ('python' or 'numpy')."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    return OccupancyTensor(grid) if backend == 'numpy' else TeacherSchedules()
+
+
+class OccupancyTensor(TeacherSchedules):
+    """
+    TeacherSchedules with a vectorized view of the bookings.
+
+    Bookings go into the inherited bitmasks as usual; a teacher's rows of the
+    arrays are rebuilt from them (one array operation per teacher) the next
+    time a query needs that teacher, so booking costs no more than before.
+
+    Args:
+        grid: SlotGrid whose days and slots the arrays are indexed by
+
+    Attributes:
+        busy: Boolean array (teachers, days, slots); True where a booking
+            overlaps the slot, end points included
+        near: Boolean array (teachers, days, slots); True where a booking ends
+            or starts within ADJACENT_GAP minutes of the slot's start or end
+
+    Raises:
+        ImportError: If NumPy is not installed
+    """
+
+    def __init__(self, grid=DEFAULT_GRID):
+        _import_numpy()
+        super().__init__()
+        self.grid = grid
+        self._day_index = {day: d for d, day in enumerate(grid.days)}
+        self._shifts = numpy.arange(len(grid.slots), dtype=numpy.int64)
+        self._rows = {}  # teacher -> index into busy and near
+        self._stale = {}  # teacher -> days booked or released since its rows were built
+        self._footprints = {}  # slot -> (busy, near) slot-index bitmasks of one booking of it
+        self._bits = {}  # slot-index bitmask -> boolean slot row
+        self.busy = numpy.zeros((16, len(grid.days), len(grid.slots)), dtype=bool)
+        self.near = numpy.zeros_like(self.busy)
+
+    def _footprint(self, slot):
+        # Which grid slots one booking of slot blocks, and which it sits next to
+        footprint = self._footprints.get(slot)
+        if footprint is None:
+            start, end = slot_minutes(slot)
+            busy = near = 0
+            for j, (slot_start, slot_end) in enumerate(self.grid.minutes):
+                if start <= slot_end and end >= slot_start:
+                    busy |= 1 << j
+                if abs(slot_start - end) < ADJACENT_GAP or abs(slot_end - start) < ADJACENT_GAP:
+                    near |= 1 << j
+            footprint = self._footprints[slot] = (busy, near)
+        return footprint
+
+    def _row(self, teacher):
+        row = self._rows.get(teacher)
+        if row is None:
+            row = self._rows[teacher] = len(self._rows)
+            if row == len(self.busy):
+                self.busy = numpy.concatenate([self.busy, numpy.zeros_like(self.busy)])
+                self.near = numpy.concatenate([self.near, numpy.zeros_like(self.near)])
+        stale = self._stale.pop(teacher, None)
+        if stale:
+            days = self._days.get(teacher, {})
+            for day in stale:
+                d = self._day_index.get(day)
+                if d is None:
+                    continue  # Not a grid day, so never queried
+                busy = near = 0
+                for slot in days[day][3] if day in days else ():
+                    slot_busy, slot_near = self._footprint(slot)
+                    busy |= slot_busy
+                    near |= slot_near
+                self.busy[row, d] = self._row_bits(busy)
+                self.near[row, d] = self._row_bits(near)
+        return row
+
+    def _row_bits(self, mask):
+        bits = self._bits.get(mask)
+        if bits is None:
+            bits = self._bits[mask] = (mask >> self._shifts & 1).astype(bool)
+        return bits
+
+    def book(self, teacher, day, slot):
+        super().book(teacher, day, slot)
+        self._stale.setdefault(teacher, set()).add(day)
+
+    def release(self, teacher, day, slot):
+        super().release(teacher, day, slot)
+        self._stale.setdefault(teacher, set()).add(day)
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        for teacher in set(self._rows).union(self._days):
+            self._stale.setdefault(teacher, set()).update(self.grid.days)
+
+    def class_occupancy(self, timetable):
+        """Boolean (days, slots) array of the filled cells of the section's SectionGrid."""
+        cells = numpy.frombuffer(timetable.cells, dtype=numpy.uint16)
+        return cells.reshape(len(self.grid.days), len(self.grid.slots)) != 0
+
+    def feasible_pairs(self, teachers, timetable, allowed):
+        """
+        Every slot pair a simultaneous lab of teachers could start at.
+
+        Args:
+            teachers: Teachers who must all be free
+            timetable: The section's timetable; its filled cells block too
+            allowed: {day: AllowedSlots} of the section
+
+        Returns:
+            numpy.ndarray: Boolean (days, slots - 1) array, True at [d, i] when
+                slots i and i + 1 of day d are free for the section and every
+                teacher, none of whom has a class adjacent to slot i
+        """
+        rows = [self._row(teacher) for teacher in teachers]
+        blocked = self.class_occupancy(timetable) | self.busy[rows].any(axis=0)
+        near = self.near[rows].any(axis=0)
+        pair_masks = numpy.array([allowed[day].pair_mask if day in allowed else 0 for day in self.grid.days],
+                                 dtype=numpy.int64)
+        starts = (pair_masks[:, None] >> self._shifts[:-1] & 1).astype(bool)
+        return starts & ~blocked[:, :-1] & ~blocked[:, 1:] & ~near[:, :-1]
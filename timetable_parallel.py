@@ -0,0 +1,135 @@
+"""
+Multi-seed search: runs independent seeded attempts of the whole
+generate_timetables pipeline across a process pool and keeps the first
+complete result or the best-scoring one.
+
+Every attempt gets its own copy of the semester records and a fresh
+TeacherSchedules index inside the worker process, so nothing is shared
+between attempts except the (picklable) inputs and one cancel event: once
+search_seeds has its answer it sets the event, and the attempts still
+running stop at their next cancel check instead of running out their time
+limit.
+"""
+import multiprocessing
+import os
+import time
+
+from timetable_engine import TimetableEngine
+from timetable_errors import GenerationCancelled, SchedulingError
+from timetable_index import TeacherSchedules
+from timetable_occupancy import new_teacher_schedules
+from timetable_quality import score_placements
+
+KEEP_MODES = ['first', 'best']
+
+_cancel = None  # The pool's cancel event inside a worker process
+
+
+def _start_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+
+def run_attempt(all_semester_data, seed, strategy='auto', time_limit=None, score=score_placements, improve_time=0.0,
+                grid=None, rooms=None, backend='python', order='entered', availability=None):
+    """
+    One seeded attempt; runs inside a worker process.
+
+    Returns:
+        dict: seed, complete flag, timetables, placements and teacher bookings
+            (if complete), score, error message (if not) and elapsed seconds
+    """
+    started = time.perf_counter()
+    engine = TimetableEngine(strategy=strategy, seed=seed, time_limit=time_limit, improve_time=improve_time, grid=grid,
+                             rooms=rooms, backend=backend, order=order, availability=availability, cancel=_cancel)
+    teacher_schedules = new_teacher_schedules(backend, engine.grid)
+    result = {'seed': seed, 'complete': False, 'timetables': None, 'placements': None, 'teacher_schedules': None,
+              'score': None, 'error': None}
+    try:
+        timetables = engine.generate_timetables(all_semester_data, teacher_schedules)
+    except (SchedulingError, GenerationCancelled) as e:
+        result['error'] = str(e)
+    else:
+        result.update(complete=True, timetables=timetables, placements=engine.placements,
+                      teacher_schedules=teacher_schedules.to_dict(),
+                      score=score(engine.placements) if score else 0)
+    result['elapsed'] = time.perf_counter() - started
+    return result
+
+
+def search_seeds(all_semester_data, attempts=None, workers=None, time_limit=30.0, keep='first',
+                 strategy='auto', seeds=None, score=score_placements, improve_time=0.0, grid=None, rooms=None,
+                 backend='python', order='entered', availability=None):
+    """
+    Runs seeded attempts in parallel.
+
+    Args:
+        all_semester_data: List of semester records (plain dicts)
+        attempts: Number of attempts; defaults to one per worker
+        workers: Worker processes; defaults to every core
+        time_limit: Wall-clock seconds each attempt may run
+        keep: 'first' returns as soon as any attempt completes and cancels the
+            rest, 'best' waits for all of them and returns the lowest score
+        seeds: Explicit seeds; overrides attempts
+        score: Picklable callable(placements) -> number, lower is better; defaults to the
+            Objective penalty from timetable_quality
+        improve_time: Seconds of annealing inside every attempt before it is scored
+        grid: SlotGrid to schedule on; defaults to the engine's DEFAULT_GRID
+        rooms: Optional Rooms list (see timetable_rooms)
+        backend: Engine booking backend, 'python' or 'numpy' (see timetable_occupancy)
+        order: Engine placement order, 'entered' or 'constrained' (see timetable_planning)
+        availability: Optional teacher Availability rules (see timetable_availability)
+
+    Returns:
+        dict: The winning attempt's result (see run_attempt), with the other
+            attempts' summaries under 'attempts'
+
+    Raises:
+        ValueError: On an unknown keep mode, fewer than one attempt or no seeds
+        InfeasibleError: The capacity precheck failed
+        SchedulingError: No attempt produced a complete timetable
+    """
+    # The process pool machinery is only imported by runs that use it
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    if keep not in KEEP_MODES:
+        raise ValueError(f"Unknown keep mode {keep!r}, expected one of {KEEP_MODES}")
+    if seeds is not None and not seeds:
+        raise ValueError("seeds must name at least one seed")
+    if seeds is None and attempts is not None and attempts < 1:
+        raise ValueError(f"attempts must be at least 1, got {attempts}")
+    workers = workers or os.cpu_count() or 1
+    if seeds is None:
+        seeds = list(range(attempts or workers))
+    all_semester_data = [dict(semester) for semester in all_semester_data]
+    # Fail once, up front, rather than once per worker
+    TimetableEngine(grid=grid, rooms=rooms, availability=availability).check_capacity(all_semester_data)
+
+    best = None
+    summaries = []
+    cancel = multiprocessing.Event()
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(seeds)), initializer=_start_worker,
+                                   initargs=(cancel,))
+    try:
+        pending = {executor.submit(run_attempt, all_semester_data, seed, strategy, time_limit, score, improve_time,
+                                   grid, rooms, backend, order, availability) for seed in seeds}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                summaries.append({key: result[key] for key in ('seed', 'complete', 'score', 'error', 'elapsed')})
+                if result['complete'] and (best is None or result['score'] < best['score']):
+                    best = result
+            if best is not None and keep == 'first':
+                break
+    finally:
+        # Drop queued attempts and tell running ones to stop; don't wait for them
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if best is None:
+        errors = '; '.join(f"seed {summary['seed']}: {summary['error']}" for summary in summaries)
+        raise SchedulingError(f"No attempt produced a complete timetable ({errors})")
+    best['attempts'] = summaries
+    best['teacher_schedules'] = TeacherSchedules.from_dict(best['teacher_schedules'])
+    return best
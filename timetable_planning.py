@@ -0,0 +1,55 @@
+"""
+Most-constrained-first planning across semesters.
+
+Scheduling semesters in the order they were entered, and subjects in list
+order, leaves the sessions of heavily shared teachers and dense semesters to
+the end, when their teachers' weeks are already fragmented. rank_sessions()
+orders every session of a run by how constrained it is, so the hardest are
+placed first whichever semester they belong to:
+
+    constrainedness = length * sum(load(t) * semesters(t) for t in teachers) / starts
+
+where load(t) is the slots teacher t gives in the whole run, semesters(t)
+how many semesters t teaches in, length the session's slots (tutorials and
+labs take two) and starts the start positions its semester's end times
+leave it.
+"""
+from collections import Counter, defaultdict
+
+
+def teacher_loads(sessions):
+    """({teacher: slots taught}, {teacher: number of semesters taught}) over sessions."""
+    load = Counter()
+    groups = defaultdict(set)
+    for session in sessions:
+        for teacher in session.teachers:
+            load[teacher] += session.length
+            groups[teacher].add(session.group)
+    return load, {teacher: len(taught) for teacher, taught in groups.items()}
+
+
+def constrainedness(sessions):
+    """{session: score}; higher means fewer ways to place it (see the module docstring)."""
+    load, degree = teacher_loads(sessions)
+    return {session: session.length * sum(load[t] * degree[t] for t in session.teachers) / max(len(session.starts), 1)
+            for session in sessions}
+
+
+def rank_sessions(sessions):
+    """sessions sorted most constrained first; ties keep their given order."""
+    scores = constrainedness(sessions)
+    return sorted(sessions, key=lambda session: -scores[session])
+
+
+def rank_groups(sessions, groups=()):
+    """
+    Semester indices ordered by their most constrained session, hardest first.
+
+    Args:
+        groups: Every semester index to rank; those without sessions come last, in order
+    """
+    scores = constrainedness(sessions)
+    hardest = {}
+    for session, score in scores.items():
+        hardest[session.group] = max(hardest.get(session.group, 0), score)
+    return sorted(hardest, key=lambda group: -hardest[group]) + [group for group in groups if group not in hardest]
@@ -0,0 +1,154 @@
+"""
+Opt-in instrumentation for generation runs.
+
+A Profiler is attached to one TimetableEngine by shadowing the engine's
+scheduling and slot-check methods with counting wrappers on that instance
+only. Engines without a profiler run the plain methods, so instrumentation
+costs nothing when it is off.
+
+Collected per run:
+    phases: wall seconds per phase (precheck, practical, simultaneous
+        practical, theory, tutorial, interleaved, solver, improve, plus any phase the
+        caller times with profiler.phase(), such as excel_export)
+    calls: is_slot_available and has_adjacent_classes call counts
+    rejections: candidate slots turned down, per "subject - teacher" and per teacher
+    iterations: outer scheduling passes per greedy scheduler
+    runs: how many times each phase ran (e.g. solver fallbacks)
+"""
+import json
+import time
+from contextlib import contextmanager
+
+# Engine method -> phase name
+SCHEDULER_PHASES = {
+    'check_capacity': 'precheck',
+    'schedule_practical': 'practical',
+    'schedule_simultaneous_practicals': 'simultaneous_practical',
+    'schedule_theory': 'theory',
+    'schedule_tutorial': 'tutorial',
+    '_place_in_order': 'interleaved',
+    'solve_timetable': 'solver',
+    'improve': 'improve',
+}
+WRAPPED_METHODS = list(SCHEDULER_PHASES) + ['is_slot_available', 'has_adjacent_classes', '_check_deadline']
+
+
+class Profiler:
+    """
+    Args:
+        count_checks: Also wrap the per-candidate slot checks and scheduling
+            passes; turn off to time phases with negligible overhead
+    """
+
+    def __init__(self, count_checks=True):
+        self.count_checks = count_checks
+        self.phases = {}
+        self.runs = {}
+        self.calls = {'is_slot_available': 0, 'has_adjacent_classes': 0}
+        self.iterations = {}
+        self.rejected_subjects = {}
+        self.rejected_teachers = {}
+        self._current_phase = None
+        self._current_subjects = ()  # (subject, teacher) pairs the running scheduler is placing
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the wall time of the with-block to phase name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def attach(self, engine):
+        """Instruments engine (this instance only) and returns it."""
+        for name, phase in SCHEDULER_PHASES.items():
+            setattr(engine, name, self._wrap_scheduler(getattr(engine, name), phase))
+        if not self.count_checks:
+            return engine
+        engine.is_slot_available = self._wrap_check(engine.is_slot_available, 'is_slot_available', False)
+        engine.has_adjacent_classes = self._wrap_check(engine.has_adjacent_classes, 'has_adjacent_classes', True)
+        engine._check_deadline = self._wrap_pass(engine._check_deadline)
+        return engine
+
+    @staticmethod
+    def detach(engine):
+        for name in WRAPPED_METHODS:
+            engine.__dict__.pop(name, None)
+
+    def _wrap_scheduler(self, method, phase):
+        def scheduler(*args, **kwargs):
+            # Greedy schedulers take (subject, teacher, ...) or ([([(subject, teacher), ...], batches), ...], ...)
+            if phase == 'simultaneous_practical':
+                subjects = tuple(pair for block_subjects, _ in args[0] for pair in block_subjects)
+            elif phase in ('practical', 'theory', 'tutorial'):
+                subjects = ((args[0], args[1]),)
+            else:
+                subjects = ()
+            outer = self._current_phase, self._current_subjects
+            self._current_phase, self._current_subjects = phase, subjects
+            self.runs[phase] = self.runs.get(phase, 0) + 1
+            try:
+                with self.phase(phase):
+                    return method(*args, **kwargs)
+            finally:
+                self._current_phase, self._current_subjects = outer
+        return scheduler
+
+    def _wrap_check(self, method, name, rejected_when):
+        def check(day, slot, teacher, *args, **kwargs):
+            self.calls[name] += 1
+            result = method(day, slot, teacher, *args, **kwargs)
+            if result == rejected_when:
+                self._reject(teacher)
+            return result
+        return check
+
+    def _wrap_pass(self, method):
+        def check_deadline():
+            if self._current_phase is not None:
+                self.iterations[self._current_phase] = self.iterations.get(self._current_phase, 0) + 1
+            return method()
+        return check_deadline
+
+    def _reject(self, teacher):
+        self.rejected_teachers[teacher] = self.rejected_teachers.get(teacher, 0) + 1
+        for subject, subject_teacher in self._current_subjects:
+            if subject_teacher == teacher:
+                key = f"{subject} - {teacher}"
+                self.rejected_subjects[key] = self.rejected_subjects.get(key, 0) + 1
+
+    def report(self):
+        """The collected numbers as a JSON-ready dict, rejections sorted most first."""
+        def ranked(counts):
+            return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+        return {
+            'phases': dict(self.phases),
+            'runs': dict(self.runs),
+            'calls': dict(self.calls),
+            'iterations': dict(self.iterations),
+            'rejections': {'by_subject': ranked(self.rejected_subjects), 'by_teacher': ranked(self.rejected_teachers)},
+        }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def summary(self, top=5):
+        """A few human-readable lines: slowest phases, call counts and the costliest subjects/teachers."""
+        lines = []
+        phases = sorted(self.phases.items(), key=lambda item: -item[1])
+        if phases:
+            lines.append("Time: " + ', '.join(f"{name} {seconds:.3f}s" for name, seconds in phases))
+        lines.append(f"Slot checks: {self.calls['is_slot_available']}, "
+                     f"adjacency checks: {self.calls['has_adjacent_classes']}")
+        if self.iterations:
+            lines.append("Passes: " + ', '.join(f"{name} {count}" for name, count in self.iterations.items()))
+        report = self.report()['rejections']
+        for title, counts in (('Most rejected subjects', report['by_subject']),
+                              ('Most rejected teachers', report['by_teacher'])):
+            if counts:
+                lines.append(f"{title}: " + ', '.join(f"{key} ({count})" for key, count in list(counts.items())[:top]))
+        return '\n'.join(lines)
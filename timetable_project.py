@@ -0,0 +1,183 @@
+"""
+Persistent project file: every semester's inputs, the slot grid, the room
+list, teacher availability and the last generated timetables in one SQLite
+database.
+
+Each semester is one row (its details as JSON) plus one row per subject and
+is saved on its own, so adding or editing a semester rewrites only its rows.
+Loading reads the whole department in two queries. The last run's state
+(see timetable_incremental) is stored too, so the first Generate of a later
+session only redoes what changed since.
+"""
+import json
+import sqlite3
+
+from timetable_availability import Availability
+from timetable_compact import timetable_dict
+from timetable_engine import normalize_semester_data
+from timetable_grid import DEFAULT_GRID, SlotGrid
+from timetable_incremental import dump_state, parse_state
+from timetable_rooms import Rooms
+
+PROJECT_EXTENSION = '.ttproj'
+SCHEMA_VERSION = 1
+SUBJECT_KEYS = ('subjects', 'teachers', 'credits')
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB);
+CREATE TABLE IF NOT EXISTS semesters (position INTEGER PRIMARY KEY, details TEXT NOT NULL, timetable TEXT);
+CREATE TABLE IF NOT EXISTS subjects (
+    semester INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    teacher TEXT NOT NULL,
+    credits TEXT NOT NULL,
+    PRIMARY KEY (semester, position)
+);
+"""
+
+
+class ProjectStore:
+    """
+    One project file, created on first open.
+
+    Semesters are addressed by their position in the department, the same
+    index all_semester_data uses.
+
+    Raises:
+        ValueError: If the file was written by a newer version
+        sqlite3.DatabaseError: If the file is not a project file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            version = self._get('schema_version')
+            if version is None:
+                self._set('schema_version', SCHEMA_VERSION)
+            elif int(version) > SCHEMA_VERSION:
+                self.connection.close()
+                raise ValueError(f"{path} was saved by a newer version of the timetable generator")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def load_grid(self):
+        """The project's SlotGrid, or None if it uses the default grid."""
+        config = self._get('grid')
+        return SlotGrid.from_dict(json.loads(config)) if config else None
+
+    def save_grid(self, grid):
+        with self.connection:
+            self._set('grid', json.dumps(grid.to_dict()) if grid else None)
+
+    def load_rooms(self):
+        """The project's Rooms list, or None if it has none."""
+        config = self._get('rooms')
+        return Rooms.from_dict(json.loads(config)) if config else None
+
+    def save_rooms(self, rooms):
+        with self.connection:
+            self._set('rooms', json.dumps(rooms.to_dict()) if rooms else None)
+
+    def load_availability(self):
+        """The project's teacher Availability rules, or None if it has none."""
+        config = self._get('availability')
+        return Availability.from_dict(json.loads(config)) if config else None
+
+    def save_availability(self, availability):
+        with self.connection:
+            self._set('availability', json.dumps(availability.to_dict()) if availability else None)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM semesters").fetchone()[0]
+
+    def load_semesters(self, grid=None):
+        """Every semester as a normalized record, in department order."""
+        grid = grid or self.load_grid() or DEFAULT_GRID
+        records = {}
+        for position, details in self.connection.execute("SELECT position, details FROM semesters ORDER BY position"):
+            record = json.loads(details)
+            for key in SUBJECT_KEYS:
+                record[key] = []
+            records[position] = record
+        rows = self.connection.execute("SELECT semester, subject, teacher, credits FROM subjects "
+                                       "ORDER BY semester, position")
+        for semester, subject, teacher, credits in rows:
+            record = records[semester]
+            record['subjects'].append(subject)
+            record['teachers'].append(teacher)
+            record['credits'].append(credits)
+        return [normalize_semester_data(record, grid) for record in records.values()]
+
+    def save_semester(self, position, semester_data):
+        """
+        Stores a semester at position, replacing the one there or appending
+        when position is the number of stored semesters. The semester's
+        stored timetable is dropped: it no longer matches its inputs.
+
+        Raises:
+            IndexError: If position would leave a gap
+        """
+        if not 0 <= position <= len(self):
+            raise IndexError(f"Semester position {position} out of range")
+        details = {key: value for key, value in semester_data.items() if key not in SUBJECT_KEYS + ('specs',)}
+        subjects = zip(semester_data['subjects'], semester_data['teachers'], semester_data['credits'])
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO semesters (position, details, timetable) "
+                                    "VALUES (?, ?, NULL)", (position, json.dumps(details)))
+            self.connection.execute("DELETE FROM subjects WHERE semester = ?", (position,))
+            self.connection.executemany("INSERT INTO subjects (semester, position, subject, teacher, credits) "
+                                        "VALUES (?, ?, ?, ?, ?)",
+                                        [(position, i, *subject) for i, subject in enumerate(subjects)])
+
+    def save_semesters(self, all_semester_data):
+        """Replaces every stored semester, e.g. when importing a JSON or CSV department."""
+        with self.connection:
+            self.connection.execute("DELETE FROM semesters")
+            self.connection.execute("DELETE FROM subjects")
+        for position, semester_data in enumerate(all_semester_data):
+            self.save_semester(position, semester_data)
+
+    def delete_semester(self, position):
+        """Removes a semester; the ones after it move up one position."""
+        with self.connection:
+            self.connection.execute("DELETE FROM semesters WHERE position = ?", (position,))
+            self.connection.execute("DELETE FROM subjects WHERE semester = ?", (position,))
+            # Shift through negative keys so no update collides with a row not yet moved
+            for table, column in (('semesters', 'position'), ('subjects', 'semester')):
+                self.connection.execute(f"UPDATE {table} SET {column} = -{column} WHERE {column} > ?", (position,))
+                self.connection.execute(f"UPDATE {table} SET {column} = -{column} - 1 WHERE {column} < 0")
+
+    def save_run(self, timetables, state=None):
+        """Stores generated timetables (in department order) and the run state for incremental updates."""
+        with self.connection:
+            self.connection.executemany("UPDATE semesters SET timetable = ? WHERE position = ?",
+                                        [(json.dumps(timetable_dict(timetable)), position)
+                                         for position, timetable in enumerate(timetables)])
+            self._set('run_state', dump_state(state) if state else None)
+
+    def load_timetables(self):
+        """Stored timetables in department order; None for semesters not generated since their last edit."""
+        return [json.loads(timetable) if timetable else None
+                for timetable, in self.connection.execute("SELECT timetable FROM semesters ORDER BY position")]
+
+    def load_state(self):
+        """The last run's state for timetable_incremental.reschedule, or None."""
+        text = self._get('run_state')
+        # Run states of older versions were pickled; they are ignored, never unpickled
+        return parse_state(text) if isinstance(text, str) else None
@@ -0,0 +1,471 @@
+"""
+Timetable quality objective and the simulated-annealing stage that improves
+a feasible run.
+
+The objective is a sum of independent per-bucket penalties: one bucket per
+(teacher, day) and one per (class, day). A move only touches the buckets of
+the days and teachers it involves, so its score change is computed from a
+handful of slot bitmasks instead of re-scoring the whole department.
+"""
+import math
+import random
+import time
+
+from timetable_grid import DEFAULT_GRID
+from timetable_index import slot_minutes
+
+DEFAULT_WEIGHTS = {
+    'teacher_gaps': 1.0,        # Idle slots between a teacher's first and last class of a day
+    'teacher_adjacent': 0.5,    # Back-to-back sessions for one teacher (as in has_adjacent_classes)
+    'load_balance': 0.1,        # Sum of squared daily loads, for teachers and classes
+    'subject_repeat': 2.0,      # Same subject more than once a day in one class
+    'lab_next_to_theory': 1.0,  # A lab directly before or after a theory/tutorial class
+}
+LECTURE_KINDS = ('theory', 'tutorial')
+
+
+class Objective:
+    """
+    Weighted timetable penalty over a SlotGrid; lower is better.
+
+    Subclass and override teacher_terms/class_terms (or pass other weights)
+    to plug in a different notion of quality; the annealer only ever calls
+    teacher_day and class_day.
+    """
+
+    def __init__(self, grid=DEFAULT_GRID, weights=None):
+        self.grid = grid
+        self.slots = grid.slots
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        # Bit i is set when slot i + 1 starts less than ADJACENT_GAP minutes after slot i ends
+        self.back_to_back = grid.back_to_back
+
+    def teacher_terms(self, occupied, starts):
+        """(idle slots, back-to-back sessions, load squared) for one teacher-day bucket."""
+        if not occupied:
+            return 0, 0, 0
+        load = occupied.bit_count()
+        span = occupied.bit_length() - ((occupied & -occupied).bit_length() - 1)
+        adjacent = (self.back_to_back & occupied & (occupied >> 1) & (starts >> 1)).bit_count()
+        return span - load, adjacent, load * load
+
+    def class_terms(self, occupied, labs, lectures, repeats):
+        """(load squared, subject repeats, lab/lecture neighbours) for one class-day bucket."""
+        load = occupied.bit_count()
+        mixed = (self.back_to_back & ((labs & (lectures >> 1)) | (lectures & (labs >> 1)))).bit_count()
+        return load * load, repeats, mixed
+
+    def teacher_day(self, occupied, starts):
+        gaps, adjacent, load = self.teacher_terms(occupied, starts)
+        weights = self.weights
+        return (weights['teacher_gaps'] * gaps + weights['teacher_adjacent'] * adjacent
+                + weights['load_balance'] * load)
+
+    def class_day(self, occupied, labs, lectures, repeats):
+        load, repeats, mixed = self.class_terms(occupied, labs, lectures, repeats)
+        weights = self.weights
+        return (weights['load_balance'] * load + weights['subject_repeat'] * repeats
+                + weights['lab_next_to_theory'] * mixed)
+
+    def evaluate(self, placements):
+        """Total penalty of a run's placements ({group: [Placement, ...]})."""
+        return _Buckets(placements, self).total()
+
+    def breakdown(self, placements):
+        """Unweighted value of every term, for reports."""
+        buckets = _Buckets(placements, self)
+        totals = dict.fromkeys(DEFAULT_WEIGHTS, 0)
+        for occupied_days, start_days in zip(buckets.teacher_occupied, buckets.teacher_starts):
+            for occupied, starts in zip(occupied_days, start_days):
+                gaps, adjacent, load = self.teacher_terms(occupied, starts)
+                totals['teacher_gaps'] += gaps
+                totals['teacher_adjacent'] += adjacent
+                totals['load_balance'] += load
+        for g in range(len(buckets.groups)):
+            for d in range(len(buckets.days)):
+                load, repeats, mixed = self.class_terms(buckets.class_occupied[g][d], buckets.class_labs[g][d],
+                                                        buckets.class_lectures[g][d], buckets.class_repeats[g][d])
+                totals['load_balance'] += load
+                totals['subject_repeat'] += repeats
+                totals['lab_next_to_theory'] += mixed
+        return totals
+
+
+def score_placements(placements):
+    """Default objective over the default grid; picklable for process pools."""
+    return Objective().evaluate(placements)
+
+
+class _Buckets:
+    """Slot bitmasks per (teacher, day), (class, day) and (room, day) for a set of placements."""
+
+    def __init__(self, placements, objective):
+        self.objective = objective
+        self.groups = list(placements)
+        self.days = []
+        self.teachers = {}
+        self.rooms = {}
+        self.items = []  # Flat list of placements
+        for group in self.groups:
+            for placement in placements[group]:
+                self.items.append(placement)
+                for day, _ in placement.session.starts:
+                    if day not in self.days:
+                        self.days.append(day)
+                if placement.day not in self.days:
+                    self.days.append(placement.day)
+                for teacher in placement.session.teachers:
+                    self.teachers.setdefault(teacher, len(self.teachers))
+                for room in placement.rooms:
+                    self.rooms.setdefault(room, len(self.rooms))
+        self.day_index = {day: d for d, day in enumerate(self.days)}
+
+        day_count = len(self.days)
+        self.teacher_occupied = [[0] * day_count for _ in self.teachers]
+        self.teacher_starts = [[0] * day_count for _ in self.teachers]
+        self.teacher_avoid = [[0] * day_count for _ in self.teachers]
+        self.class_occupied = [[0] * day_count for _ in self.groups]
+        self.class_labs = [[0] * day_count for _ in self.groups]
+        self.class_lectures = [[0] * day_count for _ in self.groups]
+        self.class_repeats = [[0] * day_count for _ in self.groups]
+        self.class_counts = [[{} for _ in range(day_count)] for _ in self.groups]
+        self.room_occupied = [[0] * day_count for _ in self.rooms]
+
+        # Per placement, as plain lists for the hot loop
+        self.item_teachers = [tuple(self.teachers[t] for t in p.session.teachers) for p in self.items]
+        self.item_rooms = [tuple(self.rooms[room] for room in p.rooms) for p in self.items]
+        self.item_group = []
+        for g, group in enumerate(self.groups):
+            self.item_group.extend([g] * len(placements[group]))
+        self.item_length = [p.session.length for p in self.items]
+        self.item_lecture = [p.session.kind in LECTURE_KINDS for p in self.items]
+        self.item_avoid = [p.session.avoid_adjacent for p in self.items]
+        self.item_subject = [p.session.subjects[0][0] for p in self.items]
+        self.item_day = [self.day_index[p.day] for p in self.items]
+        self.item_start = [p.start for p in self.items]
+
+        for i in range(len(self.items)):
+            self.toggle(i, self.item_day[i], self.item_start[i], 1)
+
+        self.teacher_penalty = [[objective.teacher_day(o, s) for o, s in zip(occ, st)]
+                                for occ, st in zip(self.teacher_occupied, self.teacher_starts)]
+        self.class_penalty = [[objective.class_day(self.class_occupied[g][d], self.class_labs[g][d],
+                                                   self.class_lectures[g][d], self.class_repeats[g][d])
+                               for d in range(day_count)] for g in range(len(self.groups))]
+
+    def total(self):
+        return sum(map(sum, self.teacher_penalty)) + sum(map(sum, self.class_penalty))
+
+    def toggle(self, i, d, start, sign):
+        """Adds (sign=1) or removes (sign=-1) placement i at day d, slot start."""
+        footprint = ((1 << self.item_length[i]) - 1) << start
+        first = 1 << start
+        avoid = self.item_avoid[i]
+        for t in self.item_teachers[i]:
+            self.teacher_occupied[t][d] ^= footprint
+            self.teacher_starts[t][d] ^= first
+            if avoid:
+                self.teacher_avoid[t][d] ^= first
+        for r in self.item_rooms[i]:
+            self.room_occupied[r][d] ^= footprint
+        g = self.item_group[i]
+        self.class_occupied[g][d] ^= footprint
+        if self.item_lecture[i]:
+            self.class_lectures[g][d] ^= footprint
+            counts = self.class_counts[g][d]
+            subject = self.item_subject[i]
+            count = counts.get(subject, 0)
+            if sign > 0:
+                if count:
+                    self.class_repeats[g][d] += 1
+                counts[subject] = count + 1
+            else:
+                counts[subject] = count - 1
+                if count > 1:
+                    self.class_repeats[g][d] -= 1
+        else:
+            self.class_labs[g][d] ^= footprint
+
+
+class Annealer:
+    """
+    Simulated annealing over a feasible run.
+
+    Neighbourhoods: move one session to another allowed start, or swap two
+    sessions of equal length within one class. Sessions keep their rooms.
+    Hard constraints (free class cells, free rooms, no teacher overlap with
+    end points included, no class next to the first slot of a lab that must
+    avoid adjacency, teachers' optional day limits) are checked on bitmasks;
+    the objective delta is recomputed only for the touched buckets. Teacher
+    and room bookings made outside these placements (teacher_schedules and
+    room_schedules hold them alongside the run's own) block slots like the
+    run's own sessions do.
+    """
+
+    def __init__(self, placements, timetables, teacher_schedules, objective, rng=None, room_schedules=None,
+                 day_limits=None):
+        self.placements = placements
+        self.timetables = timetables
+        self.teacher_schedules = teacher_schedules
+        self.room_schedules = room_schedules
+        self.objective = objective
+        self.rng = rng or random.Random()
+        self.buckets = _Buckets(placements, objective)
+
+        # Slots a teacher cannot also teach when teaching slot i, and slots adjacent to it
+        self.conflicts = objective.grid.conflicts
+        self.adjacent = objective.grid.adjacent
+        day_index = self.buckets.day_index
+        self.domains = [[(day_index[day], start) for day, start in p.session.starts if day in day_index]
+                        for p in self.buckets.items]
+        self.domain_sets = [set(domain) for domain in self.domains]
+        # Most slots a day per teacher index (None when unlimited), less what is booked outside these placements
+        day_limits = day_limits or {}
+        self.limits = [None] * len(self.buckets.teachers)
+        for teacher, t in self.buckets.teachers.items():
+            if teacher in day_limits:
+                self.limits[t] = [day_limits[teacher] - len(teacher_schedules.slots(teacher, day))
+                                  + self.buckets.teacher_occupied[t][d].bit_count()
+                                  for d, day in enumerate(self.buckets.days)]
+        # Slot bitmasks per teacher and room index and day of what is booked outside these placements
+        self.external_teachers = [[self._booked_mask(teacher_schedules.slots(teacher, day))
+                                   & ~self.buckets.teacher_occupied[t][d] for d, day in enumerate(self.buckets.days)]
+                                  for teacher, t in self.buckets.teachers.items()]
+        self.external_rooms = [[(room_schedules.mask(room, day) if room_schedules is not None else 0)
+                                & ~self.buckets.room_occupied[r][d] for d, day in enumerate(self.buckets.days)]
+                               for room, r in self.buckets.rooms.items()]
+        # Same-length sessions per class, candidates for swaps
+        self.swap_partners = {}
+        for i in range(len(self.buckets.items)):
+            key = (self.buckets.item_group[i], self.buckets.item_length[i])
+            self.swap_partners.setdefault(key, []).append(i)
+
+    def _booked_mask(self, slots):
+        # Grid slots a teacher's booked slot names cover; names from another grid cover what they overlap
+        grid = self.objective.grid
+        mask = 0
+        for slot in slots:
+            i = grid.index.get(slot)
+            if i is not None:
+                mask |= 1 << i
+                continue
+            start, end = slot_minutes(slot)
+            for j, (low, high) in enumerate(grid.minutes):
+                if low < end and high > start:
+                    mask |= 1 << j
+        return mask
+
+    def _footprint_conflicts(self, length, start):
+        mask = 0
+        for k in range(length):
+            mask |= self.conflicts[start + k]
+        return mask
+
+    def _fits(self, i, d, start):
+        """Hard constraints for placing item i at (d, start), with i itself already removed."""
+        b = self.buckets
+        length = b.item_length[i]
+        if start + length > len(self.conflicts):
+            return False
+        footprint = ((1 << length) - 1) << start
+        if b.class_occupied[b.item_group[i]][d] & footprint:
+            return False
+        for r in b.item_rooms[i]:
+            if (b.room_occupied[r][d] | self.external_rooms[r][d]) & footprint:
+                return False
+        blocked = self._footprint_conflicts(length, start)
+        for t in b.item_teachers[i]:
+            occupied = b.teacher_occupied[t][d]
+            busy = occupied | self.external_teachers[t][d]
+            if busy & blocked:
+                return False
+            if self.limits[t] is not None and occupied.bit_count() + length > self.limits[t][d]:
+                return False
+            if b.item_avoid[i] and busy & self.adjacent[start]:
+                return False
+            avoid = b.teacher_avoid[t][d]
+            while avoid:
+                low = avoid & -avoid
+                if footprint & self.adjacent[low.bit_length() - 1]:
+                    return False
+                avoid ^= low
+        return True
+
+    def _penalty(self, touched_teachers, touched_classes):
+        b = self.buckets
+        objective = self.objective
+        total = 0.0
+        for t, d in touched_teachers:
+            total += objective.teacher_day(b.teacher_occupied[t][d], b.teacher_starts[t][d])
+        for g, d in touched_classes:
+            total += objective.class_day(b.class_occupied[g][d], b.class_labs[g][d],
+                                         b.class_lectures[g][d], b.class_repeats[g][d])
+        return total
+
+    def _cached(self, touched_teachers, touched_classes):
+        b = self.buckets
+        return (sum(b.teacher_penalty[t][d] for t, d in touched_teachers)
+                + sum(b.class_penalty[g][d] for g, d in touched_classes))
+
+    def _store(self, touched_teachers, touched_classes):
+        b = self.buckets
+        objective = self.objective
+        for t, d in touched_teachers:
+            b.teacher_penalty[t][d] = objective.teacher_day(b.teacher_occupied[t][d], b.teacher_starts[t][d])
+        for g, d in touched_classes:
+            b.class_penalty[g][d] = objective.class_day(b.class_occupied[g][d], b.class_labs[g][d],
+                                                        b.class_lectures[g][d], b.class_repeats[g][d])
+
+    def _propose(self):
+        """
+        Applies a random feasible move and returns (delta, undo, touched) or None.
+        """
+        b = self.buckets
+        rng = self.rng
+        i = rng.randrange(len(b.items))
+        old = (b.item_day[i], b.item_start[i])
+        if rng.random() < 0.5:
+            # Move one session
+            domain = self.domains[i]
+            if not domain:
+                return None
+            new = domain[rng.randrange(len(domain))]
+            if new == old:
+                return None
+            moves = [(i, old, new)]
+        else:
+            # Swap with a same-length session of the same class
+            partners = self.swap_partners[(b.item_group[i], b.item_length[i])]
+            j = partners[rng.randrange(len(partners))]
+            other = (b.item_day[j], b.item_start[j])
+            if j == i or other == old or other not in self.domain_sets[i] or old not in self.domain_sets[j]:
+                return None
+            moves = [(i, old, other), (j, other, old)]
+
+        touched_teachers = set()
+        touched_classes = set()
+        for k, (src_day, src_start), (dst_day, _) in moves:
+            for t in b.item_teachers[k]:
+                touched_teachers.add((t, src_day))
+                touched_teachers.add((t, dst_day))
+            touched_classes.add((b.item_group[k], src_day))
+            touched_classes.add((b.item_group[k], dst_day))
+        before = self._cached(touched_teachers, touched_classes)
+
+        for k, (src_day, src_start), _ in moves:
+            b.toggle(k, src_day, src_start, -1)
+        placed = []
+        for k, _, (dst_day, dst_start) in moves:
+            if not self._fits(k, dst_day, dst_start):
+                break
+            b.toggle(k, dst_day, dst_start, 1)
+            placed.append((k, dst_day, dst_start))
+        else:
+            delta = self._penalty(touched_teachers, touched_classes) - before
+            return delta, moves, (touched_teachers, touched_classes)
+
+        # Infeasible: put everything back
+        for k, dst_day, dst_start in placed:
+            b.toggle(k, dst_day, dst_start, -1)
+        for k, (src_day, src_start), _ in moves:
+            b.toggle(k, src_day, src_start, 1)
+        return None
+
+    def _commit(self, moves, touched):
+        b = self.buckets
+        for k, _, (dst_day, dst_start) in moves:
+            b.item_day[k] = dst_day
+            b.item_start[k] = dst_start
+        self._store(*touched)
+
+    def _undo(self, moves):
+        b = self.buckets
+        for k, _, (dst_day, dst_start) in moves:
+            b.toggle(k, dst_day, dst_start, -1)
+        for k, (src_day, src_start), _ in moves:
+            b.toggle(k, src_day, src_start, 1)
+
+    def run(self, time_budget=1.0, max_moves=None, start_temperature=None, end_temperature=0.01, cancel=None):
+        """
+        Anneals for time_budget seconds (or max_moves proposals, or until the
+        optional cancel event is set) and writes the best state found back into
+        the placements, timetables and teacher_schedules.
+
+        Returns:
+            dict: initial, final, moves, accepted, moves_per_second
+        """
+        b = self.buckets
+        rng = self.rng
+        initial = current = b.total()
+        best = current
+        best_positions = (list(b.item_day), list(b.item_start))
+        moves = accepted = 0
+        if not b.items:
+            return {'initial': initial, 'final': initial, 'moves': 0, 'accepted': 0, 'moves_per_second': 0.0}
+
+        if start_temperature is None:
+            # Calibrate on the typical size of an uphill step
+            samples = []
+            for _ in range(200):
+                proposal = self._propose()
+                if proposal is None:
+                    continue
+                samples.append(abs(proposal[0]))
+                self._undo(proposal[1])
+            start_temperature = max(sum(samples) / len(samples), end_temperature) if samples else 1.0
+        ratio = end_temperature / start_temperature
+
+        started = time.perf_counter()
+        temperature = start_temperature
+        while True:
+            if moves % 512 == 0:
+                elapsed = time.perf_counter() - started
+                if elapsed >= time_budget or (cancel is not None and cancel.is_set()):
+                    break
+                temperature = start_temperature * ratio ** (elapsed / time_budget)
+            if max_moves is not None and moves >= max_moves:
+                break
+            moves += 1
+            proposal = self._propose()
+            if proposal is None:
+                continue
+            delta, move, touched = proposal
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                self._commit(move, touched)
+                accepted += 1
+                current += delta
+                if current < best - 1e-9:
+                    best = current
+                    best_positions = (list(b.item_day), list(b.item_start))
+            else:
+                self._undo(move)
+
+        elapsed = time.perf_counter() - started
+        self._write_back(*best_positions)
+        self.buckets = _Buckets(self.placements, self.objective)
+        return {'initial': initial, 'final': self.objective.evaluate(self.placements), 'moves': moves,
+                'accepted': accepted, 'moves_per_second': moves / elapsed if elapsed else 0.0}
+
+    def _write_back(self, days, starts):
+        b = self.buckets
+        slots = self.objective.slots
+        changed = [(p, b.days[d], s) for p, d, s in zip(b.items, days, starts) if (p.day, p.start) != (b.days[d], s)]
+        # Clear every old position before writing new ones so swaps don't clobber each other
+        for p, _, _ in changed:
+            self.timetables[p.session.group].clear(p)
+            for slot in slots[p.start:p.start + p.session.length]:
+                for teacher in p.session.teachers:
+                    self.teacher_schedules.release(teacher, p.day, slot)
+            if self.room_schedules is not None:
+                for room in p.rooms:
+                    self.room_schedules.release(room, p.day, p.start, p.session.length)
+        for p, day, start in changed:
+            p.day, p.start = day, start
+            self.timetables[p.session.group].place(p)
+            for slot in slots[start:start + p.session.length]:
+                for teacher in p.session.teachers:
+                    self.teacher_schedules.book(teacher, day, slot)
+            if self.room_schedules is not None:
+                for room in p.rooms:
+                    self.room_schedules.book(room, day, start, p.session.length)
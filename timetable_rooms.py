@@ -0,0 +1,212 @@
+"""
+Rooms and labs as schedulable resources.
+
+Every semester's theory and tutorial classes take its room_number, so two
+sections sharing a room can no longer meet in it at the same time. Labs take
+rooms from a department room list, loaded from JSON:
+
+    {
+      "rooms": [
+        {"name": "A101", "capacity": 60},
+        {"name": "Lab 1", "capacity": 30, "lab": true},
+        {"name": "Lab 2", "capacity": 20, "lab": true}
+      ]
+    }
+
+For labs a section is split into batches (its 'batches' key, three by
+default; see timetable_batches). A theory+practical lab session teaches up to
+two batches, so it needs a lab seating two batches; a simultaneous
+pure-practical block runs one lab per subject, each seating one batch.
+Without any lab rooms in the list, labs are scheduled without a room as
+before.
+"""
+import json
+from itertools import combinations
+
+from timetable_batches import BATCHES, LAB_SEATS
+
+LECTURE_KINDS = ('theory', 'tutorial')
+
+
+def student_count(semester_data):
+    """A semester's num_students as an int; 0 when unset or not a number."""
+    try:
+        return int(semester_data.get('num_students') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def batch_count(semester_data):
+    """A semester's batches as an int; BATCHES when unset or not a positive number."""
+    try:
+        batches = int(semester_data.get('batches') or BATCHES)
+    except (TypeError, ValueError):
+        return BATCHES
+    return batches if batches > 0 else BATCHES
+
+
+def batch_size(num_students, batches=BATCHES):
+    """Students in the largest batch."""
+    return -(-num_students // batches)
+
+
+class Room:
+    """A bookable room; lab rooms can host practicals."""
+
+    __slots__ = ('name', 'capacity', 'lab')
+
+    def __init__(self, name, capacity=0, lab=False):
+        self.name = name
+        self.capacity = capacity
+        self.lab = lab
+
+    def __repr__(self):
+        return f"Room({self.name!r}, {self.capacity}{', lab' if self.lab else ''})"
+
+
+class Rooms:
+    """
+    The department's room list.
+
+    Args:
+        rooms: Room objects; names must be unique
+
+    Raises:
+        ValueError: On a duplicate room name
+    """
+
+    def __init__(self, rooms=()):
+        self.by_name = {}
+        for room in rooms:
+            if room.name in self.by_name:
+                raise ValueError(f"Room {room.name} is listed twice")
+            self.by_name[room.name] = room
+        # Smallest first, so every lab session takes the tightest lab that fits
+        self._labs = sorted((room for room in self.by_name.values() if room.lab), key=lambda room: room.capacity)
+
+    @classmethod
+    def from_dict(cls, config):
+        entries = config.get('rooms', []) if isinstance(config, dict) else config
+        return cls(Room(str(entry['name']), int(entry.get('capacity', 0)), bool(entry.get('lab', False)))
+                   for entry in entries)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a room list from a JSON file (see the module docstring)."""
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {'rooms': [{'name': room.name, 'capacity': room.capacity, 'lab': room.lab}
+                          for room in self.by_name.values()]}
+
+    @property
+    def has_labs(self):
+        return bool(self._labs)
+
+    def labs(self, min_capacity=0):
+        """Names of the lab rooms seating at least min_capacity, smallest first."""
+        return [room.name for room in self._labs if room.capacity >= min_capacity]
+
+    def capacity(self, name):
+        """Capacity of a listed room, or None for rooms not in the list."""
+        room = self.by_name.get(name)
+        return room.capacity if room is not None else None
+
+
+class SectionRooms:
+    """
+    Which rooms the sessions of one semester may use.
+
+    Attributes:
+        home: The semester's room_number, or None if it has none
+        batches: Batches the semester is split into for labs
+        labs: Lab rooms seating two batches (theory+practical lab sessions)
+        batch_labs: Lab rooms seating one batch (the pure-practical block)
+    """
+
+    def __init__(self, rooms, semester_data):
+        self.home = str(semester_data.get('room_number') or '').strip() or None
+        self.has_labs = rooms.has_labs
+        self.batches = batch_count(semester_data)
+        size = batch_size(student_count(semester_data), self.batches)
+        self.labs = tuple(rooms.labs(min(LAB_SEATS, self.batches) * size))
+        self.batch_labs = tuple(rooms.labs(size))
+
+    def options(self, kind, subject_count=1):
+        """Every tuple of rooms a session of kind may take; [()] when it needs none."""
+        if kind in LECTURE_KINDS:
+            return [(self.home,)] if self.home else [()]
+        if not self.has_labs:
+            return [()]
+        if kind == 'lab':
+            return [(room,) for room in self.labs]
+        return list(combinations(self.batch_labs, subject_count))
+
+
+class RoomSchedules:
+    """
+    Per-room, per-day occupancy index shared by every semester of a run.
+
+    Each (room, day) keeps one bitmask of slot indices. Unlike teachers, a
+    room is free again at a slot boundary: back-to-back classes may share it.
+    """
+
+    def __init__(self):
+        self._days = {}  # room -> day -> slot index bitmask
+
+    @classmethod
+    def from_dict(cls, bookings):
+        """Loads {room: {day: [slot index, ...]}}."""
+        index = cls()
+        for room, days in bookings.items():
+            for day, starts in days.items():
+                for start in starts:
+                    index.book(room, day, start)
+        return index
+
+    def to_dict(self):
+        return {room: {day: [i for i in range(mask.bit_length()) if mask >> i & 1] for day, mask in days.items()}
+                for room, days in self._days.items()}
+
+    def snapshot(self):
+        return {room: dict(days) for room, days in self._days.items()}
+
+    def restore(self, snapshot):
+        self._days = {room: dict(days) for room, days in snapshot.items()}
+
+    def __contains__(self, room):
+        return room in self._days
+
+    def __iter__(self):
+        return iter(self._days)
+
+    def mask(self, room, day):
+        """Slot-index bitmask of room's bookings on day."""
+        return self._days.get(room, {}).get(day, 0)
+
+    def is_free(self, room, day, start, length=1):
+        return not self.mask(room, day) & ((1 << length) - 1) << start
+
+    def book(self, room, day, start, length=1):
+        days = self._days.setdefault(room, {})
+        days[day] = days.get(day, 0) | ((1 << length) - 1) << start
+
+    def release(self, room, day, start, length=1):
+        days = self._days[room]
+        days[day] &= ~(((1 << length) - 1) << start)
+        if not days[day]:
+            del days[day]
+            if not days:
+                del self._days[room]
+
+    def find(self, candidates, day, start, length=1, count=1):
+        """The first count of candidates free for length slots from start, or None if fewer are free."""
+        footprint = ((1 << length) - 1) << start
+        free = []
+        for room in candidates:
+            if not self.mask(room, day) & footprint:
+                free.append(room)
+                if len(free) == count:
+                    return tuple(free)
+        return None
@@ -0,0 +1,588 @@
+"""
+Local HTTP scheduling service, so the web front end (or any script) can run
+the scheduler without the Tk window.
+
+Jobs are queued onto a bounded pool of worker processes, so concurrent
+generations run in parallel rather than taking turns on one interpreter: a
+long run occupies one worker while the others keep serving, and submissions
+beyond the queue limit are refused with 503 instead of piling up. Every job
+runs under a time limit (the service's, or a shorter one the job asks for),
+so no job holds a worker forever. Each job gets its own engine and bookings,
+so concurrent jobs never see each other's teachers. As in timetable_parallel
+the workers are set up once with what they share, here the queue their
+progress events travel back on; each job's cancel event is a manager proxy.
+The server only listens on 127.0.0.1 and needs no network access.
+
+    python timetable_server.py --port 8765 --workers 2 --time-limit 300
+
+Endpoints (JSON unless noted):
+
+    GET    /health                  {"status": "ok", "workers": n, "queued": n, "running": n}
+    POST   /jobs                    submit a job, 202 with its status
+    GET    /jobs                    status of every job kept
+    GET    /jobs/<id>               status and progress of one job
+    GET    /jobs/<id>/timetables    the generated timetables, once done
+    GET    /jobs/<id>/workbook      the .xlsx workbook, once done
+    POST   /jobs/<id>/cancel        cancel a queued or running job; a finished one is left as is
+    DELETE /jobs/<id>               forget a finished job and delete its workbook (409 until it finishes)
+
+A job body is either a list of semester records, as the CLI's JSON input
+takes, or an object:
+
+    {
+      "semesters": [...],
+      "strategy": "auto", "order": "constrained", "seed": 0,
+      "time_budget": 10, "time_limit": 60, "improve": 0,
+      "grid": {...}, "rooms": {...}, "availability": {...},
+      "workbook": true
+    }
+
+where grid, rooms and availability are the JSON configs of timetable_grid,
+timetable_rooms and timetable_availability, and time_limit caps the whole
+run in seconds (never beyond the service's). A job's status is one of queued, running, done, failed and
+cancelled; a running job also reports progress, a fraction from 0 to 1 and
+a message, and a failed one its error (and the precheck's findings when the
+department was proven infeasible). Finished jobs keep their results until
+they are deleted or, once more than the service keeps have finished, expire.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from timetable_availability import Availability
+from timetable_cache import ResultCache
+from timetable_compact import timetable_dict
+from timetable_engine import ORDERS, STRATEGIES, TimetableEngine, normalize_semester_data
+from timetable_errors import GenerationCancelled, InfeasibleError, SchedulingError
+from timetable_grid import DEFAULT_GRID, SlotGrid
+from timetable_rooms import Rooms
+
+DEFAULT_PORT = 8765
+DEFAULT_TIME_LIMIT = 300.0  # Wall-clock seconds a job may run unless the service is given another limit
+HOST = '127.0.0.1'
+MAX_BODY_BYTES = 16 * 2 ** 20
+WORKBOOK_NAME = 'timetables.xlsx'
+JOB_STATES = ['queued', 'running', 'done', 'failed', 'cancelled']
+# Browsers may call the service from a dev server on this machine only
+LOCAL_ORIGIN = re.compile(r'^https?://(localhost|127\.0\.0\.1|\[::1\])(:\d+)?$')
+
+
+class ServiceBusy(Exception):
+    """The job queue is full; the client should retry later."""
+
+
+class JobNotFinished(Exception):
+    """The job is still queued or running, so it cannot be deleted yet."""
+
+
+class Job:
+    """
+    One generation request and its outcome.
+
+    Attributes:
+        status: One of JOB_STATES
+        progress: Fraction of the run done, from 0 to 1
+        message: What the run is doing, as the GUI's progress label shows it
+        error: Why the job failed, if it did
+        report: The precheck's findings, if it failed as infeasible
+        timetables: The generated timetables as plain dicts, once done
+        workbook: Path of the exported workbook, once done (if requested)
+    """
+
+    def __init__(self, semesters, options, cancel_event):
+        self.id = uuid.uuid4().hex
+        self.semesters = semesters
+        self.options = options
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = "Waiting for a worker"
+        self.error = None
+        self.report = []
+        self.timetables = None
+        self.workbook = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = cancel_event
+        self.future = None
+        self._semester_progress = (1, 1)
+
+    @property
+    def finished_state(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def on_progress(self, event):
+        # Called on the service's relay thread with the engine's progress events; events
+        # still in flight when the job finishes are dropped
+        kind = event['kind']
+        if self.finished_state:
+            return
+        if kind == 'started':
+            self.status = 'running'
+            self.started = time.time()
+            self.message = "Starting"
+        elif kind == 'workbook':
+            self.message = "Writing the workbook"
+        elif kind == 'semester':
+            self._semester_progress = (event['semester'], event['semesters'])
+            self.progress = (event['semester'] - 1) / event['semesters']
+            self.message = f"Semester {event['semester']} of {event['semesters']}: {event['name']}"
+        elif kind == 'placed':
+            semester, semesters = self._semester_progress
+            done = event['placed'] / event['sessions'] if event['sessions'] else 1
+            self.progress = (semester - 1 + done) / semesters
+            self.message = f"{event['placed']}/{event['sessions']} sessions placed"
+        elif kind == 'retry':
+            self.message = "Retrying with the solver"
+        elif kind == 'cached':
+            self.progress = 1.0
+            self.message = "Loaded from cache"
+        elif kind == 'improve':
+            self.message = "Improving timetables"
+
+    def to_dict(self):
+        return {'id': self.id, 'status': self.status, 'progress': round(self.progress, 4), 'message': self.message,
+                'error': self.error, 'report': self.report, 'semesters': len(self.semesters),
+                'created': self.created, 'started': self.started, 'finished': self.finished,
+                'workbook': self.workbook is not None}
+
+
+def parse_job(payload):
+    """
+    Reads a job body into (semester records, options).
+
+    Raises:
+        ValueError: If the body is malformed
+    """
+    if isinstance(payload, list):
+        payload = {'semesters': payload}
+    if not isinstance(payload, dict) or not isinstance(payload.get('semesters'), list) or not payload['semesters']:
+        raise ValueError("Expected a non-empty list of semesters, or an object with one under 'semesters'")
+    strategy = payload.get('strategy', 'auto')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+    order = payload.get('order', 'constrained')
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order {order!r}, expected one of {ORDERS}")
+    try:
+        grid = SlotGrid.from_dict(payload['grid']) if payload.get('grid') else DEFAULT_GRID
+        rooms = Rooms.from_dict(payload['rooms']) if payload.get('rooms') else None
+        availability = Availability.from_dict(payload['availability']) if payload.get('availability') else None
+        if availability:
+            availability.compile(grid)  # Rules naming days the grid lacks fail the request, not the job
+        time_limit = float(payload['time_limit']) if payload.get('time_limit') is not None else None
+        if time_limit is not None and time_limit <= 0:
+            raise ValueError("time_limit must be a positive number of seconds")
+        options = {'strategy': strategy, 'order': order, 'seed': int(payload.get('seed', 0)),
+                   'time_budget': float(payload.get('time_budget', 10.0)), 'time_limit': time_limit,
+                   'improve_time': float(payload.get('improve', 0.0)),
+                   'grid': grid, 'rooms': rooms, 'availability': availability,
+                   'workbook': bool(payload.get('workbook', True))}
+        semesters = [normalize_semester_data(record, grid) for record in payload['semesters']]
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Malformed job: {e!r}") from e
+    return semesters, options
+
+
+_events = None  # The service's progress queue inside a worker process
+
+
+def _start_worker(events):
+    global _events
+    _events = events
+
+
+def run_job(job_id, semesters, options, directory, cache, cancel):
+    """
+    Generates one job; runs inside a worker process.
+
+    Progress events go back to the service tagged with job_id. Every outcome,
+    failures included, is returned as a dict, so the precheck's report
+    survives the trip back to the service.
+
+    Returns:
+        dict: status, error, report, timetables (plain dicts) and workbook path
+    """
+    result = {'status': 'cancelled', 'error': None, 'report': [], 'timetables': None, 'workbook': None}
+    if cancel.is_set():
+        return result
+
+    def progress(event):
+        _events.put((job_id, event))
+
+    progress({'kind': 'started'})
+    try:
+        engine = TimetableEngine(strategy=options['strategy'], time_budget=options['time_budget'],
+                                 time_limit=options['time_limit'], seed=options['seed'],
+                                 improve_time=options['improve_time'], grid=options['grid'], rooms=options['rooms'],
+                                 order=options['order'], availability=options['availability'],
+                                 progress=progress, cancel=cancel, cache=cache)
+        timetables = engine.generate_timetables(semesters)
+        if options['workbook']:
+            progress({'kind': 'workbook'})
+            result['workbook'] = _save_workbook(directory, semesters, timetables, engine)
+    except GenerationCancelled:
+        pass
+    except InfeasibleError as e:
+        result.update(status='failed', error=str(e), report=e.report)
+    except SchedulingError as e:
+        result.update(status='failed', error=str(e))
+    except Exception as e:
+        # Anything else is a bug or a bad input the parser let through; keep serving
+        result.update(status='failed', error=f"{type(e).__name__}: {e}")
+    else:
+        result.update(status='done', timetables=[timetable_dict(timetable) for timetable in timetables])
+    return result
+
+
+def _save_workbook(directory, semesters, timetables, engine):
+    # openpyxl loads with the first workbook, not when the worker starts
+    from timetable_export import resource_timetables, save_workbook
+
+    os.makedirs(directory, exist_ok=True)
+    views = resource_timetables(engine.placements, semesters, engine.grid)
+    return save_workbook(timetables, semesters, os.path.join(directory, WORKBOOK_NAME), *views)
+
+
+class SchedulingService:
+    """
+    The job queue and its worker pool, independent of HTTP.
+
+    Args:
+        workers: Jobs run at once, one worker process each
+        max_queued: Jobs allowed to wait for a worker before submit() refuses more
+        output_dir: Where each job's workbook is written (one folder per job);
+            a temporary folder, removed on shutdown, if omitted
+        cache: Optional ResultCache shared by the jobs
+        keep: Finished jobs kept for their results; the oldest are forgotten first
+        time_limit: Wall-clock seconds any job may run; a job asking for a
+            longer limit, or none, gets this one. None lets jobs run unbounded
+    """
+
+    def __init__(self, workers=2, max_queued=16, output_dir=None, cache=None, keep=100,
+                 time_limit=DEFAULT_TIME_LIMIT):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.own_output_dir = output_dir is None
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix='timetable-jobs-')
+        self.cache = cache
+        self.keep = keep
+        self.time_limit = time_limit
+        self.jobs = {}  # id -> Job, in submission order
+        self.lock = threading.Lock()
+        # The manager serves the per-job cancel events; the queue brings progress back from the workers
+        self.manager = multiprocessing.Manager()
+        self.events = multiprocessing.Queue()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_start_worker, initargs=(self.events,))
+        self.relay = threading.Thread(target=self._relay_progress, name='timetable-progress', daemon=True)
+        self.relay.start()
+
+    def counts(self):
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {state: statuses.count(state) for state in JOB_STATES}
+
+    def submit(self, semesters, options):
+        """
+        Queues a job.
+
+        Raises:
+            ServiceBusy: If max_queued jobs are already waiting
+        """
+        limit = options.get('time_limit')
+        if self.time_limit and (not limit or limit > self.time_limit):
+            options = dict(options, time_limit=self.time_limit)
+        with self.lock:
+            if sum(queued.status == 'queued' for queued in self.jobs.values()) >= self.max_queued:
+                raise ServiceBusy(f"{self.max_queued} jobs are already queued")
+            job = Job(semesters, options, self.manager.Event())
+            self.jobs[job.id] = job
+            self._forget_old()
+            job.future = self.executor.submit(run_job, job.id, semesters, options,
+                                              os.path.join(self.output_dir, job.id), self.cache, job.cancel_event)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def all_jobs(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job; a finished job is left as it is. Returns the job, or None."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.finished_state:
+                return job
+            job.cancel_event.set()
+            if job.future.cancel():
+                # Never started, so no worker will report it
+                job.status = 'cancelled'
+                job.message = "Cancelled"
+                job.finished = time.time()
+        return job
+
+    def delete(self, job_id):
+        """
+        Forgets a finished job and deletes its workbook. Returns the job, or None.
+
+        Raises:
+            JobNotFinished: If the job is still queued or running; cancel it first
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if not job.finished_state:
+                raise JobNotFinished(f"Job {job_id} is {job.status}; cancel it first")
+            del self.jobs[job_id]
+        self._remove_files(job)
+        return job
+
+    def shutdown(self):
+        with self.lock:
+            for job in self.jobs.values():
+                job.cancel_event.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.events.put(None)
+        self.relay.join()
+        self.manager.shutdown()
+        if self.own_output_dir:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def _forget_old(self):
+        # Called with the lock held
+        finished = [job for job in self.jobs.values() if job.finished_state]
+        for job in finished[:max(len(finished) - self.keep, 0)]:
+            del self.jobs[job.id]
+            self._remove_files(job)
+
+    def _remove_files(self, job):
+        if job.workbook:
+            shutil.rmtree(os.path.dirname(job.workbook), ignore_errors=True)
+
+    def _relay_progress(self):
+        # Runs on the relay thread: hands the workers' progress events to their jobs
+        while True:
+            item = self.events.get()
+            if item is None:
+                return
+            job_id, event = item
+            job = self.get(job_id)
+            if job is not None:
+                job.on_progress(event)
+
+    def _finish(self, job, future):
+        # Runs once the job's future settles, on the executor's management thread
+        if future.cancelled():
+            result = {'status': 'cancelled'}
+        else:
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process died, e.g. killed or out of memory
+                result = {'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+        job.error = result.get('error')
+        job.report = result.get('report') or []
+        job.timetables = result.get('timetables')
+        job.workbook = result.get('workbook')
+        if result['status'] == 'done':
+            job.progress, job.message = 1.0, "Done"
+        elif result['status'] == 'cancelled':
+            job.message = "Cancelled"
+        job.finished = job.finished or time.time()
+        job.status = result['status']
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Routes the endpoints in the module docstring to self.server.service."""
+
+    server_version = 'TimetableService/1.0'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _cors_headers(self):
+        origin = self.headers.get('Origin')
+        if origin and LOCAL_ORIGIN.match(origin):
+            self.send_header('Access-Control-Allow-Origin', origin)
+            self.send_header('Vary', 'Origin')
+
+    def _send_json(self, status, body, headers=()):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for header in headers:
+            self.send_header(*header)
+        self._cors_headers()
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def _route(self):
+        # (job, rest of the path) for /jobs/<id>[/...], answering 404 itself when there is no such job
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        if len(parts) < 2 or parts[0] != 'jobs':
+            return None, None
+        job = self.server.service.get(parts[1])
+        if job is None:
+            self._send_error(404, f"No job {parts[1]}")
+            return None, ''
+        return job, '/'.join(parts[2:])
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self._cors_headers()
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        service = self.server.service
+        if path == '/health':
+            counts = service.counts()
+            self._send_json(200, {'status': 'ok', 'workers': service.workers, 'queued': counts['queued'],
+                                  'running': counts['running']})
+            return
+        if path == '/jobs':
+            self._send_json(200, {'jobs': [job.to_dict() for job in service.all_jobs()]})
+            return
+        job, rest = self._route()
+        if job is None:
+            if rest is None:
+                self._send_error(404, f"Unknown path {path}")
+            return
+        if rest == '':
+            self._send_json(200, job.to_dict())
+        elif rest == 'timetables':
+            if job.status != 'done':
+                self._send_error(409, f"Job {job.id} is {job.status}")
+                return
+            timetables = [{'semester': semester['semester'], 'timetable': timetable_dict(timetable)}
+                          for semester, timetable in zip(job.semesters, job.timetables)]
+            self._send_json(200, {'timetables': timetables})
+        elif rest == 'workbook':
+            if job.status != 'done' or not job.workbook:
+                self._send_error(409, f"Job {job.id} has no workbook")
+                return
+            self._send_file(job.workbook)
+        else:
+            self._send_error(404, f"Unknown path {path}")
+
+    def _send_file(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.send_header('Content-Disposition', f'attachment; filename="{WORKBOOK_NAME}"')
+        self.send_header('Content-Length', str(len(data)))
+        self._cors_headers()
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0].rstrip('/') != '/jobs':
+            job, rest = self._route()
+            if job is not None and rest == 'cancel':
+                self.server.service.cancel(job.id)
+                self._send_json(200, job.to_dict())
+            elif rest is None or job is not None:
+                self._send_error(404, f"Unknown path {self.path}")
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if not 0 < length <= MAX_BODY_BYTES:
+            self._send_error(413 if length > MAX_BODY_BYTES else 400, "Expected a JSON body of at most 16 MB")
+            return
+        try:
+            semesters, options = parse_job(json.loads(self.rfile.read(length)))
+        except ValueError as e:  # Includes malformed JSON
+            self._send_error(400, str(e))
+            return
+        try:
+            job = self.server.service.submit(semesters, options)
+        except ServiceBusy as e:
+            self._send_json(503, {'error': str(e)}, [('Retry-After', '5')])
+            return
+        self._send_json(202, job.to_dict(), [('Location', f"/jobs/{job.id}")])
+
+    def do_DELETE(self):
+        job, rest = self._route()
+        if job is None:
+            if rest is None:
+                self._send_error(404, f"Unknown path {self.path}")
+            return
+        if rest:
+            self._send_error(404, f"Unknown path {self.path}")
+            return
+        try:
+            self.server.service.delete(job.id)
+        except JobNotFinished as e:
+            self._send_error(409, str(e))
+            return
+        self._send_json(200, job.to_dict())
+
+
+def make_server(service, port=DEFAULT_PORT, quiet=False):
+    """A ThreadingHTTPServer on 127.0.0.1:port serving service; port 0 picks a free one."""
+    server = ThreadingHTTPServer((HOST, port), RequestHandler)
+    server.service = service
+    server.quiet = quiet
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve the timetable scheduler over HTTP on localhost.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port on {HOST} (default {DEFAULT_PORT})")
+    parser.add_argument('--workers', type=int, default=2, help="Jobs generated at once (default 2)")
+    parser.add_argument('--max-queued', type=int, default=16, help="Jobs allowed to wait for a worker (default 16)")
+    parser.add_argument('--time-limit', type=float, default=DEFAULT_TIME_LIMIT,
+                        help=f"Wall-clock seconds any job may run (default {DEFAULT_TIME_LIMIT:g}; 0 for no limit)")
+    parser.add_argument('--output-dir', help="Keep job workbooks here instead of a temporary folder")
+    parser.add_argument('--cache-dir', help="Share a result cache between jobs in this folder")
+    parser.add_argument('--quiet', action='store_true', help="Do not log requests")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers < 1 or args.max_queued < 0 or args.time_limit < 0:
+        print("--workers must be at least 1 and --max-queued and --time-limit not negative", file=sys.stderr)
+        return 2
+    cache = ResultCache(args.cache_dir) if args.cache_dir else None
+    service = SchedulingService(args.workers, args.max_queued, args.output_dir, cache,
+                                time_limit=args.time_limit or None)
+    server = make_server(service, args.port, args.quiet)
+    print(f"Serving on http://{HOST}:{server.server_port} with {args.workers} workers (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import random
+import time
+
+from timetable_compact import render_label
+from timetable_errors import GenerationCancelled, InfeasibleError, SolverTimeout
+from timetable_index import slot_masks, slot_minutes
+
+
+class Session:
+    """
+    One class meeting to place: a variable of the constraint problem.
+
+    Args:
+        kind: 'theory', 'tutorial', 'lab' or 'group_lab'
+        subjects: List of (subject, teacher) pairs taught together in the session
+        group: Key of the class (semester) whose grid the session occupies
+        length: Number of consecutive slots the session needs
+        starts: Allowed (day, slot index) start positions
+        avoid_adjacent: The teachers must not have a class right next to the first slot
+        copy: Position among otherwise identical sessions, used for symmetry breaking
+        rooms: Tuples of rooms the session may take (one room per tuple entry);
+            defaults to [()], a session needing no room
+        batches: For labs, the batches taught by each of the weekly copies
+            (see timetable_batches): one entry per copy, each a tuple of batch
+            number tuples aligned with subjects
+    """
+
+    __slots__ = ('kind', 'subjects', 'teachers', 'group', 'length', 'starts', 'avoid_adjacent', 'copy', 'rooms',
+                 'room_names', 'batches')
+
+    def __init__(self, kind, subjects, group, length, starts, avoid_adjacent=False, copy=0, rooms=None,
+                 batches=None):
+        self.kind = kind
+        self.subjects = list(subjects)
+        self.teachers = tuple(dict.fromkeys(teacher for _, teacher in self.subjects))
+        self.group = group
+        self.length = length
+        self.starts = tuple(starts)  # A tuple is kept as is, so a semester's sessions share one
+        self.avoid_adjacent = avoid_adjacent
+        self.copy = copy
+        self.rooms = list(rooms) if rooms is not None else [()]
+        self.room_names = frozenset(room for option in self.rooms for room in option)
+        self.batches = batches
+
+    @property
+    def signature(self):
+        return (self.kind, tuple(self.subjects), self.group, self.length)
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(config['kind'], [tuple(pair) for pair in config['subjects']], config['group'], config['length'],
+                   tuple((day, start) for day, start in config['starts']), config['avoid_adjacent'], config['copy'],
+                   [tuple(option) for option in config['rooms']],
+                   tuple(tuple(tuple(numbers) for numbers in copy) for copy in config['batches'])
+                   if config['batches'] is not None else None)
+
+    def to_dict(self):
+        return {'kind': self.kind, 'subjects': [list(pair) for pair in self.subjects], 'group': self.group,
+                'length': self.length, 'starts': [list(start) for start in self.starts],
+                'avoid_adjacent': self.avoid_adjacent, 'copy': self.copy,
+                'rooms': [list(option) for option in self.rooms],
+                'batches': [[list(numbers) for numbers in copy] for copy in self.batches]
+                if self.batches is not None else None}
+
+    def __repr__(self):
+        names = ', '.join(subject for subject, _ in self.subjects)
+        return f"{names} ({self.kind} #{self.copy + 1})"
+
+
+class Placement:
+    """
+    Where a session ended up and the rooms it took. batch is the session's
+    0-based position among its weekly copies, which picks the entry of
+    session.batches a lab teaches; the cell text is rendered from these on
+    demand (see timetable_compact).
+    """
+
+    __slots__ = ('session', 'day', 'start', 'batch', 'rooms')
+
+    def __init__(self, session, day, start, batch=0, rooms=()):
+        self.session = session
+        self.day = day
+        self.start = start
+        self.batch = batch
+        self.rooms = tuple(rooms)
+
+    @property
+    def label(self):
+        return render_label(self.session, self.batch, self.rooms)
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(Session.from_dict(config['session']), config['day'], config['start'], config['batch'],
+                   config['rooms'])
+
+    def to_dict(self):
+        return {'session': self.session.to_dict(), 'day': self.day, 'start': self.start, 'batch': self.batch,
+                'rooms': list(self.rooms)}
+
+    def __repr__(self):
+        return f"Placement({self.session!r}, {self.day}, {self.start})"
+
+
+class BacktrackingSolver:
+    """
+    Complete search over session placements.
+
+    Sessions are variables whose values are (day, start slot, rooms) choices.
+    The search picks the variable with the fewest remaining values (ties
+    broken by the number of constrained neighbours), forward-checks every
+    neighbour sharing a class grid, a teacher or a possible room after each
+    assignment, and backtracks on a wipe-out. Rooms booked before the search
+    (room_schedules) are excluded up front, like teacher bookings. Identical sessions of one subject are forced into increasing
+    value order so permutations of the same timetable are never revisited.
+    Exhausting the search proves the input infeasible; running out of the time
+    or backtrack budget raises SolverTimeout instead, and setting the optional
+    cancel event raises GenerationCancelled.
+
+    day_limits ({teacher: most slots a day}, see timetable_availability) is
+    checked against teacher_schedules' bookings when values are compiled and
+    forward-checked like the other constraints during the search; values the
+    optional preferred(teachers, day, start, length) callable accepts are
+    tried first.
+    """
+
+    def __init__(self, days, slots, teacher_schedules, time_budget=10.0, max_backtracks=None, occupied=None, rng=None,
+                 cancel=None, room_schedules=None, day_limits=None, preferred=None):
+        self.days = list(days)
+        self.slots = list(slots)
+        self.teacher_schedules = teacher_schedules
+        self.time_budget = time_budget
+        self.max_backtracks = max_backtracks
+        self.occupied = occupied or set()  # (group, day, slot index) cells already taken
+        self.rng = rng or random
+        self.cancel = cancel
+        self.room_schedules = room_schedules  # RoomSchedules of rooms booked outside this search
+        self.day_limits = day_limits or {}
+        self.preferred = preferred
+        self.room_index = {}
+        self.backtracks = 0
+        self.nodes = 0
+
+    def _compile_values(self, session):
+        # Each value: (day, start, day index, cells, minutes, start marks, end marks, start window, end window,
+        #              room mask, rooms)
+        values = []
+        slot_count = len(self.slots)
+        for day, start in session.starts:
+            if start + session.length > slot_count:
+                continue
+            day_index = self.days.index(day)
+            names = self.slots[start:start + session.length]
+            if any((session.group, day, start + k) in self.occupied for k in range(session.length)):
+                continue
+            if not all(self.teacher_schedules.is_free(teacher, day, slot)
+                       for teacher in session.teachers for slot in names):
+                continue
+            if session.avoid_adjacent and any(self.teacher_schedules.has_adjacent(teacher, day, names[0])
+                                              for teacher in session.teachers):
+                continue
+            if self.day_limits and any(self._booked(teacher, day) + session.length > self.day_limits[teacher]
+                                       for teacher in session.teachers if teacher in self.day_limits):
+                continue
+            cells = minutes = start_marks = end_marks = 0
+            for k, slot in enumerate(names):
+                slot_start, slot_end = slot_minutes(slot)
+                cells |= 1 << (day_index * slot_count + start + k)
+                minutes |= slot_masks(slot)[0]
+                start_marks |= 1 << slot_start
+                end_marks |= 1 << slot_end
+            _, start_window, end_window = slot_masks(names[0])
+            for rooms in session.rooms:
+                if self.room_schedules is not None and not all(
+                        self.room_schedules.is_free(room, day, start, session.length) for room in rooms):
+                    continue
+                room_mask = sum(1 << self.room_index[room] for room in rooms)
+                values.append((day, start, day_index, cells, minutes, start_marks, end_marks, start_window,
+                               end_window, room_mask, rooms))
+        return values
+
+    def _booked(self, teacher, day):
+        # Slots teacher already teaches on day outside this search
+        return len(self.teacher_schedules.slots(teacher, day))
+
+    def _order_values(self, domains):
+        # Shuffle each variable's values, then move the preferred ones to the front
+        for var, domain in enumerate(domains):
+            self.rng.shuffle(domain)
+            if self.preferred is not None:
+                session = self.sessions[var]
+                values = self.values[var]
+                domain.sort(key=lambda value_id: not self.preferred(session.teachers, values[value_id][0],
+                                                                    values[value_id][1], session.length))
+
+    def _build_neighbours(self, sessions):
+        neighbours = [[] for _ in sessions]
+        for a, first in enumerate(sessions):
+            for b in range(a + 1, len(sessions)):
+                second = sessions[b]
+                same_group = first.group == second.group
+                shared = bool(set(first.teachers) & set(second.teachers))
+                rooms = bool(first.room_names & second.room_names)
+                if not (same_group or shared or rooms):
+                    continue
+                # Symmetry breaking: +1 if the neighbour must take a later value, -1 if earlier
+                order = 0
+                if first.signature == second.signature:
+                    order = 1 if first.copy < second.copy else -1
+                neighbours[a].append((b, same_group, shared, rooms,
+                                      first.avoid_adjacent, second.avoid_adjacent, order))
+                neighbours[b].append((a, same_group, shared, rooms,
+                                      second.avoid_adjacent, first.avoid_adjacent, -order))
+        return neighbours
+
+    def solve(self, sessions):
+        """
+        Returns:
+            dict: session -> (day, start slot index, rooms) for every session
+
+        Raises:
+            InfeasibleError: No complete placement exists
+            SolverTimeout: The time or backtrack budget ran out first
+        """
+        self.sessions = sessions
+        self.room_index = {}
+        for session in sessions:
+            for room in sorted(session.room_names):
+                self.room_index.setdefault(room, len(self.room_index))
+        self.values = [self._compile_values(session) for session in sessions]
+        empty = [session for session, values in zip(sessions, self.values) if not values]
+        if empty:
+            raise InfeasibleError("No free slot at all for: " + ', '.join(map(repr, empty)))
+
+        self.neighbours = self._build_neighbours(sessions)
+        self.domains = [list(range(len(values))) for values in self.values]
+        self._order_values(self.domains)
+        self.assigned = [None] * len(sessions)
+        self.load = {}  # (teacher, day index) -> slots taught, for teachers with a day limit
+        self.limited = {}  # Teacher with a day limit -> indices of the sessions they teach
+        for var, session in enumerate(sessions):
+            for teacher in session.teachers:
+                if teacher in self.day_limits:
+                    self.limited.setdefault(teacher, []).append(var)
+        self.failures = [0] * len(sessions)
+        self.trail = []
+        self.backtracks = 0
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_budget if self.time_budget else None
+
+        if not self._search():
+            hardest = sorted(range(len(sessions)), key=lambda i: -self.failures[i])[:3]
+            raise InfeasibleError(
+                f"No complete timetable exists for these {len(sessions)} sessions "
+                f"(search exhausted after {self.backtracks} backtracks); most constrained: "
+                + ', '.join(repr(sessions[i]) for i in hardest))
+
+        return {session: self.values[i][value][:2] + self.values[i][value][10:]
+                for i, (session, value) in enumerate(zip(sessions, self.assigned))}
+
+    def _select(self):
+        best = None
+        best_key = None
+        for i, value in enumerate(self.assigned):
+            if value is not None:
+                continue
+            key = (len(self.domains[i]), -len(self.neighbours[i]))
+            if best_key is None or key < best_key:
+                best, best_key = i, key
+        return best
+
+    def _forward_check(self, var, value_id):
+        a = self.values[var][value_id]
+        for other, same_group, shared, rooms, avoid_self, avoid_other, order in self.neighbours[var]:
+            if self.assigned[other] is not None:
+                continue
+            values = self.values[other]
+            domain = self.domains[other]
+            kept = []
+            for candidate in domain:
+                b = values[candidate]
+                if (same_group or rooms and a[9] & b[9]) and a[3] & b[3]:
+                    continue
+                if shared and a[2] == b[2]:
+                    if a[4] & b[4]:
+                        continue
+                    if avoid_self and (b[6] & a[7] or b[5] & a[8]):
+                        continue
+                    if avoid_other and (a[6] & b[7] or a[5] & b[8]):
+                        continue
+                if order and (candidate - value_id) * order <= 0:
+                    continue  # Identical sessions keep increasing value order
+                kept.append(candidate)
+            if len(kept) != len(domain):
+                self.trail.append((other, domain))
+                self.domains[other] = kept
+                if not kept:
+                    self.failures[other] += 1
+                    return False
+        return not self.limited or self._check_limits(var, value_id)
+
+    def _add_load(self, var, value_id, sign):
+        session = self.sessions[var]
+        day, _, day_index = self.values[var][value_id][:3]
+        for teacher in session.teachers:
+            if teacher in self.limited:
+                key = (teacher, day_index)
+                if key not in self.load:
+                    self.load[key] = self._booked(teacher, day)
+                self.load[key] += sign * session.length
+
+    def _check_limits(self, var, value_id):
+        # Drop the values on the same day that would take a limited teacher past their day limit
+        day_index = self.values[var][value_id][2]
+        for teacher in self.sessions[var].teachers:
+            if teacher not in self.limited:
+                continue
+            room = self.day_limits[teacher] - self.load[teacher, day_index]
+            for other in self.limited[teacher]:
+                if self.assigned[other] is not None or self.sessions[other].length <= room:
+                    continue
+                values = self.values[other]
+                domain = self.domains[other]
+                kept = [candidate for candidate in domain if values[candidate][2] != day_index]
+                if len(kept) != len(domain):
+                    self.trail.append((other, domain))
+                    self.domains[other] = kept
+                    if not kept:
+                        self.failures[other] += 1
+                        return False
+        return True
+
+    def _search(self):
+        # Depth-first search over an explicit stack of [variable, untried value ids, trail mark of the
+        # value being tried], so the depth is not bounded by Python's recursion limit however many
+        # sessions there are
+        stack = []
+        var = self._open()
+        if var is None:
+            return True
+        stack.append([var, iter(list(self.domains[var])), None])
+        while stack:
+            frame = stack[-1]
+            var, untried, mark = frame
+            if mark is not None:
+                # The value being tried failed here or further down: undo it
+                while len(self.trail) > mark:
+                    other, domain = self.trail.pop()
+                    self.domains[other] = domain
+                if self.limited:
+                    self._add_load(var, self.assigned[var], -1)
+                self.assigned[var] = None
+                frame[2] = None
+                self.backtracks += 1
+                if self.max_backtracks is not None and self.backtracks > self.max_backtracks:
+                    raise SolverTimeout(f"Solver gave up after {self.max_backtracks} backtracks")
+            value_id = next(untried, None)
+            if value_id is None:
+                stack.pop()
+                continue
+            frame[2] = len(self.trail)
+            self.assigned[var] = value_id
+            if self.limited:
+                self._add_load(var, value_id, 1)
+            if self._forward_check(var, value_id):
+                following = self._open()
+                if following is None:
+                    return True
+                stack.append([following, iter(list(self.domains[following])), None])
+        return False
+
+    def _open(self):
+        # Counts a search node, honouring the cancel event and time budget, and picks its variable
+        self.nodes += 1
+        if self.nodes % 256 == 0:
+            if self.cancel is not None and self.cancel.is_set():
+                raise GenerationCancelled("Solver was cancelled")
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SolverTimeout(f"Solver gave up after {self.time_budget}s ({self.backtracks} backtracks)")
+        return self._select()
@@ -0,0 +1,87 @@
+from timetable_batches import BATCHES, group_lab_count, lab_session_count
+
+
+class SubjectSpec:
+    """
+    One subject of a semester with its credits parsed once.
+
+    Built by compile_semester when a semester is saved or loaded, so the
+    schedulers never split or int()-parse a credits string again.
+    """
+
+    __slots__ = ('subject', 'teacher', 'theory', 'tutorial', 'practical', 'credits')
+
+    def __init__(self, subject, teacher, theory, tutorial, practical, credits=''):
+        self.subject = subject
+        self.teacher = teacher
+        self.theory = theory
+        self.tutorial = tutorial
+        self.practical = practical
+        self.credits = credits
+
+    @property
+    def is_pure_practical(self):
+        """0:0:X subjects, scheduled together as simultaneous batch labs."""
+        return self.theory == 0 and self.tutorial == 0 and self.practical > 0
+
+    @property
+    def has_theory_and_practical(self):
+        return self.theory > 0 and self.practical > 0
+
+    def _key(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, SubjectSpec) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"SubjectSpec({self.subject!r}, {self.teacher!r}, {self.theory}:{self.tutorial}:{self.practical})"
+
+
+def parse_credits(subject, credits):
+    """Splits a 'theory:tutorial:practical' credit string into integers."""
+    try:
+        return [int(c.strip()) for c in credits.split(':')]
+    except ValueError:
+        raise ValueError(f"Invalid credit format for subject {subject}: {credits}")
+
+
+def compile_semester(semester_data):
+    """
+    Parses every subject of a semester into a SubjectSpec.
+
+    Missing tutorial/practical parts count as 0, matching how the schedulers
+    always treated short credit strings.
+
+    Raises:
+        ValueError: If a credits string is not made of integers
+    """
+    specs = []
+    for subject, teacher, credits in zip(semester_data['subjects'], semester_data['teachers'],
+                                         semester_data['credits']):
+        credit_values = parse_credits(subject, credits)
+        if len(credit_values) > 3:
+            raise ValueError(f"Invalid credit format for subject {subject}: {credits}")
+        theory, tutorial, practical = (credit_values + [0, 0, 0])[:3]
+        specs.append(SubjectSpec(subject, teacher, theory, tutorial, practical, credits))
+    return specs
+
+
+def get_specs(semester_data):
+    """Returns the semester's compiled specs, compiling them on first use."""
+    specs = semester_data.get('specs')
+    if specs is None:
+        specs = semester_data['specs'] = compile_semester(semester_data)
+    return specs
+
+
+def count_sessions(specs, batches=BATCHES):
+    """Number of class meetings a semester's specs schedule in a week, with its labs split into batches."""
+    count = group_lab_count([spec.practical for spec in specs if spec.is_pure_practical], batches)  # Shared batch labs
+    for spec in specs:
+        if not spec.is_pure_practical:
+            count += spec.theory + spec.tutorial + lab_session_count(spec.practical, batches)
+    return count